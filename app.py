@@ -1,9 +1,31 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify, make_response, send_file
 from flask_cors import CORS
+from werkzeug.utils import secure_filename
 import os
+import functools
+import json
+import time
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timezone
 import random
+from job_queue import JobQueue, QueueFullError, VIDEO_EXTENSIONS
+from chunked_upload import OffsetMismatchError, UploadStore
+from result_cache import ResultCache
+from snapshot_cache import SnapshotCache
+from event_stream import EventHub, StreamFullError
+from heatmap import HeatmapIndex
+from report_store import ReportStore
+from spatial_index import SpatialIndex, haversine_m
+from routing import RoadGraph, RoutingEngine
+from timeseries import RESOLUTIONS, TimeSeriesStore
+from forecasting import SeasonalForecaster
+from datasets import (CAMERA_LOCATIONS, CONGESTION_BOUNDS, DISASTER_ZONES, EMERGENCY_SERVICES, PARKING_LOTS, POIS,
+                      ROAD_SEGMENTS, TRAFFIC_SIGNALS, VEHICLE_CATEGORIES)
+from motion_gate import load_rois
+from render import mjpeg_stream
+from metrics import registry as metrics
+from profiler import ProfilerBusyError, SamplingProfiler, folded
+import wire
 
 app = Flask(__name__)
 CORS(app)
@@ -14,72 +36,60 @@ os.makedirs('data', exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024
 
-VEHICLE_CATEGORIES = ['bike', 'motorcycle', 'car', 'auto_rickshaw', 'bus', 'truck', 'ambulance', 'police', 'fire_truck']
-
-CAMERA_LOCATIONS = [
-    {'id': 'cam_001', 'name': 'Times Square', 'lat': 40.7580, 'lon': -73.9855, 'location': 'New York, NY', 'road': 'Broadway'},
-    {'id': 'cam_002', 'name': 'Golden Gate Bridge', 'lat': 37.8199, 'lon': -122.4783, 'location': 'San Francisco, CA', 'road': 'US-101'},
-    {'id': 'cam_003', 'name': 'Hollywood Blvd', 'lat': 34.1016, 'lon': -118.3267, 'location': 'Los Angeles, CA', 'road': 'Hollywood Blvd'},
-    {'id': 'cam_004', 'name': 'Magnificent Mile', 'lat': 41.8954, 'lon': -87.6246, 'location': 'Chicago, IL', 'road': 'Michigan Ave'},
-    {'id': 'cam_005', 'name': 'Space Center', 'lat': 29.5519, 'lon': -95.0930, 'location': 'Houston, TX', 'road': 'NASA Pkwy'},
-    {'id': 'cam_006', 'name': 'Las Vegas Strip', 'lat': 36.1147, 'lon': -115.1728, 'location': 'Las Vegas, NV', 'road': 'Las Vegas Blvd'},
-    {'id': 'cam_007', 'name': 'Miami Beach', 'lat': 25.7907, 'lon': -80.1300, 'location': 'Miami, FL', 'road': 'Collins Ave'},
-    {'id': 'cam_008', 'name': 'Pike Place', 'lat': 47.6097, 'lon': -122.3422, 'location': 'Seattle, WA', 'road': 'Pike St'},
-]
-
-ROAD_SEGMENTS = [
-    {'id': 'road_001', 'name': 'Broadway North', 'coords': [[40.7580, -73.9855], [40.7650, -73.9800], [40.7720, -73.9750]]},
-    {'id': 'road_002', 'name': 'Broadway South', 'coords': [[40.7580, -73.9855], [40.7510, -73.9910], [40.7440, -73.9960]]},
-    {'id': 'road_003', 'name': 'Golden Gate North', 'coords': [[37.8199, -122.4783], [37.8350, -122.4750], [37.8500, -122.4700]]},
-    {'id': 'road_004', 'name': 'Hollywood East', 'coords': [[34.1016, -118.3267], [34.1016, -118.3100], [34.1016, -118.2900]]},
-    {'id': 'road_005', 'name': 'Michigan Ave North', 'coords': [[41.8954, -87.6246], [41.9050, -87.6246], [41.9150, -87.6246]]},
-    {'id': 'road_006', 'name': 'Las Vegas Blvd', 'coords': [[36.1147, -115.1728], [36.1250, -115.1700], [36.1350, -115.1680]]},
-    {'id': 'road_007', 'name': 'Collins Ave', 'coords': [[25.7907, -80.1300], [25.8000, -80.1280], [25.8100, -80.1260]]},
-    {'id': 'road_008', 'name': 'Pike St', 'coords': [[47.6097, -122.3422], [47.6150, -122.3400], [47.6200, -122.3380]]},
-]
-
-POIS = [
-    {'id': 'poi_001', 'name': 'Statue of Liberty', 'lat': 40.6892, 'lon': -74.0445, 'category': 'monument', 'rating': 4.8, 'description': 'Iconic symbol of freedom'},
-    {'id': 'poi_002', 'name': 'Central Park', 'lat': 40.7829, 'lon': -73.9654, 'category': 'park', 'rating': 4.9, 'description': 'Urban oasis in Manhattan'},
-    {'id': 'poi_003', 'name': 'Golden Gate Park', 'lat': 37.7694, 'lon': -122.4862, 'category': 'park', 'rating': 4.7, 'description': 'Large urban park'},
-    {'id': 'poi_004', 'name': 'Hollywood Sign', 'lat': 34.1341, 'lon': -118.3215, 'category': 'landmark', 'rating': 4.6, 'description': 'Famous landmark'},
-    {'id': 'poi_005', 'name': 'Navy Pier', 'lat': 41.8917, 'lon': -87.6063, 'category': 'entertainment', 'rating': 4.5, 'description': 'Lakefront entertainment'},
-    {'id': 'poi_006', 'name': 'Space Center Houston', 'lat': 29.5519, 'lon': -95.0930, 'category': 'museum', 'rating': 4.7, 'description': 'NASA visitor center'},
-    {'id': 'poi_007', 'name': 'Bellagio Fountains', 'lat': 36.1126, 'lon': -115.1767, 'category': 'attraction', 'rating': 4.8, 'description': 'Famous water show'},
-    {'id': 'poi_008', 'name': 'South Beach', 'lat': 25.7825, 'lon': -80.1340, 'category': 'beach', 'rating': 4.6, 'description': 'Iconic beach destination'},
-]
-
-EMERGENCY_SERVICES = [
-    {'id': 'hosp_001', 'name': 'NYC General Hospital', 'lat': 40.7370, 'lon': -73.9750, 'type': 'hospital', 'phone': '911'},
-    {'id': 'hosp_002', 'name': 'SF Medical Center', 'lat': 37.7630, 'lon': -122.4580, 'type': 'hospital', 'phone': '911'},
-    {'id': 'police_001', 'name': 'NYPD Precinct 1', 'lat': 40.7128, 'lon': -74.0060, 'type': 'police', 'phone': '911'},
-    {'id': 'fire_001', 'name': 'FDNY Station 1', 'lat': 40.7200, 'lon': -73.9980, 'type': 'fire_station', 'phone': '911'},
-    {'id': 'hosp_003', 'name': 'LA Medical Center', 'lat': 34.0700, 'lon': -118.3000, 'type': 'hospital', 'phone': '911'},
-    {'id': 'police_002', 'name': 'LAPD Central', 'lat': 34.0530, 'lon': -118.2450, 'type': 'police', 'phone': '911'},
-]
-
-DISASTER_ZONES = [
-    {'id': 'flood_001', 'name': 'Hudson River Flood Zone', 'lat': 40.7580, 'lon': -74.0000, 'type': 'flood', 'risk': 'medium', 'radius': 2000},
-    {'id': 'quake_001', 'name': 'San Andreas Fault Zone', 'lat': 37.7749, 'lon': -122.4194, 'type': 'earthquake', 'risk': 'high', 'radius': 5000},
-    {'id': 'hurricane_001', 'name': 'Miami Hurricane Zone', 'lat': 25.7617, 'lon': -80.1918, 'type': 'hurricane', 'risk': 'high', 'radius': 10000},
-]
-
-TRAFFIC_SIGNALS = [
-    {'id': 'sig_001', 'lat': 40.7580, 'lon': -73.9855, 'intersection': 'Broadway & 42nd'},
-    {'id': 'sig_002', 'lat': 37.8199, 'lon': -122.4783, 'intersection': 'GG Bridge South'},
-    {'id': 'sig_003', 'lat': 34.1016, 'lon': -118.3267, 'intersection': 'Hollywood & Highland'},
-    {'id': 'sig_004', 'lat': 41.8954, 'lon': -87.6246, 'intersection': 'Michigan & Chicago'},
-    {'id': 'sig_005', 'lat': 36.1147, 'lon': -115.1728, 'intersection': 'Las Vegas Blvd & Flamingo'},
-]
-
-PARKING_LOTS = [
-    {'id': 'park_001', 'name': 'Times Square Parking', 'lat': 40.7550, 'lon': -73.9850, 'capacity': 500, 'rate': '$8/hr'},
-    {'id': 'park_002', 'name': 'Hollywood Garage', 'lat': 34.0980, 'lon': -118.3250, 'capacity': 300, 'rate': '$5/hr'},
-    {'id': 'park_003', 'name': 'Vegas Strip Parking', 'lat': 36.1100, 'lon': -115.1700, 'capacity': 1000, 'rate': '$3/hr'},
-    {'id': 'park_004', 'name': 'Miami Beach Lot', 'lat': 25.7850, 'lon': -80.1280, 'capacity': 200, 'rate': '$4/hr'},
-]
-
-community_reports = []
+# Every process (web workers, detector pool, ingest) spools its metrics here; /metrics merges them
+metrics.spool(os.path.join('data', 'metrics'))
+REQUEST_SECONDS = metrics.histogram('http_request_duration_seconds', 'Time to produce a response (streams: until the headers)',
+                                    ['route', 'method', 'status'])
+profiler = SamplingProfiler()
+
+# Detection results keyed by content, shared by the web and detector processes (RESULT_CACHE_MB=0 disables)
+RESULT_CACHE_MB = int(os.environ.get('RESULT_CACHE_MB', 512))
+results_cache = ResultCache(os.path.join('data', 'cache'), max_bytes=RESULT_CACHE_MB * 2 ** 20) if RESULT_CACHE_MB else None
+
+# Detection runs in a process pool; sized by env so each host can match its cores. DETECTOR_WORKERS
+# and JOB_QUEUE_SIZE are per host: under gunicorn they are split between the web workers. The model
+# (YOLO_MODEL: .pt weights or an ONNX / OpenVINO export) is loaded once and shared by the pool
+# unless DETECTOR_PRELOAD=0; the pool warms up at worker start (gunicorn.conf.py) and /ready waits for it
+jobs = JobQueue(os.path.join('data', 'jobs'), workers=int(os.environ.get('DETECTOR_WORKERS', 0)) or None,
+                max_pending=int(os.environ.get('JOB_QUEUE_SIZE', 0)) or None,
+                model_path=os.environ.get('YOLO_MODEL'), backend=os.environ.get('DETECTOR_BACKEND'),
+                preload=os.environ.get('DETECTOR_PRELOAD', '1') != '0', cache=results_cache)
+
+# Resumable uploads stream to UPLOAD_FOLDER in chunks; sessions are shared by all workers. A video
+# is analysed while it arrives once UPLOAD_FOLLOW_MB have been received (and a follow slot is free)
+uploads = UploadStore(os.path.join('data', 'uploads'), UPLOAD_FOLDER)
+FOLLOW_AFTER_BYTES = float(os.environ.get('UPLOAD_FOLLOW_MB', 4)) * 2 ** 20
+
+# Dashboard payloads are rebuilt once per refresh tick and shared by all workers
+snapshots = SnapshotCache(os.path.join('data', 'snapshots'), ttl=int(os.environ.get('SNAPSHOT_TTL', 30)))
+
+# One producer per worker pushes dataset changes to every open dashboard
+# Each open stream holds a gunicorn thread (render.yaml runs 256 per worker): cap them below that
+events = EventHub(interval=int(os.environ.get('STREAM_INTERVAL', 5)), max_subscribers=int(os.environ.get('STREAM_MAX_CLIENTS', 200)) or None)
+
+reports = ReportStore(os.path.join('data', 'reports.db'))
+
+# Per-camera counts persisted with minute/hour/day rollups
+history = TimeSeriesStore(os.path.join('data', 'timeseries'), VEHICLE_CATEGORIES)
+# Written by the ingest service (ingest.py) for cameras with a live stream
+LIVE_DIR = os.path.join('data', 'live')
+HISTORICAL_SERIES = {'bikes': 'bike', 'cars': 'car', 'buses': 'bus', 'trucks': 'truck'}
+MAX_SERIES_POINTS = 10000
+forecaster = SeasonalForecaster()
+
+# Spatial indexes over the static map layers, built once at startup
+SPATIAL_LAYERS = {'cameras': CAMERA_LOCATIONS, 'pois': POIS, 'emergency': EMERGENCY_SERVICES,
+                  'parking': PARKING_LOTS, 'disaster': DISASTER_ZONES, 'signals': TRAFFIC_SIGNALS}
+spatial = {name: SpatialIndex(rows) for name, rows in SPATIAL_LAYERS.items()}
+CAMERAS_BY_ID = {c['id']: c for c in CAMERA_LOCATIONS}
+
+# Road graph for /api/route: a GeoJSON extract when ROAD_NETWORK is set, else the demo segments
+router = RoutingEngine(RoadGraph.from_geojson(os.environ['ROAD_NETWORK']) if os.environ.get('ROAD_NETWORK')
+                       else RoadGraph.from_segments(ROAD_SEGMENTS))
+PLACES = {p['name'].lower(): p for p in POIS + CAMERA_LOCATIONS + PARKING_LOTS + EMERGENCY_SERVICES}
+DISASTER_ZONES_BY_ID = {z['id']: z for z in DISASTER_ZONES}
+# Per-camera ROI polygons for motion-gated video analysis (JSON file, see motion_gate.load_rois)
+CAMERA_ROIS = load_rois(os.environ.get('CAMERA_ROIS'))
 
 def get_congestion(density):
     if density < 30: return {'level': 'free_flow', 'color': '#00ff00', 'label': 'Free Flow', 'speed': 55}
@@ -88,6 +98,85 @@ def get_congestion(density):
     elif density < 95: return {'level': 'severe', 'color': '#ff0000', 'label': 'Severe', 'speed': 10}
     else: return {'level': 'standstill', 'color': '#8b0000', 'label': 'Standstill', 'speed': 2}
 
+# Columnar payloads send congestion as an index into this table
+CONGESTION_LEVELS = [get_congestion(d) for d in [0] + CONGESTION_BOUNDS]
+TRAFFIC_SOURCES = ['simulated', 'live']
+# Simulated counts per tick, [low, high) per vehicle category
+TRAFFIC_COUNT_RANGES = {'bike': (10, 60), 'motorcycle': (15, 90), 'car': (150, 600), 'auto_rickshaw': (5, 40),
+                        'bus': (8, 35), 'truck': (12, 70), 'ambulance': (0, 5), 'police': (0, 4), 'fire_truck': (0, 2)}
+# Static records behind the columnar payloads; clients fetch them once per version from /api/static/<dataset>
+STATIC_DATASETS = {'cameras': CAMERA_LOCATIONS, 'road-segments': ROAD_SEGMENTS}
+STATIC_VERSIONS = {name: wire.static_version(records) for name, records in STATIC_DATASETS.items()}
+
+def cached_snapshot(name, columns=None):
+    """
+    Serve a view's JSON from the shared snapshot cache; name may use URL args, e.g. 'camera-{cid}'
+
+    columns, if given, is called as columns(delta) and returns wire.encode()
+    arguments; it enables the compact formats picked by ?format= or Accept,
+    and with ?since=<previous tick> only the rows that changed are sent.
+    """
+    def decorator(view):
+        def load(uncached, **kwargs):
+            def build():
+                rv = make_response(view(**kwargs))
+                if rv.status_code == 200: return rv.get_data()
+                uncached.append(rv)
+                return None
+            return snapshots.get(name.format(**kwargs), build)
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            if columns:
+                fmt = wire.negotiate(request.args.get('format'), request.headers.get('Accept'))
+                if fmt is None: return jsonify({'error': 'Unsupported format', 'formats': [f for f in wire.MEDIA_TYPES if f != 'msgpack' or wire.msgpack]}), 406
+                if fmt != 'json':
+                    delta = request.args.get('since', type=int) == snapshots.current_tick() - 1
+                    snap = snapshots.get(f'{name}.{fmt}{".delta" if delta else ""}', lambda: wire.encode(fmt, **columns(delta)))
+                    return snapshots.response(snap, wire.MEDIA_TYPES[fmt], vary='Accept')
+            uncached = []
+            snap = load(uncached, **kwargs)
+            return uncached[0] if snap is None else snapshots.response(snap, vary='Accept' if columns else None)
+        # Parsed payload for in-process consumers such as the event stream
+        def data(**kwargs):
+            with app.app_context():
+                snap = load([], **kwargs)
+            return json.loads(snap.body) if snap else None
+        wrapper.data = data
+        return wrapper
+    return decorator
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, method=request.method, status=response.status_code,
+                                route=request.url_rule.rule if request.url_rule else 'unmatched')
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 503 until this worker's detector pool has loaded and warmed up its model"""
+    ok, workers = jobs.ready()
+    return jsonify({'ready': ok, 'workers': workers}), 200 if ok else 503, {'Cache-Control': 'no-store'}
+
+@app.route('/admin/profile')
+def profile():
+    """Sample this worker's threads for ?seconds= (default 10) and return folded stacks for a flame graph"""
+    seconds = min(max(request.args.get('seconds', 10, type=float), 0.1), profiler.max_seconds)
+    try:
+        stacks, rounds = profiler.profile(seconds, include_idle=request.args.get('idle') == '1')
+    except ProfilerBusyError as e:
+        return jsonify({'error': str(e)}), 409
+    return Response(folded(stacks), mimetype='text/plain',
+                    headers={'X-Profile-Samples': str(rounds), 'X-Profile-Pid': str(os.getpid())})
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -97,67 +186,196 @@ def admin():
     return render_template('admin.html')
 
 @app.route('/api/cameras')
+@cached_snapshot('cameras')
 def get_cameras():
     return jsonify(CAMERA_LOCATIONS)
 
+def live_results(ticks=3):
+    """Per-camera results published by ingest.py within the last `ticks` ticks"""
+    results, now = {}, datetime.now(timezone.utc).timestamp()
+    if not os.path.isdir(LIVE_DIR): return results
+    for name in os.listdir(LIVE_DIR):
+        if not name.endswith('.json'): continue
+        try:
+            with open(os.path.join(LIVE_DIR, name)) as f: state = json.load(f)
+        except (OSError, ValueError): continue
+        if now - state.get('updated', 0) <= ticks * max(snapshots.ttl, state.get('interval', 0)): results[state['camera_id']] = state
+    return results
+
+def traffic_columns(tick, cameras=CAMERA_LOCATIONS, live=None):
+    """Per-camera traffic values for one tick as columns; simulated rows are seeded by tick so every worker agrees"""
+    rng = np.random.default_rng([tick, 1])
+    low, high = np.array([TRAFFIC_COUNT_RANGES[c] for c in VEHICLE_CATEGORIES]).T
+    counts = rng.integers(low, high, (len(cameras), len(VEHICLE_CATEGORIES)))
+    pedestrians = rng.integers(20, 300, len(cameras))
+    source = np.zeros(len(cameras), dtype=np.uint8)
+    if live:
+        rows = {c['id']: i for i, c in enumerate(cameras)}
+        for cid, state in live.items():
+            if cid not in rows: continue
+            counts[rows[cid]] = [state['vehicle_counts'].get(c, 0) for c in VEHICLE_CATEGORIES]
+            source[rows[cid]] = 1
+    total = counts.sum(axis=1)
+    density = np.minimum(100, total / 900 * 100)
+    return {'vehicle_counts': counts, 'total_vehicles': total, 'density': density.round(1),
+            'congestion': np.searchsorted(CONGESTION_BOUNDS, density, side='right'),
+            'pedestrians': pedestrians, 'source': source}
+
+def traffic_rows(cols, cameras=CAMERA_LOCATIONS):
+    """The /api/traffic-data JSON records for traffic_columns() output"""
+    timestamp = datetime.now().isoformat()
+    return [{**cam, 'vehicle_counts': dict(zip(VEHICLE_CATEGORIES, counts)), 'total_vehicles': total, 'density': density,
+             'congestion': CONGESTION_LEVELS[cong], 'avg_speed': CONGESTION_LEVELS[cong]['speed'], 'pedestrians': ped,
+             'source': TRAFFIC_SOURCES[src], 'timestamp': timestamp}
+            for cam, counts, total, density, cong, ped, src in zip(
+                cameras, cols['vehicle_counts'].tolist(), cols['total_vehicles'].tolist(), cols['density'].tolist(),
+                cols['congestion'].tolist(), cols['pedestrians'].tolist(), cols['source'].tolist())]
+
+_traffic = {'tick': None, 'columns': None}
+
+def current_traffic():
+    """This tick's traffic columns, computed once per worker and shared by every format"""
+    tick = snapshots.current_tick()
+    if _traffic['tick'] != tick:
+        cols = traffic_columns(tick, live=live_results())
+        def record():
+            # Each observation is stored once per tick across workers;
+            # live cameras are stored by the ingest service itself
+            for i in np.flatnonzero(cols['source'] == 0).tolist():
+                history.record(CAMERA_LOCATIONS[i]['id'], dict(zip(VEHICLE_CATEGORIES, cols['vehicle_counts'][i].tolist())))
+        snapshots.once('traffic-history', record)
+        _traffic.update(tick=tick, columns=cols)
+    return _traffic['columns']
+
+def traffic_payload(delta):
+    tick, cols = snapshots.current_tick(), current_traffic()
+    rows = None
+    if delta:
+        # Simulated rows are reproducible per tick; rows live now or last tick are always resent,
+        # so clients also see a camera whose feed went stale revert to simulated values
+        recent = live_results(ticks=4)
+        live = np.array([i for i, c in enumerate(CAMERA_LOCATIONS) if c['id'] in recent], dtype=np.intp)
+        rows = np.union1d(wire.changed_rows(traffic_columns(tick - 1), cols), live)
+    return dict(dataset='cameras', tick=tick, columns=cols, static=STATIC_VERSIONS['cameras'], rows=rows,
+                enums={'congestion': CONGESTION_LEVELS, 'source': TRAFFIC_SOURCES},
+                categories=VEHICLE_CATEGORIES, timestamp=datetime.now().isoformat())
+
 @app.route('/api/traffic-data')
+@cached_snapshot('traffic-data', columns=traffic_payload)
 def get_traffic_data():
-    data = []
-    for cam in CAMERA_LOCATIONS:
-        counts = {'bike': np.random.randint(10, 60), 'motorcycle': np.random.randint(15, 90),
-                  'car': np.random.randint(150, 600), 'auto_rickshaw': np.random.randint(5, 40),
-                  'bus': np.random.randint(8, 35), 'truck': np.random.randint(12, 70),
-                  'ambulance': np.random.randint(0, 5), 'police': np.random.randint(0, 4), 'fire_truck': np.random.randint(0, 2)}
-        total = sum(counts.values())
-        density = min(100, (total / 900) * 100)
-        cong = get_congestion(density)
-        data.append({**cam, 'vehicle_counts': counts, 'total_vehicles': total, 'density': round(density, 1),
-                     'congestion': cong, 'avg_speed': cong['speed'], 'pedestrians': np.random.randint(20, 300),
-                     'timestamp': datetime.now().isoformat()})
-    return jsonify(data)
+    return jsonify(traffic_rows(current_traffic()))
+
+def live_segments(ticks=3):
+    """Segment congestion published by ingest.py (congestion.py), while its heartbeat is within `ticks` ticks"""
+    try:
+        with open(os.path.join(LIVE_DIR, 'scheduler.stats')) as f: heartbeat = json.load(f)['updated']
+        with open(os.path.join(LIVE_DIR, 'segments.json')) as f: segments = json.load(f)['segments']
+    except (OSError, ValueError, KeyError): return {}
+    if datetime.now(timezone.utc).timestamp() - heartbeat > ticks * snapshots.ttl: return {}
+    return segments
+
+def segment_columns(tick, live=None):
+    """Per-segment values for one tick; simulated rows are seeded by tick, live rows come from live_segments()"""
+    rng = np.random.default_rng([tick, 2])
+    density = rng.integers(10, 100, len(ROAD_SEGMENTS))
+    congestion = np.searchsorted(CONGESTION_BOUNDS, density, side='right')
+    vehicles = rng.integers(50, 400, len(ROAD_SEGMENTS))
+    speed = np.array([level['speed'] for level in CONGESTION_LEVELS], dtype=np.float64)[congestion]
+    source = np.zeros(len(ROAD_SEGMENTS), dtype=np.uint8)
+    for i, road in enumerate(ROAD_SEGMENTS):
+        state = (live or {}).get(road['id'])
+        if not state: continue
+        # Values as of the segment's last level change: ingest only publishes on changes
+        density[i], congestion[i], vehicles[i], source[i] = round(state['index']), state['level'], state['flow'], 1
+        speed[i] = state['speed'] if state['speed'] is not None else CONGESTION_LEVELS[state['level']]['speed']
+    return {'density': density, 'congestion': congestion, 'vehicles': vehicles, 'avg_speed': speed, 'source': source}
+
+def segment_payload(delta):
+    tick = snapshots.current_tick()
+    cols = segment_columns(tick, live_segments())
+    rows = None
+    if delta:
+        # As for cameras: rows live now or last tick are always resent
+        recent = live_segments(ticks=4)
+        live = np.array([i for i, road in enumerate(ROAD_SEGMENTS) if road['id'] in recent], dtype=np.intp)
+        rows = np.union1d(wire.changed_rows(segment_columns(tick - 1), cols), live)
+    return dict(dataset='road-segments', tick=tick, columns=cols, static=STATIC_VERSIONS['road-segments'], rows=rows,
+                enums={'congestion': CONGESTION_LEVELS, 'source': TRAFFIC_SOURCES})
 
 @app.route('/api/road-segments')
+@cached_snapshot('road-segments', columns=segment_payload)
 def get_road_segments():
-    segments = []
-    for road in ROAD_SEGMENTS:
-        density = np.random.randint(10, 100)
-        cong = get_congestion(density)
-        segments.append({**road, 'density': density, 'congestion': cong, 'vehicles': np.random.randint(50, 400)})
-    return jsonify(segments)
+    cols = segment_columns(snapshots.current_tick(), live_segments())
+    return jsonify([{**road, 'density': density, 'congestion': CONGESTION_LEVELS[cong], 'vehicles': vehicles,
+                     'avg_speed': speed, 'source': TRAFFIC_SOURCES[src]}
+                    for road, density, cong, vehicles, speed, src in zip(
+                        ROAD_SEGMENTS, cols['density'].tolist(), cols['congestion'].tolist(), cols['vehicles'].tolist(),
+                        cols['avg_speed'].tolist(), cols['source'].tolist())])
+
+@app.route('/api/static/<dataset>')
+def static_records(dataset):
+    """Static records behind a columnar dataset; the version only changes on redeploy"""
+    if dataset not in STATIC_DATASETS: return jsonify({'error': 'Unknown dataset'}), 404
+    resp = jsonify({'version': STATIC_VERSIONS[dataset], 'records': STATIC_DATASETS[dataset]})
+    resp.set_etag(STATIC_VERSIONS[dataset])
+    resp.headers['Cache-Control'] = 'public, max-age=86400'
+    return resp.make_conditional(request)
+
+# Synthetic detection density: (count, spread in degrees, intensity range, scaled by camera base)
+HEATMAP_RINGS = [(40, 0.005, (0.8, 1.0), True), (30, 0.015, (0.4, 0.7), True), (20, 0.03, (0.2, 0.4), False)]
+# Some hot spots between cities for road traffic
+HEATMAP_HOT_SPOTS = [(39.0, -84.0), (38.0, -90.0), (35.0, -106.0), (33.5, -112.0), (32.7, -117.0)]
+
+def heatmap_points(tick):
+    """Vectorized heatmap points for one snapshot tick; seeded so every worker agrees"""
+    rng = np.random.default_rng(tick)
+    cams = np.array([[c['lat'], c['lon']] for c in CAMERA_LOCATIONS])
+    base = rng.uniform(0.6, 1.0, len(cams))
+    lats, lons, weights = [], [], []
+    for count, spread, (lo, hi), scaled in HEATMAP_RINGS:
+        centre = np.repeat(cams, count, axis=0)
+        lats.append(centre[:, 0] + rng.normal(0, spread, len(centre)))
+        lons.append(centre[:, 1] + rng.normal(0, spread, len(centre)))
+        w = rng.uniform(lo, hi, len(centre))
+        weights.append(w * np.repeat(base, count) if scaled else w)
+    spots = np.repeat(np.array(HEATMAP_HOT_SPOTS), 15, axis=0)
+    lats.append(spots[:, 0] + rng.uniform(-0.02, 0.02, len(spots)))
+    lons.append(spots[:, 1] + rng.uniform(-0.02, 0.02, len(spots)))
+    weights.append(rng.uniform(0.3, 0.6, len(spots)))
+    return np.concatenate(lats), np.concatenate(lons), np.concatenate(weights)
+
+_heatmap = {'tick': None, 'index': None}
+
+def heatmap_index():
+    """Quadtree over the current tick's points, rebuilt once per tick per worker"""
+    tick = snapshots.current_tick()
+    if _heatmap['tick'] != tick:
+        index = HeatmapIndex()
+        index.add(*heatmap_points(tick))
+        index.tile(0, 0, 0)  # force the sort now rather than on a request
+        _heatmap.update(tick=tick, index=index)
+    return _heatmap['index']
+
+def heatmap_payload(delta):
+    tick = snapshots.current_tick()
+    lat, lon, w = heatmap_points(tick)
+    # Points are regenerated every tick, so there is no meaningful delta
+    return dict(dataset='heatmap', tick=tick, columns={'lat': lat, 'lon': lon, 'intensity': w})
 
 @app.route('/api/heatmap-data')
+@cached_snapshot('heatmap-data', columns=heatmap_payload)
 def get_heatmap_data():
-    points = []
-    for cam in CAMERA_LOCATIONS:
-        # Generate dense cluster around camera location
-        base_intensity = np.random.uniform(0.6, 1.0)
-        for _ in range(40):
-            # Core points - high intensity near center
-            points.append({'lat': cam['lat'] + np.random.normal(0, 0.005),
-                          'lon': cam['lon'] + np.random.normal(0, 0.005),
-                          'intensity': base_intensity * np.random.uniform(0.8, 1.0)})
-        for _ in range(30):
-            # Medium range points
-            points.append({'lat': cam['lat'] + np.random.normal(0, 0.015),
-                          'lon': cam['lon'] + np.random.normal(0, 0.015),
-                          'intensity': base_intensity * np.random.uniform(0.4, 0.7)})
-        for _ in range(20):
-            # Outer range points
-            points.append({'lat': cam['lat'] + np.random.normal(0, 0.03),
-                          'lon': cam['lon'] + np.random.normal(0, 0.03),
-                          'intensity': np.random.uniform(0.2, 0.4)})
-    # Add some random hot spots between cities for road traffic
-    hot_spots = [
-        (39.0, -84.0), (38.0, -90.0), (35.0, -106.0), (33.5, -112.0), (32.7, -117.0)
-    ]
-    for lat, lon in hot_spots:
-        for _ in range(15):
-            points.append({'lat': lat + np.random.uniform(-0.02, 0.02),
-                          'lon': lon + np.random.uniform(-0.02, 0.02),
-                          'intensity': np.random.uniform(0.3, 0.6)})
-    return jsonify(points)
+    lat, lon, w = heatmap_points(snapshots.current_tick())
+    return jsonify([{'lat': a, 'lon': b, 'intensity': c} for a, b, c in zip(lat.tolist(), lon.tolist(), w.tolist())])
+
+@app.route('/api/heatmap/<int:z>/<int:x>/<int:y>')
+def heatmap_tile(z, x, y):
+    resp = jsonify(heatmap_index().tile(z, x, y))
+    resp.headers['Cache-Control'] = f'public, max-age={snapshots.seconds_left()}'
+    return resp
 
 @app.route('/api/traffic-signals')
+@cached_snapshot('traffic-signals')
 def get_signals():
     signals = []
     for sig in TRAFFIC_SIGNALS:
@@ -167,6 +385,7 @@ def get_signals():
     return jsonify(signals)
 
 @app.route('/api/pois')
+@cached_snapshot('pois')
 def get_pois():
     pois = []
     for poi in POIS:
@@ -175,10 +394,12 @@ def get_pois():
     return jsonify(pois)
 
 @app.route('/api/emergency-services')
+@cached_snapshot('emergency-services')
 def get_emergency():
     return jsonify(EMERGENCY_SERVICES)
 
 @app.route('/api/disaster-zones')
+@cached_snapshot('disaster-zones')
 def get_disasters():
     zones = []
     for z in DISASTER_ZONES:
@@ -186,7 +407,57 @@ def get_disasters():
                      'alert_level': random.choice(['watch', 'warning', 'emergency'])})
     return jsonify(zones)
 
+def _point_args():
+    lat, lon = request.args.get('lat', type=float), request.args.get('lon', type=float)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180): return None
+    return lat, lon
+
+@app.route('/api/spatial/<layer>/bbox')
+def spatial_bbox(layer):
+    if layer not in spatial: return jsonify({'error': 'Unknown layer'}), 404
+    try: south, west, north, east = map(float, request.args.get('bbox', '').split(','))
+    except ValueError: return jsonify({'error': 'bbox must be south,west,north,east'}), 400
+    return jsonify(spatial[layer].bbox(south, west, north, east))
+
+@app.route('/api/spatial/<layer>/nearest')
+def spatial_nearest(layer):
+    if layer not in spatial: return jsonify({'error': 'Unknown layer'}), 404
+    point = _point_args()
+    if not point: return jsonify({'error': 'lat and lon required'}), 400
+    k = min(max(request.args.get('k', 1, type=int), 1), 100)
+    ftype = request.args.get('type')
+    mask = spatial[layer].where('type', ftype) if ftype else None
+    return jsonify(spatial[layer].nearest(*point, k=k, mask=mask))
+
+@app.route('/api/spatial/<layer>/within')
+def spatial_within(layer):
+    if layer not in spatial: return jsonify({'error': 'Unknown layer'}), 404
+    point = _point_args()
+    radius = request.args.get('radius', type=float)
+    if not point or radius is None or radius < 0: return jsonify({'error': 'lat, lon and radius (meters) required'}), 400
+    return jsonify(spatial[layer].within(*point, radius))
+
+@app.route('/api/disaster-zones/<zid>/reports')
+def disaster_zone_reports(zid):
+    zone = DISASTER_ZONES_BY_ID.get(zid)
+    if not zone: return jsonify({'error': 'Not found'}), 404
+    # Bounding box of the circle via the report grid index, then the exact radius test
+    dlat = zone['radius'] / 111320
+    dlon = dlat / max(np.cos(np.radians(zone['lat'])), 1e-6)
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 500)
+    candidates, cursor = reports.in_bbox(zone['lat'] - dlat, zone['lon'] - dlon, zone['lat'] + dlat, zone['lon'] + dlon,
+                                         limit, request.args.get('cursor', type=int))
+    found = []
+    if candidates:
+        dist = haversine_m(zone['lat'], zone['lon'], np.array([r['lat'] for r in candidates]), np.array([r['lon'] for r in candidates]))
+        found = [{**r, 'distance_m': round(float(d), 1)} for r, d in zip(candidates, dist) if d <= zone['radius']]
+    # A full page may have more behind it: pass X-Next-Cursor back as ?cursor= for older reports
+    resp = jsonify(found)
+    if cursor is not None: resp.headers['X-Next-Cursor'] = str(cursor)
+    return resp
+
 @app.route('/api/parking')
+@cached_snapshot('parking')
 def get_parking():
     lots = []
     for p in PARKING_LOTS:
@@ -196,32 +467,54 @@ def get_parking():
 
 @app.route('/api/reports', methods=['GET', 'POST'])
 def handle_reports():
-    global community_reports
     if request.method == 'POST':
-        data = request.json
-        report = {'id': f'rep_{len(community_reports)+1}', 'type': data.get('type', 'general'),
-                  'description': data.get('description', ''), 'lat': data.get('lat'), 'lon': data.get('lon'),
-                  'timestamp': datetime.now().isoformat(), 'verified': False, 'upvotes': 0}
-        community_reports.append(report)
+        data = request.json or {}
+        try:
+            report = reports.add(data.get('type', 'general'), data.get('description', ''), data.get('lat'), data.get('lon'))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid coordinates: {e}'}), 400
+        events.poke()
         return jsonify({'success': True, 'report': report})
-    return jsonify(community_reports[-30:])
+    limit = min(max(request.args.get('limit', 30, type=int), 1), 500)
+    bbox = request.args.get('bbox')
+    if bbox:
+        try:
+            south, west, north, east = map(float, bbox.split(','))
+            if not (-90 <= south <= 90 and -90 <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180): raise ValueError
+        except ValueError: return jsonify({'error': 'bbox must be south,west,north,east in degrees'}), 400
+        page, cursor = reports.in_bbox(south, west, north, east, limit, request.args.get('cursor', type=int))
+    else:
+        page, cursor = reports.recent(limit, request.args.get('cursor', type=int))
+    resp = jsonify(page)
+    if cursor is not None: resp.headers['X-Next-Cursor'] = str(cursor)
+    return resp
 
 @app.route('/api/reports/<rid>/upvote', methods=['POST'])
 def upvote(rid):
-    for r in community_reports:
-        if r['id'] == rid: r['upvotes'] += 1; return jsonify({'success': True})
+    if reports.upvote(rid): events.poke(); return jsonify({'success': True})
     return jsonify({'error': 'Not found'}), 404
 
+@app.route('/api/stream')
+def stream():
+    try: messages = events.subscribe(request.headers.get('Last-Event-ID'))
+    except StreamFullError:  # the dashboard falls back to polling
+        return jsonify({'error': 'Too many live streams on this worker, poll instead'}), 503, {'Retry-After': '300'}
+    return Response(messages, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/predictions')
+@cached_snapshot('predictions')
 def predictions():
+    # Trains on newly completed hours only; the first slot is the hour in progress, so skip it
+    hours, counts, confidence = forecaster.refresh(history, list(CAMERAS_BY_ID), datetime.now(timezone.utc).timestamp(), horizon=25)
     preds = []
-    for cam in CAMERA_LOCATIONS[:5]:
-        hourly = [{'hour': h, 'count': (250 if 7<=h<=9 or 17<=h<=19 else 120) + np.random.randint(-40, 60),
-                   'confidence': round(np.random.uniform(0.75, 0.95), 2)} for h in range(24)]
+    for cam, row, conf in zip(CAMERA_LOCATIONS, counts.tolist(), confidence.tolist()):
+        hourly = [{'hour': datetime.fromtimestamp(h * 3600, timezone.utc).hour, 'time': datetime.fromtimestamp(h * 3600, timezone.utc).isoformat(),
+                   'count': int(c), 'confidence': p} for h, c, p in zip(hours[1:].tolist(), row[1:], conf[1:])]
         preds.append({'camera_id': cam['id'], 'name': cam['name'], 'predictions': hourly})
     return jsonify(preds)
 
 @app.route('/api/analytics')
+@cached_snapshot('analytics')
 def analytics():
     return jsonify({'total_cameras': len(CAMERA_LOCATIONS), 'active_cameras': len(CAMERA_LOCATIONS),
                     'vehicles_today': np.random.randint(80000, 150000), 'avg_congestion': round(np.random.uniform(35, 70), 1),
@@ -229,44 +522,252 @@ def analytics():
                     'aqi': np.random.randint(25, 160), 'carbon_tons': round(np.random.uniform(80, 350), 1),
                     'pedestrians': np.random.randint(15000, 60000), 'emergency_calls': np.random.randint(8, 30)})
 
+def _place(value):
+    """(lat, lon) from {'lat', 'lon'}, a 'lat,lon' string or a known place name"""
+    if isinstance(value, dict):
+        try: return float(value['lat']), float(value['lon'])
+        except (KeyError, TypeError, ValueError): return None
+    text = str(value or '').strip().lower()
+    try:
+        lat, lon = map(float, text.split(','))
+        return (lat, lon) if -90 <= lat <= 90 and -180 <= lon <= 180 else None
+    except ValueError: pass
+    place = PLACES.get(text) or next((p for name, p in PLACES.items() if text and text in name), None)
+    return (place['lat'], place['lon']) if place else None
+
 @app.route('/api/route', methods=['POST'])
 def route():
-    return jsonify({'routes': [
-        {'name': 'Fastest', 'time': np.random.randint(12, 40), 'dist': round(np.random.uniform(4, 18), 1), 'traffic': 'low'},
-        {'name': 'Shortest', 'time': np.random.randint(18, 50), 'dist': round(np.random.uniform(3, 12), 1), 'traffic': 'medium'},
-        {'name': 'Eco-Friendly', 'time': np.random.randint(20, 55), 'dist': round(np.random.uniform(5, 20), 1), 'traffic': 'low', 'carbon_saved': '18%'}
-    ]})
+    body = request.get_json(silent=True) or {}
+    origin, dest = _place(body.get('from')), _place(body.get('to'))
+    if not origin or not dest: return jsonify({'error': 'from and to must be lat,lon or a known place name'}), 400
+    # Speeds follow the segment snapshot from a background thread, once per tick
+    router.follow(lambda: {s['id']: s['avg_speed'] for s in get_road_segments.data()}, snapshots.ttl)
+    routes = router.route(origin, dest)
+    if routes is None: return jsonify({'error': 'No road route between these points'}), 404
+    return jsonify({'routes': routes, 'from': origin, 'to': dest})
 
 @app.route('/api/historical')
+@cached_snapshot('historical')
 def historical():
-    hours = list(range(24))
-    return jsonify({'hours': hours, 'bikes': [np.random.randint(25, 90) for _ in hours],
-                    'cars': [np.random.randint(180, 500) for _ in hours], 'buses': [np.random.randint(12, 50) for _ in hours],
-                    'trucks': [np.random.randint(25, 90) for _ in hours]})
+    # Last 24 hours for all cameras, from the hourly rollup
+    ts, counts = history.series(resolution='hour')
+    data = {'hours': [datetime.fromtimestamp(t, timezone.utc).hour for t in ts]}
+    for key, cls in HISTORICAL_SERIES.items(): data[key] = counts[:, history.classes.index(cls)].tolist()
+    return jsonify(data)
+
+def _time_arg(name):
+    """Unix seconds from ?name= given as a number or ISO 8601 (naive means UTC); None if absent"""
+    value = request.args.get(name)
+    if not value: return None
+    try: t = float(value)
+    except ValueError:
+        t = datetime.fromisoformat(value)
+        t = (t if t.tzinfo else t.replace(tzinfo=timezone.utc)).timestamp()
+    datetime.fromtimestamp(t, timezone.utc)  # out of range (or nan) raises here, not in the query
+    return t
+
+@app.route('/api/timeseries')
+def timeseries():
+    resolution = request.args.get('resolution', 'hour')
+    if resolution not in RESOLUTIONS: return jsonify({'error': f'resolution must be one of {", ".join(RESOLUTIONS)}'}), 400
+    try: start, end = _time_arg('start'), _time_arg('end')
+    except (OverflowError, OSError, ValueError): return jsonify({'error': 'start and end must be unix seconds or ISO 8601'}), 400
+    step = RESOLUTIONS[resolution][0]
+    if start is not None and (end or datetime.now(timezone.utc).timestamp()) - start > MAX_SERIES_POINTS * step:
+        return jsonify({'error': f'At most {MAX_SERIES_POINTS} points per query; use a coarser resolution'}), 400
+    cams = request.args.get('camera')
+    cams = [c for c in cams.split(',') if c in CAMERAS_BY_ID] if cams else None
+    ts, counts = history.series(cams, start, end, resolution)
+    return jsonify({'resolution': resolution, 'classes': history.classes,
+                    'timestamps': [datetime.fromtimestamp(t, timezone.utc).isoformat() for t in ts],
+                    'counts': dict(zip(history.classes, counts.T.tolist())),
+                    'totals': dict(zip(history.classes, counts.sum(axis=0).tolist()))})
 
 @app.route('/api/camera/<cid>')
+@cached_snapshot('camera-{cid}')
 def camera_detail(cid):
-    cam = next((c for c in CAMERA_LOCATIONS if c['id'] == cid), None)
+    cam = CAMERAS_BY_ID.get(cid)
     if not cam: return jsonify({'error': 'Not found'}), 404
-    counts = {c: np.random.randint(15, 120) for c in VEHICLE_CATEGORIES}
-    hourly = [{'hour': f'{h:02d}:00', 'total': np.random.randint(120, 550)} for h in range(6)]
+    now = datetime.now(timezone.utc).timestamp()
+    counts = history.totals([cid], now - 3600, now)
+    ts, series = history.series([cid], now - 6 * 3600, now, 'hour')
+    hourly = [{'hour': datetime.fromtimestamp(t, timezone.utc).strftime('%H:00'), 'total': int(row.sum())}
+              for t, row in zip(ts[-6:], series[-6:])]
     density = np.random.randint(20, 90)
     return jsonify({'camera': cam, 'vehicle_counts': counts, 'total': sum(counts.values()),
                     'hourly': hourly, 'congestion': get_congestion(density), 'timestamp': datetime.now().isoformat()})
 
-@app.route('/api/upload', methods=['POST'])
-def upload():
+events.register('cameras', lambda: get_traffic_data.data())
+events.register('segments', lambda: get_road_segments.data())
+events.register('signals', lambda: get_signals.data())
+events.register('predictions', lambda: predictions.data(), key='camera_id')
+events.register('analytics', lambda: analytics.data())
+events.register('reports', lambda: reports.recent(30)[0])
+
+def _int_arg(name, default):
+    try: return max(1, int(request.form.get(name, default)))
+    except (TypeError, ValueError): return default
+
+def _gate_options():
+    """Motion gating from the form: adaptive=1, plus roi=<JSON polygon> or camera_id=<id with a configured ROI>"""
+    if request.form.get('adaptive', '').lower() not in ('1', 'true', 'yes', 'on'): return {}
+    options = {'adaptive': True}
+    if request.form.get('max_skip'): options['max_skip'] = _int_arg('max_skip', None)
+    if request.form.get('roi'):
+        roi = json.loads(request.form['roi'])
+        if len(roi) < 3 or any(len(pt) != 2 for pt in roi): raise ValueError('roi needs at least 3 [x, y] points')
+        options['roi'] = [[float(x), float(y)] for x, y in roi]
+    elif request.form.get('camera_id') in CAMERA_ROIS:
+        options['roi'] = CAMERA_ROIS[request.form['camera_id']]
+    return options
+
+def _job_options():
+    options = dict(frame_skip=_int_arg('frame_skip', 5), batch_size=_int_arg('batch_size', 8), **_gate_options())
+    if request.form.get('render', '').lower() in ('1', 'true', 'yes', 'on'): options['render'] = True
+    if request.form.get('line'):
+        # Counting line as "position[,horizontal|vertical]"
+        position, _, direction = request.form['line'].partition(',')
+        direction = direction.strip() or 'horizontal'
+        if direction not in ('horizontal', 'vertical'): raise ValueError('line direction must be horizontal or vertical')
+        options['line'] = [int(position), direction]
+    return options
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
     if 'file' not in request.files: return jsonify({'error': 'No file'}), 400
     f = request.files['file']
-    if f.filename == '': return jsonify({'error': 'No file'}), 400
-    fname = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{f.filename}"
-    f.save(os.path.join(app.config['UPLOAD_FOLDER'], fname))
-    return jsonify({'success': True, 'file': fname, 'detections': np.random.randint(15, 60),
-                    'counts': {c: np.random.randint(1, 25) for c in VEHICLE_CATEGORIES[:6]}})
+    if f.filename == '' or not secure_filename(f.filename): return jsonify({'error': 'No file'}), 400
+    try: options = _job_options()
+    except (TypeError, ValueError) as e: return jsonify({'error': f'Invalid options: {e}'}), 400
+    fname = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secure_filename(f.filename)}"
+    path = os.path.join(app.config['UPLOAD_FOLDER'], fname)
+    f.save(path)
+    try:
+        job_id = jobs.submit(path, **options)
+    except QueueFullError:
+        return jsonify({'error': 'Analysis queue is full, try again shortly'}), 503, {'Retry-After': '30'}
+    return jsonify({'success': True, 'file': fname, 'job_id': job_id, 'status_url': f'/api/jobs/{job_id}'}), 202
+
+@app.route('/api/upload', methods=['POST'])
+def upload():
+    return submit_job()
+
+@app.route('/api/cache')
+def cache_stats():
+    if results_cache is None: return jsonify({'enabled': False})
+    return jsonify(dict(results_cache.stats(), enabled=True))
+
+# Chunked uploads: POST creates a session, PATCH appends a chunk at Upload-Offset, GET/HEAD
+# reports the offset to resume from. Videos are analysed while they arrive; images once complete.
+def _upload_view(state):
+    job_id = state.get('job_id')
+    return {'upload_id': state['id'], 'file': state['file'], 'offset': state['offset'], 'size': state['size'],
+            'complete': state['complete'], 'job_id': job_id, 'status_url': f'/api/jobs/{job_id}' if job_id else None,
+            'job': jobs.status(job_id) if job_id else None}
+
+def _upload_response(state, code=200):
+    return jsonify(_upload_view(state)), code, {'Upload-Offset': str(state['offset'])}
+
+def _start_job(state):
+    """Submit an upload's analysis once: a video when enough of it has arrived to follow, anything when complete"""
+    def start(state):
+        path = os.path.join(UPLOAD_FOLDER, state['file'])
+        if state['complete']:
+            # A followed job that gave up on a stalled upload is rerun on the whole file
+            job = jobs.status(state['job_id']) if state.get('job_id') else None
+            if job is None or (state.get('follow') and job['status'] == 'failed'):
+                # Runs under the upload's lock: the worker, not this request, hashes the file for the cache
+                return {'job_id': jobs.submit(path, lookup_in_worker=True, **state['options']), 'follow': False}
+        elif (not state.get('job_id') and os.path.splitext(state['file'])[1].lower() in VIDEO_EXTENSIONS
+              and state['offset'] >= FOLLOW_AFTER_BYTES):
+            try: return {'job_id': jobs.submit(path, follow=str(uploads.state_path(state['id'])), **state['options']), 'follow': True}
+            except QueueFullError: return None  # no room to follow: analysed once complete
+        return None
+    return uploads.claim(state['id'], start)
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    name = secure_filename(request.form.get('filename', ''))
+    if not name: return jsonify({'error': 'No filename'}), 400
+    try:
+        size = int(request.form['size']) if request.form.get('size') else None
+        if size is not None and size < 0: raise ValueError('size must not be negative')
+        options = _job_options()
+    except (TypeError, ValueError) as e: return jsonify({'error': f'Invalid upload: {e}'}), 400
+    state = uploads.create(name, size, options=options)
+    try: state = _start_job(state)
+    except QueueFullError:
+        uploads.discard(state['id'])
+        return jsonify({'error': 'Analysis queue is full, try again shortly'}), 503, {'Retry-After': '30'}
+    return _upload_response(state, 201)
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    state = uploads.status(upload_id)
+    if not state: return jsonify({'error': 'Not found'}), 404
+    return _upload_response(state)
+
+@app.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def upload_chunk(upload_id):
+    try: offset = int(request.headers['Upload-Offset'])
+    except (KeyError, ValueError): return jsonify({'error': 'Upload-Offset header required'}), 400
+    state = uploads.status(upload_id)
+    if not state: return jsonify({'error': 'Not found'}), 404
+    if state['size'] is not None and offset + (request.content_length or 0) > state['size']:
+        return jsonify({'error': 'Chunk runs past the declared size'}), 413
+    try: state = uploads.append(upload_id, offset, request.stream)
+    except OffsetMismatchError as e:
+        return jsonify({'error': 'Offset mismatch', 'offset': e.offset}), 409, {'Upload-Offset': str(e.offset)}
+    except ValueError as e: return jsonify({'error': str(e)}), 413
+    try: state = _start_job(state)
+    except QueueFullError: return jsonify({'error': 'Analysis queue is full, retry /complete shortly'}), 503, {'Retry-After': '30'}
+    return _upload_response(state)
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    try: state = uploads.complete(upload_id)
+    except KeyError: return jsonify({'error': 'Not found'}), 404
+    except OffsetMismatchError as e:
+        return jsonify({'error': 'Upload is not complete', 'offset': e.offset}), 409, {'Upload-Offset': str(e.offset)}
+    try: state = _start_job(state)
+    except QueueFullError: return jsonify({'error': 'Analysis queue is full, try again shortly'}), 503, {'Retry-After': '30'}
+    return _upload_response(state)
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.status(job_id)
+    if not job: return jsonify({'error': 'Not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/result')
+def job_result(job_id):
+    job = jobs.status(job_id)
+    if not job: return jsonify({'error': 'Not found'}), 404
+    if job['status'] == 'failed': return jsonify({'error': job.get('error', 'Job failed')}), 500
+    if job['status'] != 'done': return jsonify({'status': job['status']}), 202
+    return jsonify(job['result'])
+
+@app.route('/api/jobs/<job_id>/render')
+def job_render(job_id):
+    """Annotated video (or image) of a job submitted with render=1"""
+    job = jobs.status(job_id)
+    path = ((job or {}).get('result') or {}).get('render', {}).get('path')
+    if not path or not os.path.exists(path): return jsonify({'error': 'Not found'}), 404
+    return send_file(os.path.abspath(path), conditional=True)
+
+@app.route('/api/cameras/<cid>/preview.mjpg')
+def camera_preview(cid):
+    """Live annotated MJPEG preview, published by the ingest service (ingest.py --preview-fps)"""
+    if cid not in CAMERAS_BY_ID: return jsonify({'error': 'Not found'}), 404
+    path = os.path.join(LIVE_DIR, f'{cid}.jpg')
+    if not os.path.exists(path): return jsonify({'error': 'No live preview for this camera'}), 404
+    return Response(mjpeg_stream(path), mimetype='multipart/x-mixed-replace; boundary=frame',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 if __name__ == '__main__':
     print("🚗 Smart City Traffic Platform Starting...")
     print("📍 Public: http://localhost:5000")
     print("📊 Admin: http://localhost:5000/admin")
     port = int(os.environ.get('PORT', 7860))
+    jobs.warm_up()
     app.run(debug=False, host='0.0.0.0', port=port)
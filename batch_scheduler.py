@@ -0,0 +1,166 @@
+"""
+Dynamic Batching Scheduler for Detection
+Collects frames from any number of callers into batched model calls with a bounded wait
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from metrics import registry as metrics
+
+QUEUE_DEPTH = metrics.gauge('batch_scheduler_queue_depth', 'Frames waiting for a batch')
+BATCH_SIZE = metrics.histogram('batch_scheduler_batch_size', 'Frames per model call', buckets=(1, 2, 4, 8, 16, 32, 64))
+LATENCY = metrics.histogram('batch_scheduler_latency_seconds', 'Submit to result per frame, including the batch wait')
+
+class SchedulerBusyError(Exception):
+    """Raised when the scheduler queue is full; callers should drop the frame"""
+
+
+class BatchScheduler:
+    """
+    Single dispatcher in front of a batch detection function
+
+    Callers submit one frame and get a Future. The dispatcher starts a batch
+    as soon as the queue is non-empty and flushes it when it reaches
+    max_batch frames or when the oldest frame has waited max_wait seconds,
+    so a lone camera pays at most max_wait extra latency while many cameras
+    share each model call. It also flushes early when the recent arrival rate
+    says the next frame will not come before the deadline, so light load
+    does not wait for batches that cannot fill. Results are scattered back
+    to the futures in submission order.
+    """
+
+    def __init__(self, detect_batch, max_batch=16, max_wait=0.02, max_queue=256, latency_window=2048):
+        """
+        Args:
+            detect_batch: Callable(frames, confidence_threshold) -> list of detection lists,
+                e.g. YOLOVehicleDetector.detect_batch
+            max_batch: Most frames per model call
+            max_wait: Seconds the oldest queued frame may wait for a batch to fill
+            max_queue: Queued frames accepted before submit() raises SchedulerBusyError
+            latency_window: Recent end-to-end latencies kept for percentiles
+        """
+        self.detect_batch = detect_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._last_submit = None
+        self._gap = float('inf')  # smoothed seconds between submissions
+        self.batch_sizes = np.zeros(max_batch + 1, dtype=np.int64)  # histogram, index = size
+        self.queue_depths = np.zeros(max_queue + 1, dtype=np.int64)  # sampled when a batch starts
+        self.latencies = deque(maxlen=latency_window)
+        self.submitted = 0
+        self.rejected = 0
+        self.frames = 0
+        self.busy_seconds = 0.0
+        self.started = time.monotonic()
+        QUEUE_DEPTH.set_function(lambda: len(self._queue))
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='batch-scheduler', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+
+    def submit(self, frame, confidence_threshold=0.5):
+        """
+        Queue one frame for detection
+
+        Returns:
+            Future resolving to the frame's detection list
+        """
+        self.start()
+        future = Future()
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                raise SchedulerBusyError(f'{len(self._queue)} frames already queued')
+            now = time.monotonic()
+            if self._last_submit is not None:
+                gap = now - self._last_submit
+                self._gap = gap if self._gap == float('inf') else 0.8 * self._gap + 0.2 * gap
+            self._last_submit = now
+            self._queue.append((now, confidence_threshold, frame, future))
+            self.submitted += 1
+            self._cond.notify()
+        return future
+
+    def detect(self, frame, confidence_threshold=0.5, timeout=None):
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(frame, confidence_threshold).result(timeout)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._stopped:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            self.queue_depths[min(len(self._queue), self.max_queue)] += 1
+            deadline = self._queue[0][0] + self.max_wait
+            while len(self._queue) < self.max_batch and not self._stopped:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._gap > remaining:
+                    break
+                self._cond.wait(remaining)
+            # One model call takes one threshold: batch the head's threshold only
+            threshold = self._queue[0][1]
+            batch, rest = [], deque()
+            while self._queue and len(batch) < self.max_batch:
+                item = self._queue.popleft()
+                (batch if item[1] == threshold else rest).append(item)
+            self._queue.extendleft(reversed(rest))
+            return threshold, batch
+
+    def _run(self):
+        while True:
+            job = self._next_batch()
+            if job is None:
+                return
+            threshold, batch = job
+            start = time.monotonic()
+            try:
+                results = self.detect_batch([item[2] for item in batch], threshold)
+            except Exception as e:
+                for item in batch:
+                    item[3].set_exception(e)
+                continue
+            finally:
+                self.busy_seconds += time.monotonic() - start
+                self.batch_sizes[len(batch)] += 1
+                self.frames += len(batch)
+                BATCH_SIZE.observe(len(batch))
+            done = time.monotonic()
+            for item, result in zip(batch, results):
+                self.latencies.append(done - item[0])
+                LATENCY.observe(done - item[0])
+                item[3].set_result(result)
+
+    def stats(self):
+        """Counters, histograms (non-zero buckets only) and latency percentiles in ms"""
+        latencies = np.array(self.latencies) * 1000
+        batches = int(self.batch_sizes.sum())
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            'queue_depth': len(self._queue), 'submitted': self.submitted, 'rejected': self.rejected,
+            'frames': self.frames, 'batches': batches,
+            'mean_batch': round(self.frames / batches, 2) if batches else 0,
+            'batch_size_histogram': {int(i): int(n) for i, n in enumerate(self.batch_sizes) if n},
+            'queue_depth_histogram': {int(i): int(n) for i, n in enumerate(self.queue_depths) if n},
+            'latency_ms': {f'p{q}': round(float(np.percentile(latencies, q)), 2) for q in (50, 95, 99)} if len(latencies) else {},
+            'utilization': round(min(1.0, self.busy_seconds / elapsed), 3),
+        }
@@ -0,0 +1,96 @@
+"""
+Benchmark: BatchScheduler vs one model call per frame
+
+Simulates N cameras each producing frames at a fixed rate, with one frame in
+flight per camera (as in ingest.py; frames that arrive while busy are
+dropped). The model is simulated by a fixed per-call overhead plus a
+per-frame cost, released from the GIL like real inference. Reports processed
+frames per second, model utilization and end-to-end latency from frame
+capture to result.
+
+Usage:
+    python benchmarks/bench_batching.py [--overhead MS] [--per-frame MS] [--fps N] [--seconds S]
+"""
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from batch_scheduler import BatchScheduler
+
+
+def make_model(overhead, per_frame):
+    lock = threading.Lock()
+
+    def detect_batch(frames, confidence_threshold=0.5):
+        with lock:  # one model instance
+            time.sleep(overhead + per_frame * len(frames))
+        return [[] for _ in frames]
+    return detect_batch
+
+
+def run(cameras, fps, seconds, detect):
+    """Camera threads calling detect(frame) -> detections; returns (frames/s, latencies ms)"""
+    latencies, done = [], threading.Event()
+    period = 1.0 / fps
+
+    def camera(offset):
+        next_frame = time.monotonic() + offset
+        while not done.is_set():
+            now = time.monotonic()
+            if now < next_frame:
+                time.sleep(next_frame - now)
+            captured = time.monotonic()
+            detect(None)
+            latencies.append(time.monotonic() - captured)
+            # Frames that arrived while we were busy are dropped
+            next_frame += period * max(1, int((time.monotonic() - next_frame) // period) + 1)
+
+    threads = [threading.Thread(target=camera, args=(i * period / cameras,), daemon=True) for i in range(cameras)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    done.set()
+    for t in threads:
+        t.join()
+    return len(latencies) / (time.monotonic() - start), np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--overhead', type=float, default=6.0, help='ms per model call')
+    parser.add_argument('--per-frame', type=float, default=1.5, help='ms per frame in a call')
+    parser.add_argument('--fps', type=float, default=15, help='frames per second per camera')
+    parser.add_argument('--seconds', type=float, default=4)
+    parser.add_argument('--cameras', type=int, nargs='+', default=[1, 8, 32, 64])
+    args = parser.parse_args()
+    detect_batch = make_model(args.overhead / 1000, args.per_frame / 1000)
+    capacity_single = 1000 / (args.overhead + args.per_frame)
+    print(f"Model: {args.overhead} ms/call + {args.per_frame} ms/frame "
+          f"(max {capacity_single:.0f} frames/s unbatched); cameras at {args.fps:g} fps")
+    print(f"{'cameras':>7} {'mode':<22} {'offered':>8} {'frames/s':>9} {'p50 ms':>7} {'p99 ms':>7} {'mean batch':>10}")
+
+    for n in args.cameras:
+        offered = n * args.fps
+        fps, lat = run(n, args.fps, args.seconds, lambda frame: detect_batch([frame])[0])
+        print(f"{n:7d} {'per-frame calls':<22} {offered:8.0f} {fps:9.1f} {np.percentile(lat, 50):7.1f} "
+              f"{np.percentile(lat, 99):7.1f} {1:10.2f}")
+        for max_wait in (0, 0.005, 0.02):
+            scheduler = BatchScheduler(detect_batch, max_batch=16, max_wait=max_wait)
+            fps, lat = run(n, args.fps, args.seconds, scheduler.detect)
+            scheduler.stop()
+            stats = scheduler.stats()
+            print(f"{n:7d} {f'scheduler, wait {max_wait * 1000:g} ms':<22} {offered:8.0f} {fps:9.1f} "
+                  f"{np.percentile(lat, 50):7.1f} {np.percentile(lat, 99):7.1f} {stats['mean_batch']:10.2f}")
+    print("Batch size histogram (last run):", stats['batch_size_histogram'])
+    print("Queue depth histogram (last run):", stats['queue_depth_histogram'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark: analysis that follows a chunked upload vs analysis after it
+
+A writer thread appends a synthetic AVI to an UploadStore session in chunks
+at a fixed network rate while detect_from_video reads it through
+GrowingVideoCapture. Reports when the first partial counts appeared and when
+the result was ready, against the upload-then-analyse baseline. A second
+upload of the same file, read chunk by chunk from disk like a request
+stream, measures the peak Python memory allocated while writing it.
+
+Usage:
+    python benchmarks/bench_chunked_upload.py [--mbps N] [--chunk-mb N] [--frames N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from chunked_upload import GrowingVideoCapture, UploadStore, upload_complete
+from vehicle_detector import YOLOVehicleDetector
+
+
+def make_clip(path, frames, width=1280, height=720, fps=30):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    rng = np.random.default_rng(0)
+    background = rng.integers(60, 90, (height, width, 3), dtype=np.uint8)
+    for i in range(frames):
+        frame = background.copy()
+        cv2.rectangle(frame, ((i * 7) % width, 300), ((i * 7) % width + 120, 360), (40, 180, 230), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+class LimitedStream:
+    """At most `remaining` bytes of a file, like a request body stream"""
+
+    def __init__(self, f, remaining):
+        self.f = f
+        self.remaining = remaining
+
+    def read(self, n):
+        piece = self.f.read(min(n, self.remaining))
+        self.remaining -= len(piece)
+        return piece
+
+
+def upload(store, upload_id, source, chunk, rate=None):
+    """Send a file in chunks, paced to rate bytes/s"""
+    size = os.path.getsize(source)
+    start = time.monotonic()
+    with open(source, 'rb') as f:
+        for offset in range(0, size, chunk):
+            store.append(upload_id, offset, LimitedStream(f, chunk))
+            delay = start + min(size, offset + chunk) / rate - time.monotonic() if rate else 0
+            if delay > 0:
+                time.sleep(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mbps', type=float, default=40, help='simulated upload bandwidth in megabits/s')
+    parser.add_argument('--chunk-mb', type=float, default=2)
+    parser.add_argument('--frames', type=int, default=600)
+    args = parser.parse_args()
+
+    detector = YOLOVehicleDetector()
+    rate = args.mbps * 1e6 / 8
+    with tempfile.TemporaryDirectory() as root:
+        source = make_clip(os.path.join(root, 'clip.avi'), args.frames)
+        size = os.path.getsize(source)
+        chunk = int(args.chunk_mb * 2 ** 20)
+        (Path(root) / 'uploads').mkdir()
+        store = UploadStore(Path(root) / 'state', Path(root) / 'uploads')
+        session = store.create('clip.avi', size)
+        path = Path(root) / 'uploads' / session['file']
+
+        first = []
+        start = time.monotonic()
+        writer = threading.Thread(target=upload, args=(store, session['id'], source, chunk, rate))
+        writer.start()
+        video = GrowingVideoCapture(path, lambda: upload_complete(store.state_path(session['id'])), poll=0.05)
+        result = detector.detect_from_video(video, on_progress=lambda p: first or first.append(time.monotonic() - start))
+        followed = time.monotonic() - start
+        writer.join()
+        uploaded = size / rate
+
+        start = time.monotonic()
+        baseline = detector.detect_from_video(str(path))
+        analysis = time.monotonic() - start
+
+        tracemalloc.start()
+        upload(store, store.create('again.avi', size)['id'], source, chunk)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    print(f"clip: {size / 2 ** 20:.1f} MB, {result['total_frames']} frames, upload at {args.mbps} Mbit/s = {uploaded:.1f}s")
+    print(f"upload then analyse : result at {uploaded + analysis:.1f}s")
+    print(f"follow the upload   : first counts at {first[0] if first else followed:.1f}s, result at {followed:.1f}s "
+          f"({result['processed_frames']} frames, baseline {baseline['processed_frames']})")
+    print(f"peak allocation writing {size / 2 ** 20:.1f} MB in {args.chunk_mb} MB chunks: {peak / 2 ** 20:.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
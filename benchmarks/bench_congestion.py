@@ -0,0 +1,84 @@
+"""
+Benchmark: CongestionEngine updates over thousands of road segments
+
+Feeds every segment several noisy observations per simulated second, with
+each segment's true occupancy drifting slowly through the level boundaries,
+and reports the update cost and how many level changes are published with
+and without hysteresis.
+
+Usage:
+    python benchmarks/bench_congestion.py [--segments N] [--rate HZ] [--seconds S]
+"""
+
+import argparse
+import bisect
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from congestion import LEVEL_BOUNDS, CongestionEngine, congestion_index
+
+
+def simulate(n_segments, rate, seconds, seed=0):
+    """Per step, the (occupancy, speed in m/s) observed for every segment"""
+    rng = np.random.default_rng(seed)
+    steps = int(seconds * rate)
+    # Slow random walk of the true occupancy plus per-observation detection noise
+    drift = np.cumsum(rng.normal(0, 0.004, (steps, n_segments)), axis=0)
+    occupancy = np.clip(rng.uniform(0.05, 0.5, n_segments) + drift + rng.normal(0, 0.04, (steps, n_segments)), 0, 1)
+    speed = np.clip(25 * (1 - occupancy) + rng.normal(0, 2, occupancy.shape), 0, None)
+    return occupancy, speed
+
+
+def run(engine, ids, occupancy, speed, rate, start=0.0):
+    """Feed every observation; returns (seconds spent, level changes published)"""
+    changes = 0
+    elapsed = 0.0
+    for step in range(len(occupancy)):
+        t = start + step / rate
+        occ, v = occupancy[step].tolist(), speed[step].tolist()
+        begin = time.perf_counter()
+        for sid, o, s in zip(ids, occ, v):
+            if engine.observe(sid, t, o, 1, (s,)):
+                changes += 1
+        elapsed += time.perf_counter() - begin
+    return elapsed, changes
+
+
+def raw_changes(occupancy, speed, free_speed=55):
+    """Level changes a plain per-observation threshold would publish"""
+    levels = None
+    changes = 0
+    for occ, v in zip(occupancy.tolist(), speed.tolist()):
+        now = [bisect.bisect_right(LEVEL_BOUNDS, congestion_index(o, s * 2.23694 / free_speed)) for o, s in zip(occ, v)]
+        if levels is not None:
+            changes += sum(a != b for a, b in zip(levels, now))
+        levels = now
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--segments', type=int, default=5000)
+    parser.add_argument('--rate', type=float, default=5, help='observations per segment per second')
+    parser.add_argument('--seconds', type=float, default=60, help='simulated time')
+    parser.add_argument('--window', type=float, default=60)
+    args = parser.parse_args()
+
+    occupancy, speed = simulate(args.segments, args.rate, args.seconds)
+    ids = [f'seg_{i:05d}' for i in range(args.segments)]
+    engine = CongestionEngine(dict.fromkeys(ids, 55), window=args.window)
+    elapsed, changes = run(engine, ids, occupancy, speed, args.rate)
+    n = occupancy.size
+    print(f"segments: {args.segments}  rate: {args.rate:g}/s  simulated: {args.seconds:g}s  observations: {n}")
+    print(f"update: {elapsed / n * 1e6:.2f} us each, {n / elapsed:,.0f} observations/s "
+          f"({n / args.seconds / (n / elapsed):.1%} of one core in real time)")
+    print(f"level changes published: {changes - args.segments} with hysteresis "
+          f"(plus {args.segments} initial levels), {raw_changes(occupancy, speed)} without")
+
+
+if __name__ == '__main__':
+    main()
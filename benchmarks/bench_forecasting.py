@@ -0,0 +1,81 @@
+"""
+Benchmark: SeasonalForecaster across many cameras
+
+Generates hourly counts with daily and weekly rush-hour patterns, a per-camera
+scale, slow drift, noise and random outages, trains on all but the last week,
+then steps through that week one hour at a time as the app does and scores
+the next-hour and 24-hour-ahead forecasts against a same-hour-last-week
+baseline.
+
+Usage:
+    python benchmarks/bench_forecasting.py [--cameras N] [--weeks N]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from forecasting import SEASON, SeasonalForecaster, hour_of_week
+
+
+def synthetic(n_cameras, hours, first_hour, seed=0):
+    rng = np.random.default_rng(seed)
+    slot = hour_of_week(first_hour + np.arange(hours))
+    hod, weekend = slot % 24, slot >= 120
+    rush = np.exp(-0.5 * ((hod - 8) / 1.5) ** 2) + np.exp(-0.5 * ((hod - 17.5) / 2) ** 2)
+    shape = np.where(weekend, 0.5 + 0.6 * np.exp(-0.5 * ((hod - 14) / 4) ** 2), 0.3 + 1.2 * rush)
+    scale = rng.lognormal(6, 0.8, n_cameras)
+    drift = 1 + np.cumsum(rng.normal(0, 0.002, (hours, n_cameras)), axis=0)
+    values = shape[:, None] * scale[None, :] * drift * rng.lognormal(0, 0.1, (hours, n_cameras))
+    values[rng.random((hours, n_cameras)) < 0.01] = 0  # outages
+    return np.round(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cameras', type=int, default=10000)
+    parser.add_argument('--weeks', type=int, default=5)
+    args = parser.parse_args()
+
+    first_hour = 480000  # an arbitrary epoch hour (October 2024)
+    hours = args.weeks * SEASON
+    data = synthetic(args.cameras, hours, first_hour)
+    ids = [f'cam_{i}' for i in range(args.cameras)]
+    train = hours - SEASON
+    print(f"{args.cameras:,} cameras, {hours} hours ({data.nbytes / 1e6:.0f} MB)")
+
+    model = SeasonalForecaster()
+    t = time.perf_counter()
+    model.update(first_hour, data[:train], ids)
+    print(f"Initial fit on {train} hours: {time.perf_counter() - t:.2f}s")
+    t = time.perf_counter()
+    model.forecast(24)
+    print(f"24-hour forecast for all cameras: {(time.perf_counter() - t) * 1000:.1f} ms")
+
+    step_times, errors_1h, errors_24h, base_1h, base_24h = [], [], [], [], []
+    for h in range(train, hours - 24):
+        _, pred, _ = model.forecast(24)
+        truth_1, truth_24 = data[h], data[h + 23]
+        live_1, live_24 = truth_1 > 0, truth_24 > 0
+        errors_1h.append(np.abs(pred[live_1, 0] - truth_1[live_1]) / truth_1[live_1])
+        errors_24h.append(np.abs(pred[live_24, 23] - truth_24[live_24]) / truth_24[live_24])
+        last_week_1, last_week_24 = data[h - SEASON], data[h + 23 - SEASON]
+        base_1h.append(np.abs(last_week_1[live_1] - truth_1[live_1]) / truth_1[live_1])
+        base_24h.append(np.abs(last_week_24[live_24] - truth_24[live_24]) / truth_24[live_24])
+        t = time.perf_counter()
+        model.update(first_hour + h, data[h:h + 1], ids)
+        step_times.append(time.perf_counter() - t)
+
+    ms = np.array(step_times) * 1000
+    print(f"Incremental hourly update: mean {ms.mean():.2f} ms, max {ms.max():.2f} ms")
+    mape = lambda errs: 100 * np.median(np.concatenate(errs))
+    print(f"Median abs % error, next hour: model {mape(errors_1h):.1f}%  vs last week {mape(base_1h):.1f}%")
+    print(f"Median abs % error, 24 h ahead: model {mape(errors_24h):.1f}%  vs last week {mape(base_24h):.1f}%")
+
+
+if __name__ == '__main__':
+    main()
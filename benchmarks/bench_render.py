@@ -0,0 +1,91 @@
+"""
+Benchmark: annotated video output, inline vs background writer
+
+Runs detect_from_video over a synthetic clip three ways: no rendering, the
+naive approach (decode the video a second time and draw/encode each frame
+inline, as draw_detections would per image) and render_to, which reuses the
+decoded frames and draws/encodes on a writer thread. The model cost is
+simulated in demo mode, released from the GIL like real inference.
+
+Usage:
+    python benchmarks/bench_render.py [video_path] [--frame-skip N] [--model-ms MS] [--output PATH]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench_video_pipeline import make_synthetic_video
+from render import draw_overlay, open_writer
+from vehicle_detector import YOLOVehicleDetector
+
+
+def naive_render(detector, video, output, frame_skip):
+    """Detect first, then decode again and annotate/encode inline"""
+    results = {r['frame']: r['detections'] for r in detector.stream_video(video, frame_skip)}
+    cap = cv2.VideoCapture(video)
+    writer = None
+    n = 0
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if n in results:
+            if writer is None:
+                writer, _ = open_writer(output, 30 / frame_skip, (frame.shape[1], frame.shape[0]))
+            writer.write(draw_overlay(frame, results[n]))
+        n += 1
+    cap.release()
+    writer.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('video', nargs='?')
+    parser.add_argument('--frame-skip', type=int, default=2)
+    parser.add_argument('--model-ms', type=float, default=15, help='simulated model ms per frame (demo mode)')
+    parser.add_argument('--output', help='keep the rendered video here')
+    args = parser.parse_args()
+
+    detector = YOLOVehicleDetector()
+    if not detector.use_yolo:
+        run_batch = detector._run_batch
+
+        def slow_batch(frames, confidence_threshold):
+            time.sleep(args.model_ms / 1000 * len(frames))
+            return run_batch(frames, confidence_threshold)
+        detector._run_batch = slow_batch
+
+    with tempfile.TemporaryDirectory() as workdir:
+        video = args.video or make_synthetic_video(os.path.join(workdir, 'synthetic.avi'))
+        output = args.output or os.path.join(workdir, 'annotated.mp4')
+
+        start = time.perf_counter()
+        plain = detector.detect_from_video(video, args.frame_skip)
+        plain_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        naive_render(detector, video, os.path.join(workdir, 'naive.mp4'), args.frame_skip)
+        naive_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rendered = detector.detect_from_video(video, args.frame_skip, render_to=output, line=[360, 'horizontal'])
+        render_time = time.perf_counter() - start
+        size = os.path.getsize(output)
+
+    r = rendered['render']
+    print(f"mode: {'yolo' if detector.use_yolo else 'demo'}  frames={plain['total_frames']}  frame_skip={args.frame_skip}")
+    print(f"detect only          : {plain_time:.2f}s")
+    print(f"detect + naive render: {naive_time:.2f}s  (+{naive_time - plain_time:.2f}s)")
+    print(f"detect + render_to   : {render_time:.2f}s  (+{render_time - plain_time:.2f}s)  "
+          f"{r['frames']} frames, {r['codec']} at {r['fps']:.0f} fps, {size / 2 ** 20:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
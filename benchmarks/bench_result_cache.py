@@ -0,0 +1,97 @@
+"""
+Benchmark: detection with and without the content-addressed result cache
+
+Runs detect_batch over a set of distinct 720p frames twice: cold (every
+frame misses and is stored in memory) and warm (served from the memory
+LRU). Then runs detect_from_image over the same frames saved as image files,
+cold and from disk only (a fresh cache on the same directory, as another
+worker process would see it): only whole files reach the disk tier. The
+model cost is simulated per frame in demo mode, whose results are otherwise
+never persisted. Finally the disk tier is refilled under a small size limit
+to show eviction.
+
+Usage:
+    python benchmarks/bench_result_cache.py [--frames N] [--model-ms MS]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from result_cache import ResultCache
+from vehicle_detector import YOLOVehicleDetector
+
+
+def timed(detector, frames, batch_size=8):
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        detector.detect_batch(frames[i:i + batch_size])
+    return time.perf_counter() - start
+
+
+def timed_files(detector, paths):
+    start = time.perf_counter()
+    for path in paths:
+        detector.detect_from_image(path)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--model-ms', type=float, default=40, help='simulated model ms per frame (demo mode)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(args.frames)]
+    with tempfile.TemporaryDirectory() as root:
+        paths = [os.path.join(root, f'frame_{i:04d}.png') for i in range(len(frames))]
+        for path, frame in zip(paths, frames):
+            cv2.imwrite(path, frame)
+        detector = YOLOVehicleDetector(cache=ResultCache(Path(root) / 'cache'))
+        if not detector.use_yolo:
+            run_batch, demo = detector._run_batch, detector._generate_demo_detections
+
+            def slow_batch(batch, confidence_threshold):
+                time.sleep(args.model_ms / 1000 * len(batch))
+                return run_batch(batch, confidence_threshold)
+
+            def slow_demo():
+                time.sleep(args.model_ms / 1000)
+                return demo()
+            detector._run_batch, detector._generate_demo_detections = slow_batch, slow_demo
+            detector.model_id = 'bench'  # stand in for real weights, so results are persisted
+
+        cold = timed(detector, frames)
+        warm = timed(detector, frames)
+        files_cold = timed_files(detector, paths)
+        detector.cache.flush_stats()
+        detector.cache = ResultCache(Path(root) / 'cache')
+        disk = timed_files(detector, paths)
+        stats = detector.cache.stats()
+
+        small = ResultCache(Path(root) / 'small', max_bytes=20_000, rescan_every=16)
+        for i in range(2000):
+            small.put(small.key('bench', str(i)), [{'type': 'car', 'confidence': 0.9, 'bbox': [i, i, i + 10, i + 10]}])
+        bounded = small.stats()
+
+    n = len(frames)
+    print(f"mode: {'yolo' if detector.use_yolo else 'demo'}  frames={n}")
+    print(f"frames cold         : {cold:.2f}s  {n / cold:8.1f} frames/s")
+    print(f"frames memory tier  : {warm:.2f}s  {n / warm:8.1f} frames/s")
+    print(f"files cold          : {files_cold:.2f}s  {n / files_cold:8.1f} files/s")
+    print(f"files disk tier     : {disk:.2f}s  {n / disk:8.1f} files/s  ({stats['disk_entries']} entries on disk)")
+    print(f"hit rate {stats['hit_rate']}  ({stats['memory_hits']} memory, {stats['disk_hits']} disk, {stats['misses']} misses)")
+    print(f"bounded tier: 2000 puts, {bounded['disk_entries']} entries / {bounded['disk_bytes']} bytes kept "
+          f"(limit {bounded['max_bytes']}), {bounded['evictions']} evicted")
+
+
+if __name__ == '__main__':
+    main()
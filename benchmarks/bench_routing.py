@@ -0,0 +1,109 @@
+"""
+Benchmark: RoutingEngine on a synthetic city grid
+
+Builds a square street grid (~110 m blocks) with an arterial every tenth row
+and column, applies random congestion per street, and times fastest, shortest
+and eco queries between random points. A sample of routes is checked against
+plain Dijkstra to confirm the landmark heuristic never costs optimality.
+
+Usage:
+    python benchmarks/bench_routing.py [--size N] [--queries N] [--landmarks N] [--headroom X]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from routing import METERS_PER_MILE, MIN_FUEL_PER_MILE, RoadGraph, RoutingEngine, _dijkstra
+
+BLOCK_DEG = 0.001
+
+
+def grid_lines(size, lat0=40.70, lon0=-74.02):
+    lines = []
+    for i in range(size):
+        speed = 45 if i % 10 == 0 else 25
+        lines.append({'id': f'row_{i}', 'free_speed': speed,
+                      'coords': [[lat0 + i * BLOCK_DEG, lon0 + j * BLOCK_DEG] for j in range(size)]})
+        lines.append({'id': f'col_{i}', 'free_speed': speed,
+                      'coords': [[lat0 + j * BLOCK_DEG, lon0 + i * BLOCK_DEG] for j in range(size)]})
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', type=int, default=320, help='grid side (size^2 nodes)')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--landmarks', type=int, default=8)
+    parser.add_argument('--headroom', type=float, default=1.25)
+    parser.add_argument('--verify', type=int, default=5, help='queries checked against Dijkstra')
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    t = time.perf_counter()
+    lines = grid_lines(args.size)
+    graph = RoadGraph(lines)
+    t_graph = time.perf_counter() - t
+    t = time.perf_counter()
+    engine = RoutingEngine(graph, landmarks=args.landmarks, cache_size=4 * args.queries, headroom=args.headroom)
+    t_landmarks = time.perf_counter() - t
+    print(f"Graph: {len(graph):,} nodes, {len(graph.heads):,} edges, built in {t_graph:.2f}s; "
+          f"{len(engine.landmark_nodes)} landmarks in {t_landmarks:.2f}s")
+
+    speeds = {line['id']: float(rng.choice([2, 10, 20, 35, 55], p=[0.05, 0.1, 0.25, 0.3, 0.3])) for line in lines}
+    t = time.perf_counter()
+    engine.update_speeds(speeds, refresh=False)
+    print(f"Congestion update: {(time.perf_counter() - t) * 1000:.1f} ms")
+
+    span = (args.size - 1) * BLOCK_DEG
+    points = 40.70 + rng.uniform(0, span, (args.queries, 2)), -74.02 + rng.uniform(0, span, (args.queries, 2))
+    pairs = [((points[0][i, 0], points[1][i, 0]), (points[0][i, 1], points[1][i, 1])) for i in range(args.queries)]
+
+    def time_search(label, metric, tables, scale=1.0):
+        times = []
+        for origin, dest in pairs:
+            s, d = engine.snap(*origin), engine.snap(*dest)
+            t = time.perf_counter()
+            engine._search(s, d, engine.weights[metric], engine._heuristic(tables, d, scale))
+            times.append(time.perf_counter() - t)
+        ms = np.array(times) * 1000
+        print(f"  {label:22s} mean {ms.mean():6.1f} ms  p50 {np.median(ms):6.1f}  p95 {np.percentile(ms, 95):6.1f}  max {ms.max():6.1f}")
+
+    print("A* per query (heuristic included):")
+    time_search('fastest, free-flow ALT', 'fastest', engine._fastest_tables())
+    t = time.perf_counter()
+    engine.refresh_landmarks()
+    print(f"Landmark refresh on congested speeds: {time.perf_counter() - t:.2f}s")
+    time_search('fastest, congested ALT', 'fastest', engine._fastest_tables())
+    time_search('shortest', 'shortest', engine._landmarks['shortest'])
+    time_search('eco', 'eco', engine._landmarks['shortest'], MIN_FUEL_PER_MILE / METERS_PER_MILE)
+
+    t = time.perf_counter()
+    for origin, dest in pairs:
+        engine.route(origin, dest)
+    cold = (time.perf_counter() - t) / len(pairs) * 1000
+    t = time.perf_counter()
+    for origin, dest in pairs:
+        engine.route(origin, dest)
+    warm = (time.perf_counter() - t) / len(pairs) * 1000
+    print(f"route() with all three metrics: {cold:.1f} ms cold, {warm:.3f} ms cached")
+
+    mismatches = 0
+    for origin, dest in pairs[:args.verify]:
+        s, d = engine.snap(*origin), engine.snap(*dest)
+        for metric in ('fastest', 'shortest', 'eco'):
+            cost = engine.weights[metric]
+            tables = engine._fastest_tables() if metric == 'fastest' else engine._landmarks['shortest']
+            scale = MIN_FUEL_PER_MILE / METERS_PER_MILE if metric == 'eco' else 1.0
+            edges = engine._search(s, d, cost, engine._heuristic(tables, d, scale))
+            best = _dijkstra(engine._indptr, engine._heads, cost, s)[d]
+            mismatches += not np.isclose(sum(cost[e] for e in edges), best)
+    print(f"Optimality check: {args.verify * 3 - mismatches}/{args.verify * 3} match Dijkstra")
+
+
+if __name__ == '__main__':
+    main()
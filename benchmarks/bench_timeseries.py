@@ -0,0 +1,86 @@
+"""
+Benchmark: TimeSeriesStore over a year of per-minute counts
+
+Writes one observation per camera per minute for a full year (the rate of the
+dashboard's refresh tick, doubled), then times the queries the API makes and
+checks rollup totals against a sum over the raw log.
+
+Usage:
+    python benchmarks/bench_timeseries.py [--cameras N] [--days N] [--dir PATH]
+"""
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from timeseries import TimeSeriesStore
+
+CLASSES = ['bike', 'motorcycle', 'car', 'auto_rickshaw', 'bus', 'truck', 'ambulance', 'police', 'fire_truck']
+
+
+def timed(label, fn, repeat=20):
+    fn()  # first call opens the memory maps
+    t = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    print(f"  {label:50s} {(time.perf_counter() - t) / repeat * 1000:8.2f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cameras', type=int, default=8)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--dir', help='store directory (default: a temporary one)')
+    args = parser.parse_args()
+    root = Path(args.dir or tempfile.mkdtemp(prefix='tsbench-'))
+    rng = np.random.default_rng(0)
+
+    store = TimeSeriesStore(root, CLASSES)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+    end = start + args.days * 86400
+    ts = np.arange(start, end, 60, dtype=np.float64)
+    cameras = [f'cam_{i:03d}' for i in range(1, args.cameras + 1)]
+
+    t = time.perf_counter()
+    expected = np.zeros(len(CLASSES), dtype=np.int64)
+    for cam in cameras:
+        counts = rng.poisson([3, 5, 30, 2, 2, 4, 0.1, 0.1, 0.05], (len(ts), len(CLASSES)))
+        expected += counts.sum(axis=0)
+        store.record_many(cam, ts, counts)
+    elapsed = time.perf_counter() - t
+    rows = len(ts) * len(cameras)
+    size = sum(p.stat().st_size for p in root.rglob('*') if p.is_file())
+    print(f"Wrote {rows:,} observations in {elapsed:.1f}s ({rows / elapsed:,.0f}/s), {size / 1e6:.0f} MB on disk")
+
+    t = time.perf_counter()
+    for cam in cameras[:1]:
+        store.record(cam, {'car': 1}, ts=start + 3600.5)
+    print(f"Single record(): {(time.perf_counter() - t) * 1000:.2f} ms")
+    expected[CLASSES.index('car')] += 1
+
+    print("Queries (all cameras unless noted):")
+    totals = timed('totals, full year', lambda: store.totals(cameras, start, end))
+    timed('totals, ragged range (13 Mar 09:17 - 2 Nov 15:43)',
+          lambda: store.totals(cameras, start + 71 * 86400 + 9 * 3600 + 17 * 60, start + 305 * 86400 + 15 * 3600 + 43 * 60))
+    timed('hourly series, full year (8760 points)', lambda: store.series(cameras, start, end, 'hour'))
+    timed('daily series, full year', lambda: store.series(cameras, start, end, 'day'))
+    timed('minute series, one day', lambda: store.series(cameras, start + 100 * 86400, start + 101 * 86400, 'minute'))
+    timed('minute series, one day, one camera', lambda: store.series(cameras[:1], start + 100 * 86400, start + 101 * 86400, 'minute'))
+
+    ok = [totals[c] for c in CLASSES] == expected.tolist()
+    raw_day = store.raw(cameras[0], '2025-01-01')
+    print(f"Year totals match generated counts: {ok}; raw log day 1 for {cameras[0]}: {len(raw_day):,} rows")
+    if not args.dir:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
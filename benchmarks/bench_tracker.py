@@ -0,0 +1,88 @@
+"""
+Benchmark: VehicleTracker + TrafficLineCounter on synthetic trajectories
+
+Simulates lanes of vehicles driving straight through a 1920x1080 frame at 30 fps,
+with detection jitter and occasional missed detections, and checks that
+each vehicle crossing the line is counted exactly once.
+
+Usage:
+    python benchmarks/bench_tracker.py [--lanes N] [--spacing PX] [--frames N]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from vehicle_detector import TrafficLineCounter
+
+WIDTH, HEIGHT = 1920, 1080
+TYPES = np.array(['bike', 'car', 'bus', 'truck'])
+
+
+def simulate(n_lanes, spacing, n_frames, seed=0):
+    """Return per-frame detection lists, the ground-truth crossing count and the line"""
+    rng = np.random.default_rng(seed)
+    # Vehicles queue along lanes at a fixed headway; each lane has its own
+    # direction and speed, and a vehicle leaving the frame re-enters at the far
+    # edge as a new one
+    lane_w = WIDTH // n_lanes
+    per_lane = (HEIGHT + 2 * spacing) // spacing
+    span = per_lane * spacing
+    lane = np.repeat(np.arange(n_lanes), per_lane)
+    n = lane.size
+    y = np.tile(np.arange(per_lane) * spacing, n_lanes) + rng.uniform(0, spacing, n_lanes)[lane] - spacing
+    vy = (rng.choice([-1, 1], n_lanes) * rng.uniform(4, 12, n_lanes))[lane]
+    size = rng.uniform(30, min(60, lane_w - 10), n)
+    x = lane * lane_w + 5
+    types = rng.choice(TYPES, n, p=[0.15, 0.55, 0.15, 0.15])
+    line = HEIGHT / 2
+
+    frames, truth = [], 0
+    for _ in range(n_frames):
+        prev = y.copy()
+        y = (y + vy + spacing) % span - spacing
+        wrapped = np.abs(y - prev) > spacing
+        truth += int(np.sum(((prev + size / 2 > line) != (y + size / 2 > line)) & ~wrapped))
+        visible = (y > 0) & (y < HEIGHT - size) & (rng.random(n) > 0.05)
+        jitter = rng.normal(0, 1.5, (n, 2))
+        dets = [{'type': str(types[i]), 'confidence': 0.9,
+                 'bbox': [int(x[i] + jitter[i, 0]), int(y[i] + jitter[i, 1]),
+                          int(x[i] + jitter[i, 0] + size[i]), int(y[i] + jitter[i, 1] + size[i])]}
+                for i in np.nonzero(visible)[0]]
+        frames.append(dets)
+    return frames, truth, line
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lanes', type=int, default=24)
+    parser.add_argument('--spacing', type=int, default=170, help='headway between vehicles in pixels')
+    parser.add_argument('--frames', type=int, default=900)
+    args = parser.parse_args()
+
+    frames, truth, line = simulate(args.lanes, args.spacing, args.frames)
+    counter = TrafficLineCounter(line, 'horizontal')
+
+    timings = []
+    for n, dets in enumerate(frames):
+        start = time.perf_counter()
+        counter.update(dets, n)
+        timings.append(time.perf_counter() - start)
+
+    timings = np.array(timings) * 1000
+    per_frame = np.mean([len(d) for d in frames])
+    print(f"frames: {args.frames}  detections/frame: {per_frame:.0f}")
+    print(f"update latency ms: mean {timings.mean():.2f}  p50 {np.percentile(timings, 50):.2f}  "
+          f"p99 {np.percentile(timings, 99):.2f}  max {timings.max():.2f}")
+    print(f"sustainable rate: {1000 / timings.mean():.0f} fps (target 30)")
+    print(f"crossings counted: {counter.count}  ground truth: {truth}")
+    print(f"by direction: {counter.direction_counts}")
+    print(f"by class: {counter.class_counts}")
+
+
+if __name__ == '__main__':
+    main()
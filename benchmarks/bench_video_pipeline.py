@@ -0,0 +1,89 @@
+"""
+Benchmark: temp-file frame pipeline vs batched in-memory streaming
+
+Compares the original detect_from_video path (JPEG encode, disk write,
+decode and unlink per sampled frame) against YOLOVehicleDetector.stream_video.
+
+Usage:
+    python benchmarks/bench_video_pipeline.py [video_path] [--frame-skip N] [--batch-size N]
+
+Without a video path a synthetic clip is generated in a temporary directory.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from vehicle_detector import YOLOVehicleDetector
+
+
+def make_synthetic_video(path, frames=600, width=1280, height=720, fps=30):
+    """Write a clip of coloured boxes drifting across a noisy road"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    rng = np.random.default_rng(0)
+    background = rng.integers(60, 90, (height, width, 3), dtype=np.uint8)
+    for i in range(frames):
+        frame = background.copy()
+        for k in range(12):
+            x = (i * (3 + k) + k * 97) % width
+            y = 80 + k * 50
+            cv2.rectangle(frame, (x, y), (x + 90, y + 40), (40 * k % 255, 180, 255 - 20 * k), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def legacy_temp_file_pipeline(detector, video_path, frame_skip, workdir):
+    """The pre-streaming implementation, kept verbatim for comparison"""
+    cap = cv2.VideoCapture(video_path)
+    frame_count = 0
+    processed = 0
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_count % frame_skip == 0:
+            temp_frame = os.path.join(workdir, f'temp_frame_{frame_count}.jpg')
+            cv2.imwrite(temp_frame, frame)
+            detector.detect_from_image(temp_frame)
+            Path(temp_frame).unlink(missing_ok=True)
+            processed += 1
+        frame_count += 1
+    cap.release()
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('video', nargs='?')
+    parser.add_argument('--frame-skip', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=8)
+    args = parser.parse_args()
+
+    detector = YOLOVehicleDetector()
+    with tempfile.TemporaryDirectory() as workdir:
+        video = args.video or make_synthetic_video(os.path.join(workdir, 'synthetic.avi'))
+
+        start = time.perf_counter()
+        legacy_frames = legacy_temp_file_pipeline(detector, video, args.frame_skip, workdir)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stream_frames = sum(1 for _ in detector.stream_video(video, args.frame_skip, args.batch_size))
+        stream_time = time.perf_counter() - start
+
+    print(f"mode: {'yolo' if detector.use_yolo else 'demo'}  frame_skip={args.frame_skip}  batch_size={args.batch_size}")
+    print(f"temp-file pipeline : {legacy_frames} frames in {legacy_time:.2f}s  ({legacy_frames / legacy_time:.1f} fps)")
+    print(f"streaming pipeline : {stream_frames} frames in {stream_time:.2f}s  ({stream_frames / stream_time:.1f} fps)")
+    print(f"speedup            : {legacy_time / stream_time:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
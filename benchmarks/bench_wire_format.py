@@ -0,0 +1,82 @@
+"""
+Benchmark: /api/traffic-data payload size and serialization time per format
+
+Builds one tick of traffic columns for N synthetic cameras and serializes
+it as the original list-of-objects JSON and in each compact format from
+wire.py, reporting raw and gzipped size and serialization time. The static
+camera records, sent once per version, and a delta where 5% of the cameras
+changed are reported separately.
+
+Usage:
+    python benchmarks/bench_wire_format.py [--cameras N] [--repeat N]
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import wire
+from app import CONGESTION_LEVELS, TRAFFIC_SOURCES, VEHICLE_CATEGORIES, traffic_columns, traffic_rows
+
+
+def synthetic_cameras(n):
+    rng = np.random.default_rng(0)
+    return [{'id': f'cam_{i:05d}', 'name': f'Camera {i}', 'lat': round(float(lat), 4), 'lon': round(float(lon), 4),
+             'location': 'Synthetic City', 'road': f'Road {i % 400}'}
+            for i, (lat, lon) in enumerate(zip(rng.uniform(25, 49, n), rng.uniform(-124, -67, n)))]
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - start)
+    return body, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cameras', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    cameras = synthetic_cameras(args.cameras)
+    cols = traffic_columns(1, cameras)
+    meta = dict(dataset='cameras', tick=1, static=wire.static_version(cameras),
+                enums={'congestion': CONGESTION_LEVELS, 'source': TRAFFIC_SOURCES}, categories=VEHICLE_CATEGORIES)
+
+    formats = {'json (list of objects)': lambda: json.dumps(traffic_rows(cols, cameras), separators=(',', ':')).encode()}
+    for fmt in ('columnar', 'binary', 'msgpack'):
+        if fmt != 'msgpack' or wire.msgpack:
+            formats[fmt] = lambda fmt=fmt: wire.encode(fmt, columns=cols, **meta)
+
+    changed = cols.copy()
+    rng = np.random.default_rng(1)
+    rows = np.sort(rng.choice(args.cameras, args.cameras // 20, replace=False))
+    changed['pedestrians'] = cols['pedestrians'].copy()
+    changed['pedestrians'][rows] += 1
+    formats['binary, 5% delta'] = lambda: wire.encode('binary', columns=changed, rows=wire.changed_rows(cols, changed), **meta)
+
+    print(f"{args.cameras} cameras, best of {args.repeat}")
+    print(f"{'format':<24}{'bytes':>12}{'gzipped':>12}{'serialize':>12}")
+    baseline = None
+    for name, fn in formats.items():
+        body, seconds = timed(fn, args.repeat)
+        zipped = len(gzip.compress(body, compresslevel=6))
+        baseline = baseline or (len(body), seconds)
+        print(f"{name:<24}{len(body):>12,}{zipped:>12,}{seconds * 1000:>10.1f}ms"
+              f"   ({baseline[0] / len(body):.0f}x smaller, {baseline[1] / seconds:.0f}x faster)")
+    static = json.dumps({'version': meta['static'], 'records': cameras}, separators=(',', ':')).encode()
+    print(f"static records (once per version): {len(static):,} bytes, "
+          f"{len(gzip.compress(static, compresslevel=6)):,} gzipped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+Load test: N simulated dashboards polling the HTTP API like the browser does
+
+Each client replays a page's load and then its 30-second polling loop
+(the no-EventSource path of static/js/app.js and templates/admin.html)
+over one keep-alive connection. Clients open at random points within the
+first interval, like users arriving, and keep a browser-style cache: a
+response is reused until its max-age runs out and then revalidated with
+If-None-Match. Latency percentiles per endpoint are written as JSON (see
+results.py) for comparison between commits.
+
+Usage:
+    python benchmarks/load_test.py --spawn [--workers N] [--clients N] [--duration S] [--interval S]
+    python benchmarks/load_test.py --url http://host:port [--clients N] ...
+"""
+
+import argparse
+import gzip
+import http.client
+import json
+import math
+import os
+import re
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import results
+
+# Dashboard map view (initMap) and a typical browser viewport
+MAP_CENTER, MAP_ZOOM, VIEWPORT = (39.8283, -98.5795), 4, (1280, 800)
+
+
+def heatmap_tiles(center=MAP_CENTER, zoom=MAP_ZOOM, viewport=VIEWPORT):
+    """Tile URLs heatmapTiles() in app.js requests for a map view"""
+    def world(lat, lon, z):
+        lat = math.radians(max(-85.0511, min(85.0511, lat)))
+        n = 256 * 2 ** z
+        return (lon + 180) / 360 * n, (1 - math.log(math.tan(lat) + 1 / math.cos(lat)) / math.pi) / 2 * n
+    cx, cy = world(*center, zoom)
+    z = max(0, min(16, zoom - 2))
+    n = 2 ** z
+    scale = 256 * 2 ** (zoom - z)
+    x0, x1 = int((cx - viewport[0] / 2) // scale), int((cx + viewport[0] / 2) // scale)
+    y0, y1 = int((cy - viewport[1] / 2) // scale), int((cy + viewport[1] / 2) // scale)
+    return [f'/api/heatmap/{z}/{x}/{y}' for x in range(max(0, x0), min(n - 1, x1) + 1)
+            for y in range(max(0, y0), min(n - 1, y1) + 1)]
+
+
+# Requests per refresh, in the order the pages issue them
+PAGES = {
+    'index': ['/api/traffic-data?format=binary', '/api/road-segments?format=binary', *heatmap_tiles(),
+              '/api/predictions', '/api/analytics'],
+    'admin': ['/api/traffic-data', '/api/analytics', '/api/traffic-signals', '/api/predictions'],
+}
+ENDPOINT = re.compile(r'/api/heatmap/\d+/\d+/\d+')
+
+
+def endpoint(path):
+    return ENDPOINT.sub('/api/heatmap/{z}/{x}/{y}', path.split('?')[0])
+
+
+class Client(threading.Thread):
+    """One dashboard: initial load, then a refresh every interval"""
+
+    def __init__(self, host, port, page, interval, start_at, stop_at, record):
+        super().__init__(daemon=True)
+        self.host, self.port = host, port
+        self.page = page
+        self.interval = interval
+        self.start_at, self.stop_at = start_at, stop_at
+        self.record = record
+        self.cache = {}  # url -> (expires, etag)
+        self.since = {}  # columnar datasets: url -> tick of the last payload
+        self.conn = None
+
+    def run(self):
+        time.sleep(max(0, self.start_at - time.monotonic()))
+        while time.monotonic() < self.stop_at:
+            began = time.monotonic()
+            for path in PAGES[self.page]:
+                self.get(path)
+            time.sleep(max(0, min(self.stop_at, began + self.interval) - time.monotonic()))
+        if self.conn:
+            self.conn.close()
+
+    def get(self, path):
+        url = f'{path}&since={self.since[path]}' if path in self.since else path
+        cached = self.cache.get(path)
+        if cached and cached[0] > time.monotonic():
+            self.record(endpoint(path), 'cache', 0.0, 0)
+            return
+        headers = {'Accept-Encoding': 'gzip'}
+        if cached and cached[1]:
+            headers['If-None-Match'] = cached[1]
+        start = time.perf_counter()
+        for attempt in range(2):
+            reused = self.conn is not None
+            try:
+                if self.conn is None:
+                    self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+                self.conn.request('GET', url, headers=headers)
+                resp = self.conn.getresponse()
+                body = resp.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                self.conn.close()
+                self.conn = None
+                # The server may close an idle keep-alive connection between refreshes;
+                # browsers then retry on a new one, so only a fresh connection's failure counts
+                if not reused or attempt:
+                    self.record(endpoint(path), type(e).__name__, time.perf_counter() - start, 0)
+                    return
+        self.record(endpoint(path), resp.status, time.perf_counter() - start, len(body))
+        if resp.status == 200:
+            max_age = re.search(r'max-age=(\d+)', resp.getheader('Cache-Control') or '')
+            self.cache[path] = (time.monotonic() + int(max_age.group(1)) if max_age else 0, resp.getheader('ETag'))
+            if resp.getheader('Content-Type', '').startswith('application/vnd.traffic.columns'):
+                self.since[path] = frame_tick(gzip.decompress(body) if resp.getheader('Content-Encoding') == 'gzip' else body)
+        elif resp.status == 304 and cached:
+            max_age = re.search(r'max-age=(\d+)', resp.getheader('Cache-Control') or '')
+            self.cache[path] = (time.monotonic() + int(max_age.group(1)) if max_age else 0, cached[1])
+
+
+def frame_tick(body):
+    """Tick from a binary column frame's header (wire.encode layout)"""
+    size = struct.unpack('<I', body[4:8])[0]
+    return json.loads(body[8:8 + size])['tick']
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def __call__(self, name, status, seconds, size):
+        with self.lock:
+            self.samples.setdefault(name, []).append((status, seconds, size))
+
+    def summary(self, elapsed):
+        out = {}
+        everything = []
+        for name, samples in sorted(self.samples.items()):
+            sent = [s for s in samples if s[0] != 'cache']
+            everything += sent
+            out[f'endpoint:{name}'] = self._stats(sent, elapsed, len(samples) - len(sent))
+        out['overall'] = self._stats(everything, elapsed, sum(1 for s in sum(self.samples.values(), []) if s[0] == 'cache'))
+        return out
+
+    @staticmethod
+    def _stats(sent, elapsed, cached):
+        latency = np.array([s[1] for s in sent]) * 1000 if sent else np.zeros(1)
+        statuses = [s[0] for s in sent]
+        errors = sum(1 for s in statuses if not isinstance(s, int) or s >= 500)
+        return {'requests': len(sent), 'requests_per_s': len(sent) / elapsed, 'browser_cache_hits': cached,
+                'not_modified': statuses.count(304), 'errors': errors,
+                'error_rate': errors / len(sent) if sent else 0.0,
+                'bytes_per_s': sum(s[2] for s in sent) / elapsed,
+                'p50_ms': float(np.percentile(latency, 50)), 'p95_ms': float(np.percentile(latency, 95)),
+                'p99_ms': float(np.percentile(latency, 99)), 'max_ms': float(latency.max())}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def spawn_gunicorn(workers, threads, ttl):
+    """Start the app under gunicorn as render.yaml does, on a free local port"""
+    port = free_port()
+    env = dict(os.environ, SNAPSHOT_TTL=str(ttl))
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+                             '--workers', str(workers), '--worker-class', 'gthread', '--threads', str(threads)],
+                            cwd=results.ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with {proc.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/api/cameras')
+            if conn.getresponse().status == 200:
+                return proc, port
+        except OSError:
+            time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError('gunicorn did not start within 60s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='running server, e.g. http://127.0.0.1:5000')
+    target.add_argument('--spawn', action='store_true', help='start gunicorn for the run')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers with --spawn')
+    parser.add_argument('--threads', type=int, default=64, help='threads per gunicorn worker with --spawn')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--admin-share', type=float, default=0.1, help='fraction of clients on the admin page')
+    parser.add_argument('--interval', type=float, default=30, help='refresh period in seconds (30 in the pages)')
+    parser.add_argument('--duration', type=float, default=120)
+    parser.add_argument('--output', help='results file (default benchmarks/results/load-<commit>.json)')
+    args = parser.parse_args()
+
+    proc = None
+    if args.spawn:
+        proc, port = spawn_gunicorn(args.workers, args.threads, int(max(1, args.interval)))
+        host = '127.0.0.1'
+        print(f"✓ gunicorn on port {port}: {args.workers} workers x {args.threads} threads")
+    else:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+
+    recorder = Recorder()
+    rng = np.random.default_rng(0)
+    now = time.monotonic()
+    stop_at = now + args.duration
+    n_admin = round(args.clients * args.admin_share)
+    clients = [Client(host, port, 'admin' if i < n_admin else 'index', args.interval,
+                      now + rng.uniform(0, min(args.interval, args.duration)), stop_at, recorder)
+               for i in range(args.clients)]
+    print(f"… {args.clients} clients ({n_admin} admin) refreshing every {args.interval:g}s for {args.duration:g}s")
+    try:
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join()
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    summary = recorder.summary(args.duration)
+    for name, s in summary.items():
+        print(f"{name:<36} {s['requests']:>7} req  {s['requests_per_s']:>7.1f}/s  p50 {s['p50_ms']:>7.1f}ms  "
+              f"p95 {s['p95_ms']:>7.1f}ms  p99 {s['p99_ms']:>7.1f}ms  304s {s['not_modified']:>5}  errors {s['errors']}")
+    output = args.output or results.ROOT / 'benchmarks' / 'results' / f"load-{results.run_meta()['commit'] or 'local'}.json"
+    results.save(output, summary, suite='load', clients=args.clients, admin_clients=n_admin, interval=args.interval,
+                 duration=args.duration, target='gunicorn' if args.spawn else args.url,
+                 workers=args.workers if args.spawn else None, threads=args.threads if args.spawn else None)
+    print(f"✓ results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark results: JSON files per run, compared between commits
+
+Every suite writes {"meta": {...}, "results": {benchmark: {metric: value}}}.
+Metric names carry their direction: *_per_s is better when higher, *_ms,
+*_us and *_s when lower; other metrics (counts, sizes) are informational.
+
+Usage:
+    python benchmarks/results.py BASELINE.json CURRENT.json [--tolerance 0.1]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HIGHER = ('_per_s',)
+LOWER = ('_ms', '_us', '_s')
+
+
+def run_meta(**extra):
+    """Commit, host and time of a benchmark run"""
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+    return dict(extra, commit=git('rev-parse', '--short', 'HEAD'), dirty=bool(git('status', '--porcelain', '--untracked-files=no')),
+                time=datetime.now(timezone.utc).isoformat(timespec='seconds'), python=platform.python_version(),
+                platform=platform.platform(), cpus=os.cpu_count())
+
+
+def save(path, results, **meta):
+    """Write a results file (creating its directory) and return the document"""
+    doc = {'meta': run_meta(**meta), 'results': results}
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(doc, indent=2))
+    return doc
+
+
+def direction(metric):
+    """+1 if higher is better, -1 if lower is better, 0 if informational"""
+    if metric.endswith(HIGHER):
+        return 1
+    if metric.endswith(LOWER):
+        return -1
+    return 0
+
+
+def compare(baseline, current, tolerance=0.1):
+    """
+    Metrics that changed by more than tolerance between two results documents
+
+    Returns:
+        List of (benchmark, metric, old, new, relative change, 'regression' | 'improvement')
+    """
+    changes = []
+    for name, metrics in current['results'].items():
+        old_metrics = baseline['results'].get(name) or {}
+        for metric, new in metrics.items():
+            old = old_metrics.get(metric)
+            sign = direction(metric)
+            if not sign or not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old:
+                continue
+            change = (new - old) / abs(old)
+            if abs(change) > tolerance:
+                changes.append((name, metric, old, new, change, 'improvement' if change * sign > 0 else 'regression'))
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative change ignored as noise')
+    args = parser.parse_args()
+
+    baseline, current = (json.loads(Path(p).read_text()) for p in (args.baseline, args.current))
+    print(f"{baseline['meta'].get('commit')} -> {current['meta'].get('commit')}  (tolerance {args.tolerance:.0%})")
+    changes = compare(baseline, current, args.tolerance)
+    for name, metric, old, new, change, kind in changes:
+        print(f"{'✓' if kind == 'improvement' else '⚠'} {name}.{metric}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+    regressions = sum(1 for c in changes if c[-1] == 'regression')
+    print(f"{regressions} regressions, {len(changes) - regressions} improvements")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
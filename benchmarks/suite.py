@@ -0,0 +1,169 @@
+"""
+Benchmark suite: detector, line counter and congestion micro-benchmarks as JSON
+
+Runs each micro-benchmark on synthetic, seeded inputs and writes one
+results file (see results.py) that can be compared with a run from another
+commit. The detector is measured in demo mode and, when ultralytics and the
+weights are available, with the real model; per-image and per-video
+throughput are reported separately.
+
+Usage:
+    python benchmarks/suite.py [--output PATH] [--only NAME ...] [--model PATH] [--quick]
+    python benchmarks/results.py benchmarks/results/<old>.json benchmarks/results/<new>.json
+"""
+
+import argparse
+import copy
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import results
+from bench_congestion import run as feed_segments, simulate as simulate_segments
+from bench_tracker import simulate
+from bench_video_pipeline import make_synthetic_video
+from vehicle_detector import TrafficLineCounter, YOLOVehicleDetector
+
+
+def best_of(fn, repeat):
+    """Shortest of repeat timed runs of fn(), which is the least disturbed by other load"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+
+def bench_detector_image(detector, workdir, repeat):
+    """detect_from_image on a 1280x720 JPEG"""
+    path = os.path.join(workdir, 'frame.jpg')
+    if not os.path.exists(path):
+        rng = np.random.default_rng(0)
+        cv2.imwrite(path, rng.integers(60, 90, (720, 1280, 3), dtype=np.uint8))
+    detector.detect_from_image(path)  # warm-up (model load, first allocation)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        detector.detect_from_image(path)
+        samples.append(time.perf_counter() - start)
+    return {'images_per_s': len(samples) / sum(samples), 'p50_ms': percentile_ms(samples, 50),
+            'p95_ms': percentile_ms(samples, 95)}
+
+
+def bench_detector_video(detector, video, frame_skip):
+    """detect_from_video on the synthetic clip"""
+    start = time.perf_counter()
+    report = detector.detect_from_video(video, frame_skip)
+    elapsed = time.perf_counter() - start
+    return {'video_frames_per_s': report['total_frames'] / elapsed,
+            'processed_frames_per_s': report['processed_frames'] / elapsed,
+            'total_s': elapsed, 'frames': report['total_frames'], 'processed_frames': report['processed_frames']}
+
+
+def bench_line_counter(n_frames, repeat, lanes=8, spacing=160):
+    """TrafficLineCounter.update over simulated lanes of traffic"""
+    frames, truth, line = simulate(lanes, spacing, n_frames)
+
+    def count():
+        nonlocal counter
+        counter = TrafficLineCounter(line)
+        for i, dets in enumerate(frames):
+            counter.update(dets, i)
+    counter = None
+    elapsed = best_of(count, repeat)
+    n_dets = sum(len(d) for d in frames)
+    return {'updates_per_s': len(frames) / elapsed, 'detections_per_s': n_dets / elapsed,
+            'update_us': elapsed / len(frames) * 1e6, 'detections_per_frame': n_dets / len(frames),
+            'counted': counter.count, 'truth': truth}
+
+
+def bench_congestion(n, repeat):
+    """get_congestion over a sweep of densities"""
+    from app import get_congestion
+    densities = np.random.default_rng(0).uniform(0, 100, n).tolist()
+
+    def sweep():
+        for d in densities:
+            get_congestion(d)
+    elapsed = best_of(sweep, repeat)
+    return {'calls_per_s': n / elapsed, 'call_us': elapsed / n * 1e6}
+
+
+def bench_congestion_engine(n_segments, seconds, repeat, rate=5):
+    """CongestionEngine.observe over segments drifting through the level boundaries"""
+    from congestion import CongestionEngine
+    occupancy, speed = simulate_segments(n_segments, rate, seconds)
+    ids = [f'seg_{i:05d}' for i in range(n_segments)]
+    runs = [feed_segments(CongestionEngine(dict.fromkeys(ids, 55)), ids, occupancy, speed, rate) for _ in range(repeat)]
+    elapsed, changes = min(runs)
+    return {'observations_per_s': occupancy.size / elapsed, 'observe_us': elapsed / occupancy.size * 1e6,
+            'level_changes': changes - n_segments}
+
+
+def detectors(model_path):
+    """(mode, detector) pairs: demo always, real only when the model loads"""
+    detector = YOLOVehicleDetector(model_path)
+    if not detector.use_yolo:
+        return [('demo', detector)], 'ultralytics or model weights not available'
+    demo = copy.copy(detector)
+    demo.use_yolo, demo.model, demo.model_id = False, None, 'demo'
+    return [('demo', demo), ('real', detector)], None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', help='results file (default benchmarks/results/suite-<commit>.json)')
+    parser.add_argument('--only', nargs='+', help='benchmark name prefixes to run')
+    parser.add_argument('--model', help='YOLO weights for the real-mode benchmarks')
+    parser.add_argument('--quick', action='store_true', help='smaller inputs, for a smoke run')
+    parser.add_argument('--frame-skip', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per CPU-bound benchmark; the best is kept')
+    args = parser.parse_args()
+
+    scale = 0.2 if args.quick else 1
+    wanted = lambda name: not args.only or any(name.startswith(p) for p in args.only)
+    out = {}
+    skipped = {}
+
+    def run(name, fn, *fn_args):
+        if not wanted(name):
+            return
+        print(f"… {name}", flush=True)
+        out[name] = fn(*fn_args)
+        print('  ' + '  '.join(f'{k}={v:.4g}' for k, v in out[name].items()), flush=True)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if any(wanted(f'detector_{kind}') for kind in ('image', 'video')):
+            pairs, reason = detectors(args.model)
+            if reason:
+                skipped['detector_*_real'] = reason
+            video = make_synthetic_video(os.path.join(workdir, 'clip.avi'), frames=int(600 * scale)) \
+                if wanted('detector_video') else None
+            for mode, detector in pairs:
+                run(f'detector_image_{mode}', bench_detector_image, detector, workdir, int(50 * scale))
+                run(f'detector_video_{mode}', bench_detector_video, detector, video, args.frame_skip)
+        run('line_counter_update', bench_line_counter, int(1500 * scale), args.repeat)
+        run('get_congestion', bench_congestion, int(200_000 * scale), args.repeat)
+        run('congestion_engine', bench_congestion_engine, 2000, int(30 * scale), args.repeat)
+
+    meta = dict(suite='micro', quick=args.quick, skipped=skipped)
+    output = args.output or results.ROOT / 'benchmarks' / 'results' / f"suite-{results.run_meta()['commit'] or 'local'}.json"
+    results.save(output, out, **meta)
+    for name, reason in skipped.items():
+        print(f"⚠ skipped {name}: {reason}")
+    print(f"✓ results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+"""
+Resumable Chunked Uploads
+Streams upload chunks straight to disk and lets analysis follow a video file while it is still arriving
+"""
+
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: appends are only serialized within a process
+    fcntl = None
+
+_PIECE = 256 * 1024
+
+
+class OffsetMismatchError(Exception):
+    """Raised when a chunk does not start where the stored upload ends"""
+
+    def __init__(self, offset):
+        super().__init__(f'upload is at offset {offset}')
+        self.offset = offset
+
+
+def upload_complete(state_path):
+    """True once the upload described by state_path has received all its bytes"""
+    try:
+        with open(state_path) as f:
+            return bool(json.load(f).get('complete'))
+    except (FileNotFoundError, ValueError):
+        return False
+
+
+class UploadStore:
+    """
+    Upload sessions shared by every web worker
+
+    Each session is a data file in upload_dir that only ever grows, plus a
+    JSON state file in state_dir. The data file's size is the upload offset,
+    so a client that lost its connection asks for the offset and resends
+    from there. Chunks are copied from the request stream in small pieces,
+    so memory stays flat whatever the file size, and appends to one session
+    are serialized with a file lock so any worker can take any chunk.
+    """
+
+    def __init__(self, state_dir, upload_dir):
+        """
+        Args:
+            state_dir: Directory for <upload_id>.json session files
+            upload_dir: Directory the uploaded files are written to
+        """
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.upload_dir = Path(upload_dir)
+
+    def state_path(self, upload_id):
+        return self.state_dir / f'{upload_id}.json'
+
+    def _write(self, state):
+        path = self.state_path(state['id'])
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, path)
+
+    def _lock(self, upload_id):
+        lock_file = open(self.state_dir / f'{upload_id}.lock', 'a+b')
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    @staticmethod
+    def _unlock(lock_file):
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+    def create(self, filename, size=None, **meta):
+        """
+        Start an upload
+
+        Args:
+            filename: Client file name (already sanitized); stored with the upload id prefixed
+            size: Total bytes, if known; the upload completes when they have all arrived
+            **meta: Extra fields kept in the session state (e.g. job_id)
+
+        Returns:
+            Session state dict
+        """
+        upload_id = uuid.uuid4().hex
+        filename = f'{upload_id[:8]}_{filename}'
+        (self.upload_dir / filename).touch()
+        state = dict(meta, id=upload_id, file=filename, size=size, complete=size == 0,
+                     created=datetime.now().isoformat())
+        self._write(state)
+        return self.status(upload_id)
+
+    def update(self, upload_id, **fields):
+        lock_file = self._lock(upload_id)
+        try:
+            state = self.status(upload_id)
+            state.update(fields)
+            state.pop('offset', None)
+            self._write(state)
+        finally:
+            self._unlock(lock_file)
+
+    def claim(self, upload_id, start):
+        """
+        Change a session under its lock, so whichever worker gets there first acts once
+
+        Args:
+            upload_id: Session id
+            start: Called with the current state (including the offset); returns
+                fields to store (e.g. the job_id of the analysis it submitted), or
+                None to leave the session as it is
+
+        Returns:
+            Updated session state
+        """
+        lock_file = self._lock(upload_id)
+        try:
+            state = self.status(upload_id)
+            if state is None:
+                raise KeyError(upload_id)
+            fields = start(state)
+            if fields:
+                state.update(fields)
+                state.pop('offset', None)
+                self._write(state)
+            return self.status(upload_id)
+        finally:
+            self._unlock(lock_file)
+
+    def discard(self, upload_id):
+        """Remove a session and its data"""
+        state = self.status(upload_id)
+        if state is not None:
+            (self.upload_dir / state['file']).unlink(missing_ok=True)
+        for suffix in ('.json', '.lock'):
+            (self.state_dir / f'{upload_id}{suffix}').unlink(missing_ok=True)
+
+    def status(self, upload_id):
+        """Session state with the current offset, or None for an unknown id"""
+        if not upload_id.isalnum():
+            return None
+        try:
+            state = json.loads(self.state_path(upload_id).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        path = self.upload_dir / state['file']
+        state['offset'] = path.stat().st_size if path.exists() else 0
+        return state
+
+    def append(self, upload_id, offset, stream):
+        """
+        Append one chunk read from a file-like stream
+
+        Args:
+            upload_id: Session id
+            offset: Byte offset the chunk starts at; must equal the current offset
+            stream: Readable object (e.g. the raw request stream)
+
+        Returns:
+            Updated session state
+
+        Raises:
+            KeyError: Unknown session
+            OffsetMismatchError: offset is not the current offset, or the upload is complete
+            ValueError: The chunk runs past the declared size
+        """
+        lock_file = self._lock(upload_id)
+        try:
+            state = self.status(upload_id)
+            if state is None:
+                raise KeyError(upload_id)
+            if state['complete'] or offset != state['offset']:
+                raise OffsetMismatchError(state['offset'])
+            size = state['size']
+            written = 0
+            with open(self.upload_dir / state['file'], 'ab') as f:
+                while True:
+                    piece = stream.read(_PIECE)
+                    if not piece:
+                        break
+                    if size is not None and offset + written + len(piece) > size:
+                        f.truncate(offset + written)
+                        raise ValueError(f'chunk runs past the declared size of {size} bytes')
+                    # Each piece is flushed so a follower sees the bytes as they arrive
+                    f.write(piece)
+                    f.flush()
+                    written += len(piece)
+            if size is not None and offset + written == size:
+                state['complete'] = True
+                state.pop('offset')
+                self._write(state)
+            return self.status(upload_id)
+        finally:
+            self._unlock(lock_file)
+
+    def complete(self, upload_id):
+        """Finish an upload of undeclared size at its current offset"""
+        lock_file = self._lock(upload_id)
+        try:
+            state = self.status(upload_id)
+            if state is None:
+                raise KeyError(upload_id)
+            if state['size'] is not None and state['offset'] != state['size']:
+                raise OffsetMismatchError(state['offset'])
+            state.update(complete=True, size=state.pop('offset'))
+            self._write(state)
+            return self.status(upload_id)
+        finally:
+            self._unlock(lock_file)
+
+
+class GrowingVideoCapture:
+    """
+    cv2.VideoCapture look-alike over a video file that is still being uploaded
+
+    It reads one frame ahead and only returns a frame once the next one has
+    decoded, so a frame cut off at the current end of the file is never
+    used. At the end of the data received so far it waits for the file to
+    grow, reopens it and seeks back to the held frame. Containers that need
+    their tail to open at all (e.g. MP4 with the index at the end) simply
+    start once the upload completes; streamable ones (AVI, MKV, MPEG-TS)
+    are analysed as they arrive.
+    """
+
+    def __init__(self, path, is_complete, poll=0.5, stall_timeout=600):
+        """
+        Args:
+            path: Video file being written
+            is_complete: Callable returning True once the file has all its bytes
+            poll: Seconds between checks for new data
+            stall_timeout: Seconds without new data before giving up
+        """
+        self.path = str(path)
+        self.is_complete = is_complete
+        self.poll = poll
+        self.stall_timeout = stall_timeout
+        self._cap = None
+        self._complete = False
+        self._ahead = None
+        self._pos = 0  # index of the frame held in _ahead
+        self._finished = False
+        self.frames_read = 0
+
+    def isOpened(self):
+        return not self._finished
+
+    def get(self, prop):
+        return self._cap.get(prop) if self._cap is not None else 0
+
+    def _wait_for_data(self, size):
+        deadline = time.monotonic() + self.stall_timeout
+        while not self.is_complete() and os.path.getsize(self.path) <= size:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'no upload data for {self.stall_timeout}s')
+            time.sleep(self.poll)
+
+    def _open(self):
+        """Open at _pos with the held frame decoded; False when the video has no more frames"""
+        while True:
+            # Completeness is sampled before opening, so an EOF after it is final
+            self._complete = self.is_complete()
+            size = os.path.getsize(self.path)
+            cap = cv2.VideoCapture(self.path)
+            if cap.isOpened():
+                if self._pos:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, self._pos)
+                ok, frame = cap.read()
+                if ok:
+                    self._cap, self._ahead = cap, frame
+                    return True
+            cap.release()
+            if self._complete:
+                return False
+            self._wait_for_data(size)
+
+    def read(self):
+        if self._finished:
+            return False, None
+        if self._cap is None and not self._open():
+            self._finished = True
+            return False, None
+        while True:
+            ok, frame = self._cap.read()
+            if ok:
+                held, self._ahead = self._ahead, frame
+                self._pos += 1
+                self.frames_read += 1
+                return True, held
+            if self._complete:
+                held, self._ahead = self._ahead, None
+                self.release()
+                self._finished = True
+                self.frames_read += 1
+                return True, held
+            # End of the data so far: drop the possibly truncated held frame and resume from it
+            size = os.path.getsize(self.path)
+            self.release()
+            self._wait_for_data(size)
+            if not self._open():
+                self._finished = True
+                return False, None
+
+    def grab(self):
+        return self.read()[0]
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
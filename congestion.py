@@ -0,0 +1,467 @@
+"""
+Congestion Engine
+Maps tracked detections onto road segments and classifies each segment's congestion from sliding-window flow, occupancy and speed
+"""
+
+import bisect
+import json
+import math
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from metrics import registry as metrics
+
+# Boundaries of the congestion levels on the 0-100 index (the dashboard's density scale)
+LEVEL_BOUNDS = (30, 60, 85, 95)
+# The index rises with occupancy and with the drop of speed below free flow; these
+# points put each level boundary at a typical occupancy and speed ratio
+INDEX_POINTS = (0, 30, 60, 85, 95, 100)
+OCCUPANCY_POINTS = (0, 0.12, 0.25, 0.4, 0.6, 1.0)
+SPEED_RATIO_POINTS = (0, 0.1, 0.25, 0.45, 0.7, 1.0)
+SPEED_RATIO_INDEX = (100, 95, 85, 60, 30, 0)
+# Road length taken by one vehicle in a queue (body plus gap), metres
+VEHICLE_LENGTHS = {'bike': 2.5, 'motorcycle': 2.5, 'auto_rickshaw': 4, 'car': 6, 'ambulance': 8, 'police': 6,
+                   'bus': 14, 'truck': 12, 'fire_truck': 12}
+DEFAULT_VEHICLE_LENGTH = 6
+MS_TO_MPH = 2.23694
+EARTH_RADIUS_M = 6371008.8
+
+CHANGES = metrics.counter('congestion_level_changes_total', 'Segment congestion level changes by direction',
+                          ['direction'])
+OBSERVATIONS = metrics.counter('congestion_observations_total', 'Per-segment observations fed to the engine')
+
+
+def _interp(x, xs, ys):
+    """np.interp for one scalar, without the array round trip"""
+    if x <= xs[0]:
+        return ys[0]
+    if x >= xs[-1]:
+        return ys[-1]
+    i = bisect.bisect_right(xs, x)
+    return ys[i - 1] + (ys[i] - ys[i - 1]) * (x - xs[i - 1]) / (xs[i] - xs[i - 1])
+
+
+def congestion_index(occupancy, speed_ratio=None):
+    """
+    Congestion index 0-100 from occupancy and, when measured, speed
+
+    Args:
+        occupancy: Fraction of the road length covered by vehicles (0-1)
+        speed_ratio: Mean speed over free-flow speed, or None
+
+    Returns:
+        The higher of the two indices: a queue of slow vehicles and a
+        road packed at moderate speed both count as congested
+    """
+    index = _interp(occupancy, OCCUPANCY_POINTS, INDEX_POINTS)
+    if speed_ratio is not None:
+        index = max(index, _interp(speed_ratio, SPEED_RATIO_POINTS, SPEED_RATIO_INDEX))
+    return index
+
+
+class _Segment:
+    # Ring of per-bucket sums plus their running totals: entered vehicles,
+    # occupancy samples (sum, n) and speed samples (sum, n)
+    __slots__ = ('free_speed', 'head', 'first', 'last', 'entered', 'occ_sum', 'occ_n', 'speed_sum', 'speed_n',
+                 'totals', 'level', 'index', 'since', 'pending', 'pending_since')
+
+    def __init__(self, free_speed, buckets):
+        self.free_speed = free_speed
+        self.head = None
+        self.first = self.last = None
+        self.entered = [0] * buckets
+        self.occ_sum = [0.0] * buckets
+        self.occ_n = [0] * buckets
+        self.speed_sum = [0.0] * buckets
+        self.speed_n = [0] * buckets
+        self.totals = [0, 0.0, 0, 0.0, 0]
+        self.level = self.index = self.since = self.pending = self.pending_since = None
+
+
+class CongestionEngine:
+    """
+    Per-segment sliding windows and congestion levels
+
+    Each segment keeps its window as a ring of fixed-width time buckets with
+    running totals: an observation adds to the newest bucket, and moving the
+    window forward subtracts the buckets that fall out of it. An update is
+    O(1) however long the window, so thousands of segments observed several
+    times a second cost a few microseconds each.
+
+    Levels change with hysteresis: the index must clear a dead band of
+    `margin` points centred on a level boundary and stay beyond it for
+    `dwell` seconds before the level moves, so a segment hovering at a
+    boundary does not flap. Only segments
+    whose level changed are reported by changes().
+    """
+
+    def __init__(self, free_speeds, window=60, bucket=1.0, margin=5, dwell=10, bounds=LEVEL_BOUNDS,
+                 min_speed_samples=3):
+        """
+        Args:
+            free_speeds: {segment_id: free-flow speed in mph}
+            window: Seconds of observations the measures cover
+            bucket: Bucket width in seconds (the window's time resolution)
+            margin: Width in index points of the dead band around each boundary
+            dwell: Seconds the new level must hold before it is taken
+            bounds: Index values at which the levels start
+            min_speed_samples: Speed samples in the window before speed counts
+        """
+        self.window = window
+        self.bucket = bucket
+        self.buckets = max(1, math.ceil(window / bucket))
+        self.half_margin = margin / 2
+        self.dwell = dwell
+        self.bounds = tuple(bounds)
+        self.min_speed_samples = min_speed_samples
+        self._segments = {sid: _Segment(float(speed), self.buckets) for sid, speed in free_speeds.items()}
+        self._changed = set()
+        self._lock = threading.Lock()
+
+    def _advance(self, s, b):
+        """Move the segment's window so bucket b is the newest; returns the ring slot for b"""
+        n = self.buckets
+        if s.head is None or b - s.head >= n:
+            for ring in (s.entered, s.occ_sum, s.occ_n, s.speed_sum, s.speed_n):
+                ring[:] = [0] * n
+            s.totals = [0, 0.0, 0, 0.0, 0]
+            s.head = b
+        elif b > s.head:
+            t = s.totals
+            for k in range(s.head + 1, b + 1):
+                i = k % n
+                t[0] -= s.entered[i]
+                t[1] -= s.occ_sum[i]
+                t[2] -= s.occ_n[i]
+                t[3] -= s.speed_sum[i]
+                t[4] -= s.speed_n[i]
+                s.entered[i] = s.occ_sum[i] = s.occ_n[i] = s.speed_sum[i] = s.speed_n[i] = 0
+                if i == 0:
+                    # Once per lap, re-add the float sums so subtraction errors never accumulate
+                    t[1], t[3] = math.fsum(s.occ_sum), math.fsum(s.speed_sum)
+            s.head = b
+        # A late observation is counted in the newest bucket
+        return s.head % n
+
+    def observe(self, segment_id, t, occupancy=None, entered=0, speeds=()):
+        """
+        Add one observation of a segment
+
+        Args:
+            segment_id: Segment observed
+            t: Observation time (epoch seconds)
+            occupancy: Fraction of the observed road length covered by vehicles
+            entered: Vehicles that newly appeared on the segment
+            speeds: Speed samples of vehicles on the segment, m/s
+
+        Returns:
+            (old level, new level) when the level changed, else None
+        """
+        with self._lock:
+            s = self._segments[segment_id]
+            b = int(t // self.bucket)
+            i = s.head % self.buckets if b == s.head else self._advance(s, b)
+            totals = s.totals
+            if entered:
+                s.entered[i] += entered
+                totals[0] += entered
+            if occupancy is not None:
+                s.occ_sum[i] += occupancy
+                s.occ_n[i] += 1
+                totals[1] += occupancy
+                totals[2] += 1
+            for v in speeds:
+                s.speed_sum[i] += v
+                s.speed_n[i] += 1
+                totals[3] += v
+                totals[4] += 1
+            if s.first is None:
+                s.first = s.last = t
+            elif t > s.last:
+                s.last = t
+            return self._classify(segment_id, s, t)
+
+    def _classify(self, segment_id, s, t):
+        if not s.totals[2]:
+            return None
+        occupancy = max(0.0, s.totals[1] / s.totals[2])
+        speed = s.totals[3] / s.totals[4] if s.totals[4] >= self.min_speed_samples else None
+        s.index = congestion_index(occupancy, speed * MS_TO_MPH / s.free_speed if speed is not None else None)
+        if s.level is None:
+            # First reading: no previous level to hold on to
+            return self._change(segment_id, s, bisect.bisect_right(self.bounds, s.index), t)
+        target = s.level
+        while target < len(self.bounds) and s.index >= self.bounds[target] + self.half_margin:
+            target += 1
+        while target > 0 and s.index < self.bounds[target - 1] - self.half_margin:
+            target -= 1
+        if target == s.level:
+            s.pending = None
+            return None
+        if s.pending != target:
+            s.pending, s.pending_since = target, t
+        if t - s.pending_since < self.dwell:
+            return None
+        return self._change(segment_id, s, target, t)
+
+    def _change(self, segment_id, s, level, t):
+        old, s.level, s.since, s.pending = s.level, level, t, None
+        self._changed.add(segment_id)
+        if old is not None:
+            CHANGES.inc(direction='up' if level > old else 'down')
+        return old, level
+
+    def expire(self, t):
+        """Drop the level of segments with no observation for a whole window (e.g. their camera went offline)"""
+        with self._lock:
+            for segment_id, s in self._segments.items():
+                if s.level is not None and t - s.last > self.window:
+                    s.level = s.index = s.pending = s.first = s.head = None
+                    self._changed.add(segment_id)
+
+    def state(self, segment_id, t=None):
+        """
+        Current measures of a segment, or None before its first observation
+
+        Returns:
+            Dict with level, index, flow (vehicles/hour), occupancy (0-1),
+            speed (mph, None until enough samples) and since (time of the
+            last level change)
+        """
+        with self._lock:
+            s = self._segments[segment_id]
+            if s.level is None:
+                return None
+            if t is not None:
+                self._advance(s, int(t // self.bucket))
+            span = min(self.window, max(self.bucket, (t or s.last) - s.first + self.bucket))
+            e, occ_sum, occ_n, speed_sum, speed_n = s.totals
+            return {'level': s.level, 'index': round(s.index, 1), 'flow': round(e * 3600 / span),
+                    'occupancy': round(max(0.0, occ_sum / occ_n), 3) if occ_n else 0.0,
+                    'speed': round(speed_sum / speed_n * MS_TO_MPH, 1) if speed_n >= self.min_speed_samples else None,
+                    'since': s.since}
+
+    def changes(self):
+        """Ids of segments whose level changed (or expired) since the last call"""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        return changed
+
+    def snapshot(self):
+        """{segment_id: state} of every segment with a level"""
+        return {sid: state for sid in list(self._segments) if (state := self.state(sid)) is not None}
+
+
+def local_xy(points, origin):
+    """Equirectangular metres east and north of origin for [[lat, lon], ...]; exact enough across a camera's view"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    lat0, lon0 = origin
+    return np.column_stack([np.radians(points[:, 1] - lon0) * EARTH_RADIUS_M * math.cos(math.radians(lat0)),
+                            np.radians(points[:, 0] - lat0) * EARTH_RADIUS_M])
+
+
+def _nearest_piece(xy, starts, vectors):
+    """Index of and distance to the closest polyline piece for each point"""
+    d = xy[:, None, :] - starts[None, :, :]
+    lengths = np.maximum((vectors ** 2).sum(axis=1), 1e-9)
+    t = np.clip((d * vectors[None]).sum(axis=2) / lengths, 0, 1)
+    dist = np.linalg.norm(d - t[..., None] * vectors[None], axis=2)
+    best = dist.argmin(axis=1)
+    return best, dist[np.arange(len(xy)), best]
+
+
+class CameraView:
+    """
+    What one camera sees of the road network
+
+    With a calibration (four or more image points, as frame fractions, and
+    the [lat, lon] of the same points on the road) a vehicle's ground contact
+    point, the bottom centre of its box, is projected onto the map and
+    assigned to the nearest segment within max_distance. The calibrated
+    polygon bounds the view: only segments crossing it are observed, each
+    over the length inside it, and speeds come from tracks' ground movement.
+    Without a calibration the whole frame counts as view_length metres of
+    the segment nearest to the camera, and no speeds are measured.
+    """
+
+    def __init__(self, segments, origin, calibration=None, max_distance=20, view_length=100, radius=250,
+                 speed_baseline=1.0, forget=5.0, min_hits=2):
+        """
+        Args:
+            segments: Road segments, dicts with 'id' and 'coords' ([[lat, lon], ...])
+            origin: Camera [lat, lon]
+            calibration: Optional {'image': [[x, y], ...], 'ground': [[lat, lon], ...]}
+            max_distance: Metres from a segment within which a vehicle is on it
+            view_length: Road length assumed visible without a calibration, metres
+            radius: Metres within which the nearest segment is taken without a calibration
+            speed_baseline: Seconds of track movement per speed sample
+            forget: Seconds after which an unseen track is forgotten
+            min_hits: Frames a track must be seen on a segment before it counts
+                as having entered it (one-frame false positives never do)
+        """
+        self.origin = origin
+        self.max_distance = max_distance
+        self.speed_baseline = speed_baseline
+        self.forget = forget
+        self.min_hits = min_hits
+        self.homography = None
+        self._tracks = {}  # track id -> [segment, t_ref, xy_ref, last_seen, hits]
+        polylines = [(s['id'], local_xy(s['coords'], origin)) for s in segments]
+        if calibration:
+            image = np.array(calibration['image'], dtype=np.float64)
+            ground = local_xy(calibration['ground'], origin)
+            if len(image) < 4 or len(image) != len(ground):
+                raise ValueError('a calibration needs the same four or more image and ground points')
+            self.homography = cv2.findHomography(image, ground)[0]
+            self.footprint = ground.astype(np.float32)
+            self.visible = {}
+            for sid, xy in polylines:
+                length = self._inside_length(xy)
+                if length >= 1:
+                    self.visible[sid] = length
+            starts, vectors, owners = [], [], []
+            for sid, xy in polylines:
+                if sid in self.visible:
+                    starts.append(xy[:-1])
+                    vectors.append(np.diff(xy, axis=0))
+                    owners += [sid] * (len(xy) - 1)
+            self._starts = np.vstack(starts) if starts else np.empty((0, 2))
+            self._vectors = np.vstack(vectors) if vectors else np.empty((0, 2))
+            self._owners = owners
+        else:
+            nearest = None
+            for sid, xy in polylines:
+                if len(xy) < 2:
+                    continue
+                _, dist = _nearest_piece(np.zeros((1, 2)), xy[:-1], np.diff(xy, axis=0))
+                if dist[0] <= radius and (nearest is None or dist[0] < nearest[1]):
+                    nearest = (sid, dist[0])
+            self.visible = {nearest[0]: float(view_length)} if nearest else {}
+
+    def _inside_length(self, xy, step=1.0):
+        # Road length inside the footprint, by testing points every `step` metres
+        inside = 0.0
+        for a, b in zip(xy[:-1], xy[1:]):
+            length = float(np.linalg.norm(b - a))
+            n = max(1, math.ceil(length / step))
+            for k in range(n):
+                p = a + (b - a) * (k + 0.5) / n
+                if cv2.pointPolygonTest(self.footprint, (float(p[0]), float(p[1])), False) >= 0:
+                    inside += length / n
+        return inside
+
+    def observe(self, t, detections, shape):
+        """
+        Turn one frame's tracked detections into segment observations
+
+        Args:
+            t: Capture time of the frame (epoch seconds)
+            detections: Detections with 'bbox', 'type' and 'track_id' (VehicleTracker.update)
+            shape: Frame (height, width)
+
+        Returns:
+            List of (segment_id, occupancy, entered, speeds) for every segment in view
+        """
+        h, w = shape[:2]
+        occupied = dict.fromkeys(self.visible, 0.0)
+        entered = dict.fromkeys(self.visible, 0)
+        speeds = {sid: [] for sid in self.visible}
+        if detections and self.visible:
+            feet = np.array([[(d['bbox'][0] + d['bbox'][2]) / 2 / w, d['bbox'][3] / h] for d in detections])
+            if self.homography is None:
+                on = [next(iter(self.visible))] * len(detections)
+                xy = [None] * len(detections)
+            else:
+                xy = cv2.perspectiveTransform(feet.reshape(-1, 1, 2), self.homography).reshape(-1, 2)
+                best, dist = _nearest_piece(xy, self._starts, self._vectors)
+                on = [self._owners[b] if d <= self.max_distance and
+                      cv2.pointPolygonTest(self.footprint, (float(p[0]), float(p[1])), False) >= 0 else None
+                      for b, d, p in zip(best.tolist(), dist.tolist(), xy)]
+            for det, sid, p in zip(detections, on, xy):
+                if sid is None:
+                    continue
+                occupied[sid] += VEHICLE_LENGTHS.get(det['type'], DEFAULT_VEHICLE_LENGTH)
+                track = self._tracks.get(det.get('track_id'))
+                if track is None or track[0] != sid:
+                    track = self._tracks[det.get('track_id')] = [sid, t, p, t, 0]
+                track[3] = t
+                track[4] += 1
+                if track[4] == self.min_hits:
+                    entered[sid] += 1
+                if p is not None and t - track[1] >= self.speed_baseline:
+                    v = float(np.linalg.norm(p - track[2])) / (t - track[1])
+                    if v < 70:  # faster than 250 km/h is a mapping glitch
+                        speeds[sid].append(v)
+                    track[1], track[2] = t, p
+        if len(self._tracks) > 4 * len(detections) + 16:
+            self._tracks = {k: v for k, v in self._tracks.items() if t - v[3] <= self.forget}
+        return [(sid, min(1.0, occupied[sid] / self.visible[sid]), entered[sid], speeds[sid]) for sid in self.visible]
+
+
+def load_calibration(path):
+    """
+    Per-camera ground calibrations from a JSON file
+
+    The file maps camera ids to image points (frame fractions) and the
+    [lat, lon] of the same points, e.g. {"cam_001": {"image": [[0.2, 0.95],
+    [0.8, 0.95], [0.65, 0.45], [0.35, 0.45]], "ground": [[40.7577, -73.9858], ...]}}.
+
+    Returns:
+        {camera_id: calibration}, empty when path is unset or missing
+    """
+    if not path or not Path(path).exists():
+        return {}
+    return {str(cid): cal for cid, cal in json.loads(Path(path).read_text()).items()}
+
+
+class CongestionMonitor:
+    """CameraViews feeding one CongestionEngine"""
+
+    def __init__(self, engine, views):
+        """
+        Args:
+            engine: CongestionEngine over the road segments
+            views: {camera_id: CameraView}
+        """
+        self.engine = engine
+        self.views = views
+
+    @classmethod
+    def for_cameras(cls, segments, cameras, calibrations=None, free_speed=55, **engine_options):
+        """
+        Monitor for the given cameras; a camera is skipped when it sees no segment
+
+        Args:
+            segments: Road segments ('id', 'coords', optional 'free_speed' in mph)
+            cameras: {camera_id: [lat, lon]} of the cameras being ingested
+            calibrations: {camera_id: calibration} (see load_calibration)
+            free_speed: Free-flow speed in mph for segments without one
+            **engine_options: CongestionEngine keyword arguments
+        """
+        calibrations = calibrations or {}
+        engine = CongestionEngine({s['id']: s.get('free_speed') or free_speed for s in segments}, **engine_options)
+        # A calibrated camera missing from the camera list is placed at its first ground point
+        cameras = dict(cameras, **{cid: cal['ground'][0] for cid, cal in calibrations.items() if cid not in cameras})
+        views = {}
+        for cid, origin in cameras.items():
+            view = CameraView(segments, origin, calibrations.get(cid))
+            if view.visible:
+                views[cid] = view
+        return cls(engine, views)
+
+    def observe(self, camera_id, t, detections, shape):
+        """Feed one camera frame; returns the (segment_id, old level, new level) changes it caused"""
+        view = self.views.get(camera_id)
+        if view is None:
+            return []
+        changes = []
+        observations = view.observe(t, detections, shape)
+        OBSERVATIONS.inc(len(observations))
+        for sid, occupancy, entered, speeds in observations:
+            change = self.engine.observe(sid, t, occupancy, entered, speeds)
+            if change:
+                changes.append((sid, *change))
+        return changes
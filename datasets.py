@@ -0,0 +1,72 @@
+"""
+Static Datasets
+Demo map layers and traffic constants shared by the web app and the ingest service, importable without Flask
+"""
+
+VEHICLE_CATEGORIES = ['bike', 'motorcycle', 'car', 'auto_rickshaw', 'bus', 'truck', 'ambulance', 'police', 'fire_truck']
+
+CAMERA_LOCATIONS = [
+    {'id': 'cam_001', 'name': 'Times Square', 'lat': 40.7580, 'lon': -73.9855, 'location': 'New York, NY', 'road': 'Broadway'},
+    {'id': 'cam_002', 'name': 'Golden Gate Bridge', 'lat': 37.8199, 'lon': -122.4783, 'location': 'San Francisco, CA', 'road': 'US-101'},
+    {'id': 'cam_003', 'name': 'Hollywood Blvd', 'lat': 34.1016, 'lon': -118.3267, 'location': 'Los Angeles, CA', 'road': 'Hollywood Blvd'},
+    {'id': 'cam_004', 'name': 'Magnificent Mile', 'lat': 41.8954, 'lon': -87.6246, 'location': 'Chicago, IL', 'road': 'Michigan Ave'},
+    {'id': 'cam_005', 'name': 'Space Center', 'lat': 29.5519, 'lon': -95.0930, 'location': 'Houston, TX', 'road': 'NASA Pkwy'},
+    {'id': 'cam_006', 'name': 'Las Vegas Strip', 'lat': 36.1147, 'lon': -115.1728, 'location': 'Las Vegas, NV', 'road': 'Las Vegas Blvd'},
+    {'id': 'cam_007', 'name': 'Miami Beach', 'lat': 25.7907, 'lon': -80.1300, 'location': 'Miami, FL', 'road': 'Collins Ave'},
+    {'id': 'cam_008', 'name': 'Pike Place', 'lat': 47.6097, 'lon': -122.3422, 'location': 'Seattle, WA', 'road': 'Pike St'},
+]
+
+ROAD_SEGMENTS = [
+    {'id': 'road_001', 'name': 'Broadway North', 'coords': [[40.7580, -73.9855], [40.7650, -73.9800], [40.7720, -73.9750]]},
+    {'id': 'road_002', 'name': 'Broadway South', 'coords': [[40.7580, -73.9855], [40.7510, -73.9910], [40.7440, -73.9960]]},
+    {'id': 'road_003', 'name': 'Golden Gate North', 'coords': [[37.8199, -122.4783], [37.8350, -122.4750], [37.8500, -122.4700]]},
+    {'id': 'road_004', 'name': 'Hollywood East', 'coords': [[34.1016, -118.3267], [34.1016, -118.3100], [34.1016, -118.2900]]},
+    {'id': 'road_005', 'name': 'Michigan Ave North', 'coords': [[41.8954, -87.6246], [41.9050, -87.6246], [41.9150, -87.6246]]},
+    {'id': 'road_006', 'name': 'Las Vegas Blvd', 'coords': [[36.1147, -115.1728], [36.1250, -115.1700], [36.1350, -115.1680]]},
+    {'id': 'road_007', 'name': 'Collins Ave', 'coords': [[25.7907, -80.1300], [25.8000, -80.1280], [25.8100, -80.1260]]},
+    {'id': 'road_008', 'name': 'Pike St', 'coords': [[47.6097, -122.3422], [47.6150, -122.3400], [47.6200, -122.3380]]},
+]
+
+POIS = [
+    {'id': 'poi_001', 'name': 'Statue of Liberty', 'lat': 40.6892, 'lon': -74.0445, 'category': 'monument', 'rating': 4.8, 'description': 'Iconic symbol of freedom'},
+    {'id': 'poi_002', 'name': 'Central Park', 'lat': 40.7829, 'lon': -73.9654, 'category': 'park', 'rating': 4.9, 'description': 'Urban oasis in Manhattan'},
+    {'id': 'poi_003', 'name': 'Golden Gate Park', 'lat': 37.7694, 'lon': -122.4862, 'category': 'park', 'rating': 4.7, 'description': 'Large urban park'},
+    {'id': 'poi_004', 'name': 'Hollywood Sign', 'lat': 34.1341, 'lon': -118.3215, 'category': 'landmark', 'rating': 4.6, 'description': 'Famous landmark'},
+    {'id': 'poi_005', 'name': 'Navy Pier', 'lat': 41.8917, 'lon': -87.6063, 'category': 'entertainment', 'rating': 4.5, 'description': 'Lakefront entertainment'},
+    {'id': 'poi_006', 'name': 'Space Center Houston', 'lat': 29.5519, 'lon': -95.0930, 'category': 'museum', 'rating': 4.7, 'description': 'NASA visitor center'},
+    {'id': 'poi_007', 'name': 'Bellagio Fountains', 'lat': 36.1126, 'lon': -115.1767, 'category': 'attraction', 'rating': 4.8, 'description': 'Famous water show'},
+    {'id': 'poi_008', 'name': 'South Beach', 'lat': 25.7825, 'lon': -80.1340, 'category': 'beach', 'rating': 4.6, 'description': 'Iconic beach destination'},
+]
+
+EMERGENCY_SERVICES = [
+    {'id': 'hosp_001', 'name': 'NYC General Hospital', 'lat': 40.7370, 'lon': -73.9750, 'type': 'hospital', 'phone': '911'},
+    {'id': 'hosp_002', 'name': 'SF Medical Center', 'lat': 37.7630, 'lon': -122.4580, 'type': 'hospital', 'phone': '911'},
+    {'id': 'police_001', 'name': 'NYPD Precinct 1', 'lat': 40.7128, 'lon': -74.0060, 'type': 'police', 'phone': '911'},
+    {'id': 'fire_001', 'name': 'FDNY Station 1', 'lat': 40.7200, 'lon': -73.9980, 'type': 'fire_station', 'phone': '911'},
+    {'id': 'hosp_003', 'name': 'LA Medical Center', 'lat': 34.0700, 'lon': -118.3000, 'type': 'hospital', 'phone': '911'},
+    {'id': 'police_002', 'name': 'LAPD Central', 'lat': 34.0530, 'lon': -118.2450, 'type': 'police', 'phone': '911'},
+]
+
+DISASTER_ZONES = [
+    {'id': 'flood_001', 'name': 'Hudson River Flood Zone', 'lat': 40.7580, 'lon': -74.0000, 'type': 'flood', 'risk': 'medium', 'radius': 2000},
+    {'id': 'quake_001', 'name': 'San Andreas Fault Zone', 'lat': 37.7749, 'lon': -122.4194, 'type': 'earthquake', 'risk': 'high', 'radius': 5000},
+    {'id': 'hurricane_001', 'name': 'Miami Hurricane Zone', 'lat': 25.7617, 'lon': -80.1918, 'type': 'hurricane', 'risk': 'high', 'radius': 10000},
+]
+
+TRAFFIC_SIGNALS = [
+    {'id': 'sig_001', 'lat': 40.7580, 'lon': -73.9855, 'intersection': 'Broadway & 42nd'},
+    {'id': 'sig_002', 'lat': 37.8199, 'lon': -122.4783, 'intersection': 'GG Bridge South'},
+    {'id': 'sig_003', 'lat': 34.1016, 'lon': -118.3267, 'intersection': 'Hollywood & Highland'},
+    {'id': 'sig_004', 'lat': 41.8954, 'lon': -87.6246, 'intersection': 'Michigan & Chicago'},
+    {'id': 'sig_005', 'lat': 36.1147, 'lon': -115.1728, 'intersection': 'Las Vegas Blvd & Flamingo'},
+]
+
+PARKING_LOTS = [
+    {'id': 'park_001', 'name': 'Times Square Parking', 'lat': 40.7550, 'lon': -73.9850, 'capacity': 500, 'rate': '$8/hr'},
+    {'id': 'park_002', 'name': 'Hollywood Garage', 'lat': 34.0980, 'lon': -118.3250, 'capacity': 300, 'rate': '$5/hr'},
+    {'id': 'park_003', 'name': 'Vegas Strip Parking', 'lat': 36.1100, 'lon': -115.1700, 'capacity': 1000, 'rate': '$3/hr'},
+    {'id': 'park_004', 'name': 'Miami Beach Lot', 'lat': 25.7850, 'lon': -80.1280, 'capacity': 200, 'rate': '$4/hr'},
+]
+
+# Density at which each congestion level above free flow starts (0-100 scale)
+CONGESTION_BOUNDS = [30, 60, 85, 95]
@@ -0,0 +1,188 @@
+"""
+Server-Sent Events Push Stream
+One producer diffs the dashboard datasets and fans the changes out to every open dashboard
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class StreamFullError(Exception):
+    """Raised when a hub already has max_subscribers connected"""
+
+
+def format_event(event, event_id, payload):
+    """Encode one SSE message"""
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(payload, separators=(",", ":"))}\n\n'.encode()
+
+
+class EventHub:
+    """
+    Single-producer, many-subscriber change feed
+
+    The producer thread polls each registered source, compares it item by item
+    (keyed by 'id') with the previous state and encodes a delta once. Encoded
+    events sit in a short shared ring; a subscriber only holds the sequence
+    number of the last event it sent, so an idle connection costs a generator
+    frame and an int. A subscriber that falls off the end of the ring, or
+    reconnects with an unknown Last-Event-ID, gets a full snapshot instead.
+
+    Event ids are '<epoch>-<seq>', the epoch naming this process and its start
+    time: every gunicorn worker runs its own hub, so a client that reconnects
+    to another worker (or after a restart) presents a foreign epoch and is
+    sent a snapshot rather than resuming from an unrelated sequence number.
+
+    Under a threaded server every open stream still holds one of the worker's
+    threads, so max_subscribers caps the streams per hub (per worker) and
+    keeps threads free for ordinary requests.
+    """
+
+    def __init__(self, interval=5, history=64, heartbeat=15, max_subscribers=None):
+        """
+        Args:
+            interval: Seconds between producer polls
+            history: Number of encoded deltas kept for slow or reconnecting clients
+            heartbeat: Seconds of silence before a keep-alive comment is sent
+            max_subscribers: Open streams allowed at once (None: no limit)
+        """
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.sources = {}
+        self.state = {}
+        self.seq = 0
+        self.epoch = None
+        self.subscribers = 0
+        self._events = deque(maxlen=history)
+        self._snapshot = None
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def register(self, name, fetch, key='id'):
+        """
+        Add a dataset to the feed
+
+        Args:
+            name: Key used in event payloads (e.g. 'cameras')
+            fetch: Callable returning a list of dicts, or a single dict
+            key: Field identifying list items; dicts are compared as a whole
+        """
+        self.sources[name] = (fetch, key)
+
+    def poke(self):
+        """Ask the producer to poll now, e.g. right after a report is posted"""
+        self._wake.set()
+
+    def start(self):
+        # Started by the first subscriber, so a forking server never inherits the thread
+        with self._cond:
+            if self._thread is None:
+                # Taken here, after any fork, so every worker has its own
+                self.epoch = f'{os.getpid():x}.{time.time_ns():x}'
+                self._poll()
+                self._thread = threading.Thread(target=self._run, name='event-hub', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"⚠ Event stream producer error: {e}")
+
+    def _poll(self):
+        changes, removed = {}, {}
+        current = {}
+        for name, (fetch, key) in self.sources.items():
+            data = fetch()
+            current[name] = data
+            old = self.state.get(name)
+            if isinstance(data, dict):
+                if data != old:
+                    changes[name] = data
+                continue
+            old_items = {item[key]: item for item in old or []}
+            new_items = {item[key]: item for item in data}
+            changed = [item for k, item in new_items.items() if old_items.get(k) != item]
+            gone = [k for k in old_items if k not in new_items]
+            if changed:
+                changes[name] = changed
+            if gone:
+                removed[name] = gone
+
+        with self._cond:
+            self.state = current
+            if not changes and not removed:
+                return
+            self._snapshot = None
+            self.seq += 1
+            payload = dict(changes, seq=self.seq)
+            if removed:
+                payload['removed'] = removed
+            self._events.append((self.seq, format_event('delta', self._event_id(), payload)))
+            self._cond.notify_all()
+
+    def _snapshot_event(self):
+        # Built at most once per change, shared by every (re)connecting client
+        if self._snapshot is None:
+            self._snapshot = format_event('snapshot', self._event_id(), dict(self.state, seq=self.seq))
+        return self._snapshot
+
+    def _event_id(self):
+        return f'{self.epoch}-{self.seq}'
+
+    def _pending(self, cursor):
+        """Events after cursor, or None when the ring no longer reaches back that far"""
+        if cursor == self.seq:
+            return []
+        if not self._events or cursor < self._events[0][0] - 1 or cursor > self.seq:
+            return None
+        return [data for seq, data in self._events if seq > cursor]
+
+    def subscribe(self, last_event_id=None):
+        """
+        Take a subscriber slot and return the generator of encoded SSE messages for one client
+
+        Args:
+            last_event_id: Value of the client's Last-Event-ID header, if any
+
+        Raises:
+            StreamFullError: If max_subscribers streams are already open
+        """
+        self.start()
+        # Resume only from an id this hub issued; anything else gets a snapshot
+        epoch, _, seq = (last_event_id or '').rpartition('-')
+        cursor = int(seq) if epoch == self.epoch and seq.isdigit() else None
+
+        # Taken now rather than when the response starts, so the caller can still answer 503
+        with self._cond:
+            if self.max_subscribers is not None and self.subscribers >= self.max_subscribers:
+                raise StreamFullError(f'{self.subscribers} streams open')
+            self.subscribers += 1
+        return self._stream(cursor)
+
+    def _stream(self, cursor):
+        try:
+            yield f'retry: {self.interval * 1000}\n\n'.encode()
+            while True:
+                with self._cond:
+                    pending = None if cursor is None else self._pending(cursor)
+                    if pending == []:
+                        self._cond.wait(self.heartbeat)
+                        pending = self._pending(cursor)
+                    if pending is None:
+                        pending = [self._snapshot_event()]
+                    cursor = self.seq
+                if pending:
+                    yield b''.join(pending)
+                else:
+                    yield b': keep-alive\n\n'
+        finally:
+            with self._cond:
+                self.subscribers -= 1
@@ -0,0 +1,140 @@
+"""
+Traffic Forecasting Engine
+Hour-of-week seasonal exponential smoothing, fitted for every camera at once
+"""
+
+import threading
+
+import numpy as np
+
+SEASON = 168  # hours in a week
+_EPOCH_WEEKDAY_OFFSET = 72  # 1970-01-01 was a Thursday; slot 0 is Monday 00:00 UTC
+
+
+def hour_of_week(epoch_hour):
+    return (np.asarray(epoch_hour) + _EPOCH_WEEKDAY_OFFSET) % SEASON
+
+
+class SeasonalForecaster:
+    """
+    Additive Holt-Winters (level + hour-of-week seasonal) per camera
+
+    State is a few NumPy arrays with one row per camera, so each training step
+    updates every camera with a handful of vector operations, and new hours
+    are folded in incrementally without refitting. An hour with a zero count
+    is treated as missing (camera offline), not as an empty road.
+    """
+
+    def __init__(self, alpha=0.1, gamma=0.3, history_weeks=4):
+        """
+        Args:
+            alpha: Level smoothing factor
+            gamma: Seasonal smoothing factor
+            history_weeks: Weeks of history read on the first training pass
+        """
+        self.alpha = alpha
+        self.gamma = gamma
+        self.history_weeks = history_weeks
+        self.camera_ids = []
+        self._row = {}
+        self.level = np.zeros(0)
+        self.seasonal = np.zeros((0, SEASON))
+        self.seen = np.zeros((0, SEASON), dtype=bool)
+        self.mae = np.zeros(0)
+        self.trained_until = None  # epoch hour after the last one trained on
+        self._forecast = None
+        self._lock = threading.Lock()
+
+    def _rows(self, camera_ids):
+        new = [c for c in camera_ids if c not in self._row]
+        if new:
+            for c in new:
+                self._row[c] = len(self.camera_ids)
+                self.camera_ids.append(c)
+            n = len(new)
+            self.level = np.concatenate([self.level, np.full(n, np.nan)])
+            self.seasonal = np.concatenate([self.seasonal, np.zeros((n, SEASON))])
+            self.seen = np.concatenate([self.seen, np.zeros((n, SEASON), dtype=bool)])
+            self.mae = np.concatenate([self.mae, np.zeros(n)])
+        return np.array([self._row[c] for c in camera_ids], dtype=np.int64)
+
+    def update(self, first_hour, values, camera_ids):
+        """
+        Train on consecutive hourly totals
+
+        Args:
+            first_hour: Epoch hour (unix time // 3600) of values[0]
+            values: Array of shape (hours, cameras)
+            camera_ids: Camera id for each column
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(camera_ids))
+        rows = self._rows(camera_ids)
+        # Work on dense copies; fancy-index writes happen once at the end
+        level, seasonal, seen, mae = self.level[rows], self.seasonal[rows], self.seen[rows], self.mae[rows]
+        a, g = self.alpha, self.gamma
+        for t, slot in enumerate(hour_of_week(first_hour + np.arange(len(values))).tolist()):
+            y = values[t]
+            obs = y > 0
+            first = obs & np.isnan(level)
+            level[first] = y[first]
+            s, known = seasonal[:, slot], seen[:, slot] & obs
+            fresh = obs & ~seen[:, slot]
+            # Known slot: standard additive update; first visit to a slot: take the deviation as is
+            new_level = np.where(known, a * (y - s) + (1 - a) * level, level)
+            mae = np.where(known, 0.9 * mae + 0.1 * np.abs(y - level - s), mae)
+            seasonal[:, slot] = np.where(known, g * (y - new_level) + (1 - g) * s, np.where(fresh, y - level, s))
+            seen[:, slot] |= obs
+            level = new_level
+        self.level[rows], self.seasonal[rows], self.seen[rows], self.mae[rows] = level, seasonal, seen, mae
+        end = first_hour + len(values)
+        self.trained_until = end if self.trained_until is None else max(self.trained_until, end)
+        self._forecast = None
+
+    def forecast(self, horizon=24):
+        """
+        Forecast the next hours after the last trained one
+
+        Returns:
+            (epoch hours, counts of shape (cameras, horizon), confidence in [0, 1])
+        """
+        if self._forecast is not None and self._forecast[1].shape[1] == horizon:
+            return self._forecast
+        hours = self.trained_until + np.arange(horizon) if self.trained_until is not None else np.arange(horizon)
+        slots = hour_of_week(hours)
+        level = np.nan_to_num(self.level)[:, None]
+        known = self.seen[:, slots]
+        pred = np.maximum(level + np.where(known, self.seasonal[:, slots], 0), 0)
+        # Error grows with the horizon roughly as in simple exponential smoothing
+        spread = self.mae[:, None] * np.sqrt(1 + np.arange(horizon) * self.alpha ** 2)[None, :]
+        confidence = np.where(known, np.clip(1 - spread / np.maximum(pred, 1), 0, 1), 0.2)
+        confidence[np.isnan(self.level)] = 0
+        self._forecast = (hours, np.round(pred), np.round(confidence, 2))
+        return self._forecast
+
+    def refresh(self, store, camera_ids, now, horizon=24):
+        """
+        Train on any completed hours the store has that the model has not seen, then forecast
+
+        Args:
+            store: TimeSeriesStore
+            camera_ids: Cameras to forecast
+            now: Unix time
+            horizon: Hours to forecast
+
+        Returns:
+            Same as forecast(); cached until the next hour completes
+        """
+        current = int(now // 3600)
+        with self._lock:
+            missing = [c for c in camera_ids if c not in self._row]
+            if missing and self.trained_until is not None:
+                # Late-joining cameras get the same history window as the rest
+                start = self.trained_until - self.history_weeks * SEASON
+                self.update(start, store.per_camera(missing, start * 3600, self.trained_until * 3600), missing)
+            start = self.trained_until if self.trained_until is not None else current - self.history_weeks * SEASON
+            if start < current:
+                self.update(start, store.per_camera(camera_ids, start * 3600, current * 3600), camera_ids)
+            hours, counts, confidence = self.forecast(horizon)
+            rows = self._rows(camera_ids)
+            return hours, counts[rows], confidence[rows]
+
@@ -0,0 +1,19 @@
+"""
+Gunicorn Settings
+Read from the working directory by `gunicorn app:app`; command-line flags (render.yaml) take precedence
+"""
+
+import os
+
+# Import the app (NumPy, the static datasets, the spatial indexes and road graph) once
+# in the master; workers are forked from it and share those pages copy-on-write
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+
+def post_worker_init(worker):
+    # Every web worker runs its own detector pool: split the cores between them.
+    # Then start the pool before the first request, so the model load and
+    # warm-up inference never land on one; /ready answers 503 until they are done
+    from app import jobs
+    jobs.share_host(worker.cfg.workers)
+    jobs.warm_up()
@@ -0,0 +1,132 @@
+"""
+Heatmap Aggregation Engine
+Bins weighted points into a quadtree (Morton-ordered) index and serves aggregated map tiles
+"""
+
+import math
+
+import numpy as np
+
+# Finest level of the quadtree; 2^16 cells per axis is ~600 m at the equator
+MAX_ZOOM = 16
+
+
+def lonlat_to_unit(lat, lon):
+    """Project WGS84 degrees to Web Mercator coordinates in [0, 1)"""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -85.0511, 85.0511)
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(np.radians(lat)) + 1.0 / np.cos(np.radians(lat))) / math.pi) / 2.0
+    return np.clip(x, 0, 1 - 1e-12), np.clip(y, 0, 1 - 1e-12)
+
+
+def unit_to_lonlat(x, y):
+    """Inverse of lonlat_to_unit"""
+    lon = np.asarray(x) * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * np.asarray(y)))))
+    return lat, lon
+
+
+def _spread_bits(v):
+    """Interleave zeros between the low 16 bits of v (Morton encoding helper)"""
+    v = v.astype(np.uint64) & np.uint64(0xFFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x33333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x55555555)
+    return v
+
+
+def morton_keys(x, y, zoom=MAX_ZOOM):
+    """Quadtree keys for unit coordinates; points in one tile share a key prefix"""
+    n = 1 << zoom
+    ix = (np.asarray(x) * n).astype(np.uint64)
+    iy = (np.asarray(y) * n).astype(np.uint64)
+    return _spread_bits(ix) | (_spread_bits(iy) << np.uint64(1))
+
+
+class HeatmapIndex:
+    """
+    Weighted point set sorted in quadtree order
+
+    Because points are ordered by Morton key, every tile at every zoom is one
+    contiguous slice found with two binary searches, and aggregating it is a
+    single np.bincount. Tile payload size is bounded by cells² regardless of
+    how many raw points fall inside.
+    """
+
+    def __init__(self, cells=64):
+        """
+        Args:
+            cells: Aggregation grid size per tile side
+        """
+        self.cells = cells
+        self._keys = np.empty(0, dtype=np.uint64)
+        self._x = np.empty(0)
+        self._y = np.empty(0)
+        self._w = np.empty(0)
+        self._pending = []
+        self._tiles = {}
+
+    def __len__(self):
+        return len(self._keys) + sum(len(p[0]) for p in self._pending)
+
+    def add(self, lat, lon, weight=1.0):
+        """
+        Add points (scalars or arrays); they are merged into the index on the next query
+        """
+        x, y = lonlat_to_unit(np.atleast_1d(lat), np.atleast_1d(lon))
+        w = np.broadcast_to(np.asarray(weight, dtype=np.float64), x.shape)
+        self._pending.append((x, y, np.array(w)))
+
+    def _merge(self):
+        if not self._pending:
+            return
+        x = np.concatenate([self._x] + [p[0] for p in self._pending])
+        y = np.concatenate([self._y] + [p[1] for p in self._pending])
+        w = np.concatenate([self._w] + [p[2] for p in self._pending])
+        keys = morton_keys(x, y)
+        order = np.argsort(keys, kind='stable')
+        self._keys, self._x, self._y, self._w = keys[order], x[order], y[order], w[order]
+        self._pending = []
+        self._tiles = {}
+
+    def tile(self, z, x, y):
+        """
+        Aggregate the points inside slippy-map tile z/x/y
+
+        Returns:
+            Dict of columnar arrays: cell centre 'lat', 'lon' and summed
+            'weight', plus the number of raw points aggregated
+        """
+        self._merge()
+        if z > MAX_ZOOM:
+            # Deeper than the index resolves: answer with the enclosing tile
+            x, y, z = x >> (z - MAX_ZOOM), y >> (z - MAX_ZOOM), MAX_ZOOM
+        cached = self._tiles.get((z, x, y))
+        if cached is not None:
+            return cached
+        n = 1 << z
+        if not (0 <= x < n and 0 <= y < n):
+            return {'z': z, 'x': x, 'y': y, 'lat': [], 'lon': [], 'weight': [], 'points': 0}
+
+        shift = np.uint64(2 * (MAX_ZOOM - z))
+        prefix = morton_keys(np.array([(x + 0.5) / n]), np.array([(y + 0.5) / n]), z)[0]
+        lo = np.searchsorted(self._keys, prefix << shift, side='left')
+        hi = np.searchsorted(self._keys, (prefix + np.uint64(1)) << shift, side='left')
+
+        px = (self._x[lo:hi] * n - x) * self.cells
+        py = (self._y[lo:hi] * n - y) * self.cells
+        cell = np.clip(py.astype(np.int64), 0, self.cells - 1) * self.cells + np.clip(px.astype(np.int64), 0, self.cells - 1)
+        sums = np.bincount(cell, weights=self._w[lo:hi], minlength=self.cells * self.cells)
+        nz = np.nonzero(sums)[0]
+
+        cx = (x + (nz % self.cells + 0.5) / self.cells) / n
+        cy = (y + (nz // self.cells + 0.5) / self.cells) / n
+        lat, lon = unit_to_lonlat(cx, cy)
+        result = {'z': z, 'x': x, 'y': y,
+                  'lat': np.round(lat, 5).tolist(), 'lon': np.round(lon, 5).tolist(),
+                  'weight': np.round(sums[nz], 3).tolist(), 'points': int(hi - lo)}
+        # Low-zoom tiles are the expensive ones and every viewer shares them
+        if len(self._tiles) < 4096:
+            self._tiles[(z, x, y)] = result
+        return result
@@ -0,0 +1,413 @@
+"""
+Live Camera Ingestion Service
+Reads many RTSP/HTTP/file streams, keeps only their newest frames and batches detection across them
+
+Run one instance per host next to the web app:
+    python ingest.py --stream cam_001=rtsp://host/stream --stream cam_002=videos/test.mp4
+    python ingest.py --config streams.json   # {"cam_001": "rtsp://...", ...}
+    python ingest.py --config streams.json --motion-gate --roi-config rois.json
+"""
+
+import argparse
+import functools
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import cv2
+
+from batch_scheduler import BatchScheduler, SchedulerBusyError
+from datasets import CAMERA_LOCATIONS, CONGESTION_BOUNDS, ROAD_SEGMENTS, VEHICLE_CATEGORIES
+from metrics import registry as metrics
+from motion_gate import MotionGate, load_rois, shift_detections
+from render import PreviewPublisher
+from tracker import VehicleTracker
+from vehicle_detector import FRAMES
+
+
+class FrameBuffer:
+    """
+    Latest-frames ring for one stream
+
+    The reader overwrites the oldest slot and the consumer always takes the
+    newest frame, so a slow consumer skips frames instead of building a backlog.
+    """
+
+    def __init__(self, size=2):
+        self._frames = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame, ts):
+        with self._lock:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+                FRAMES.inc(outcome='dropped')
+            self._frames.append((ts, frame))
+            self.received += 1
+        FRAMES.inc(outcome='decoded')
+
+    def take(self):
+        """Newest unconsumed (ts, frame), or None; older unconsumed frames are dropped"""
+        with self._lock:
+            if not self._frames:
+                return None
+            item = self._frames.pop()
+            self.dropped += len(self._frames)
+            FRAMES.inc(len(self._frames), outcome='dropped')
+            self._frames.clear()
+            return item
+
+
+class StreamReader(threading.Thread):
+    """
+    One thread per camera: decode frames and hand them to a FrameBuffer
+
+    Network streams reconnect after errors; local files stand in for cameras
+    by playing at their native frame rate and looping at the end.
+    """
+
+    def __init__(self, camera_id, source, buffer, on_frame=None, reconnect_delay=5):
+        super().__init__(name=f'reader-{camera_id}', daemon=True)
+        self.camera_id = camera_id
+        self.source = source
+        self.buffer = buffer
+        self.on_frame = on_frame
+        self.reconnect_delay = reconnect_delay
+        self.is_file = os.path.exists(str(source))
+        self.connected = False
+        self.errors = 0
+        self._halt = threading.Event()
+
+    def stop(self):
+        self._halt.set()
+
+    def run(self):
+        while not self._halt.is_set():
+            cap = cv2.VideoCapture(self.source)
+            if not cap.isOpened():
+                self.errors += 1
+                print(f"⚠ Cannot open stream {self.camera_id}: {self.source}")
+                self._halt.wait(self.reconnect_delay)
+                continue
+            self.connected = True
+            # Files are paced like a live camera; network streams pace themselves
+            period = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 25) if self.is_file else 0
+            next_due = time.monotonic()
+            try:
+                while not self._halt.is_set():
+                    ok, frame = cap.read()
+                    if not ok:
+                        break
+                    self.buffer.put(frame, time.time())
+                    if self.on_frame:
+                        self.on_frame()
+                    if period:
+                        next_due += period
+                        delay = next_due - time.monotonic()
+                        if delay > 0:
+                            self._halt.wait(delay)
+                        else:
+                            next_due = time.monotonic()
+            finally:
+                cap.release()
+                self.connected = False
+            if not self.is_file and not self._halt.is_set():
+                self.errors += 1
+                print(f"⚠ Stream {self.camera_id} ended, reconnecting in {self.reconnect_delay}s")
+                self._halt.wait(self.reconnect_delay)
+
+
+class IngestService:
+    """
+    Many streams feeding one shared BatchScheduler
+
+    Each camera keeps at most one frame in flight: when a frame arrives and
+    the camera is idle, its newest frame is submitted; when the result comes
+    back, it is queued for a results thread and the next newest frame (if
+    any) follows at once, so tracking and publishing never hold up the
+    scheduler's callback thread or the camera's next frame. The scheduler batches
+    across cameras, so model calls fill up as more streams are added while a
+    single stream still sees at most max_wait of queueing delay. Per-camera
+    trackers turn detections into unique vehicles. Every publish_interval
+    seconds the per-camera results are written to live_dir (one JSON file
+    per camera, read by /api/traffic-data) and the new vehicles are added to
+    the time-series store.
+
+    With motion gating, each camera's frame first goes through its own
+    MotionGate: frames with no motion in the camera's ROI never reach the
+    scheduler, and the rest are cropped to the moving region. With previews
+    on, each processed frame is handed with its tracked detections to a
+    PreviewPublisher, which writes an annotated JPEG per camera next to the
+    result files for the web app's MJPEG stream.
+
+    With a CongestionMonitor, every tracked frame also updates the road
+    segments the camera sees. segments.json in live_dir holds every
+    segment's level and is rewritten (at most once a second) only when a
+    level changes.
+    """
+
+    def __init__(self, scheduler, streams, live_dir, store=None, confidence_threshold=0.5,
+                 publish_interval=30, buffer_size=2, motion_gate=False, rois=None, preview_fps=0, congestion=None):
+        """
+        Args:
+            scheduler: BatchScheduler in front of the detector
+            streams: {camera_id: RTSP/HTTP URL or video file path}
+            live_dir: Directory for the per-camera result files
+            store: Optional TimeSeriesStore for vehicle counts
+            confidence_threshold: Minimum detection confidence
+            publish_interval: Seconds between result files / store writes
+            buffer_size: Frames kept per stream
+            motion_gate: Skip static frames and crop moving ones before detection
+            rois: {camera_id: ROI polygon} for the motion gates
+            preview_fps: Annotated preview frames per camera per second (0: off)
+            congestion: Optional CongestionMonitor fed with the tracked detections
+        """
+        self.scheduler = scheduler
+        self.live_dir = Path(live_dir)
+        self.live_dir.mkdir(parents=True, exist_ok=True)
+        self.store = store
+        self.confidence_threshold = confidence_threshold
+        self.publish_interval = publish_interval
+        self.buffers = {cid: FrameBuffer(buffer_size) for cid in streams}
+        self.readers = {cid: StreamReader(cid, src, self.buffers[cid], on_frame=functools.partial(self._pump, cid))
+                        for cid, src in streams.items()}
+        self.trackers = {cid: VehicleTracker() for cid in streams}
+        self.in_view = {cid: {} for cid in streams}
+        self.new_vehicles = {cid: {} for cid in streams}
+        self.processed = {cid: 0 for cid in streams}
+        self.rejected = {cid: 0 for cid in streams}
+        rois = rois or {}
+        self.gates = {cid: MotionGate(rois.get(cid)) for cid in streams} if motion_gate else {}
+        self.previews = PreviewPublisher(self.live_dir, fps=preview_fps) if preview_fps else None
+        self.congestion = congestion
+        self._inflight = set()
+        # Results waiting for tracking; full only if tracking falls behind detection
+        self._results = queue.Queue(maxsize=4 * max(1, len(streams)))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._worker = None
+
+    def start(self):
+        self.scheduler.start()
+        self._worker = threading.Thread(target=self._process_results, name='ingest-results', daemon=True)
+        self._worker.start()
+        for reader in self.readers.values():
+            reader.start()
+        self._thread = threading.Thread(target=self._run, name='ingest-publisher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for reader in self.readers.values():
+            reader.stop()
+        self.scheduler.stop()
+        if self._worker:
+            self._results.put(None)
+            self._worker.join()
+        if self.previews:
+            self.previews.stop()
+        if self._thread:
+            self._thread.join()
+        self.publish()
+        if self.congestion:
+            self.publish_segments()
+
+    def _run(self):
+        next_publish = time.monotonic() + self.publish_interval
+        while not self._stop.wait(min(1.0, self.publish_interval)):
+            if self.congestion:
+                self.publish_segments()
+            if time.monotonic() >= next_publish:
+                next_publish += self.publish_interval
+                self.publish()
+
+    def _pump(self, camera_id):
+        """Submit the camera's newest frame unless one is already in flight"""
+        with self._lock:
+            if camera_id in self._inflight:
+                return
+            item = self.buffers[camera_id].take()
+            if item is None:
+                return
+            self._inflight.add(camera_id)
+        # Only the thread holding the in-flight slot runs the camera's gate (results only read its ROI mask)
+        ts, frame, box = item[0], item[1], None
+        gate = self.gates.get(camera_id)
+        if gate is not None:
+            box = gate.check(frame)
+            if box is None:
+                FRAMES.inc(outcome='gated')
+                with self._lock:
+                    self._inflight.discard(camera_id)
+                if self.previews:
+                    self.previews.publish(camera_id, frame, [])
+                return
+        crop = frame if box is None else frame[box[1]:box[3], box[0]:box[2]].copy()
+        try:
+            future = self.scheduler.submit(crop, self.confidence_threshold)
+        except SchedulerBusyError:
+            FRAMES.inc(outcome='dropped')
+            with self._lock:
+                self._inflight.discard(camera_id)
+                self.rejected[camera_id] += 1
+            return
+        future.add_done_callback(functools.partial(self._done, camera_id, box, frame, ts))
+
+    def _done(self, camera_id, box, frame, ts, future):
+        # Runs on the scheduler's callback thread: hand the result over and move the camera on
+        try:
+            self._results.put_nowait((camera_id, box, frame, ts, future))
+        except queue.Full:
+            FRAMES.inc(outcome='dropped')
+            with self._lock:
+                self.rejected[camera_id] += 1
+        with self._lock:
+            self._inflight.discard(camera_id)
+        self._pump(camera_id)
+
+    def _process_results(self):
+        """Results thread: the only one touching the trackers and congestion monitor"""
+        while True:
+            item = self._results.get()
+            if item is None:
+                return
+            camera_id, box, frame, ts, future = item
+            try:
+                detections = future.result()
+                if box is not None:
+                    gate = self.gates[camera_id]
+                    detections = [d for d in shift_detections(detections, box[0], box[1]) if gate.inside(d)]
+                self._observe(camera_id, detections, ts, frame.shape)
+                if self.previews:
+                    self.previews.publish(camera_id, frame, detections, self.in_view[camera_id])
+            except Exception as e:
+                print(f"⚠ Detection failed for {camera_id}: {e}")
+
+    def _observe(self, camera_id, detections, ts, shape):
+        tracker = self.trackers[camera_id]
+        first_new = tracker.next_id
+        tracker.update(detections)
+        if self.congestion:
+            self.congestion.observe(camera_id, ts, detections, shape)
+        in_view, new = {}, {}
+        for det in detections:
+            in_view[det['type']] = in_view.get(det['type'], 0) + 1
+            if det['track_id'] >= first_new:
+                new[det['type']] = new.get(det['type'], 0) + 1
+        with self._lock:
+            pending = self.new_vehicles[camera_id]
+            for vehicle_type, n in new.items():
+                pending[vehicle_type] = pending.get(vehicle_type, 0) + n
+            self.in_view[camera_id] = in_view
+            self.processed[camera_id] += 1
+
+    def stats(self):
+        return {cid: {'connected': self.readers[cid].connected, 'received': buf.received,
+                      'dropped': buf.dropped + self.rejected[cid], 'processed': self.processed[cid],
+                      **({'gated': self.gates[cid].gated} if cid in self.gates else {})}
+                for cid, buf in self.buffers.items()}
+
+    def publish(self):
+        """Write each camera's latest result file and store its new vehicles"""
+        now = time.time()
+        stats = self.stats()
+        for cid in self.buffers:
+            with self._lock:
+                counts, self.new_vehicles[cid] = self.new_vehicles[cid], {}
+            if self.store is not None and counts:
+                self.store.record(cid, counts, now)
+            state = {'camera_id': cid, 'vehicle_counts': counts, 'in_view': self.in_view[cid],
+                     'interval': self.publish_interval, 'updated': now, **stats[cid]}
+            path = self.live_dir / f'{cid}.json'
+            tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp.write_text(json.dumps(state))
+            os.replace(tmp, path)
+        tmp = self.live_dir / f'.scheduler.{os.getpid()}.tmp'
+        tmp.write_text(json.dumps(dict(self.scheduler.stats(), updated=now)))
+        os.replace(tmp, self.live_dir / 'scheduler.stats')
+
+    def publish_segments(self):
+        """Rewrite segments.json if any segment's level changed (or expired) since the last call"""
+        engine = self.congestion.engine
+        engine.expire(time.time())
+        if not engine.changes():
+            return
+        path = self.live_dir / 'segments.json'
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_text(json.dumps({'segments': engine.snapshot(), 'updated': time.time()}))
+        os.replace(tmp, path)
+
+
+def main():
+    from congestion import CongestionMonitor, load_calibration
+    from routing import DEFAULT_FREE_SPEED
+    from timeseries import TimeSeriesStore
+    from vehicle_detector import YOLOVehicleDetector
+
+    parser = argparse.ArgumentParser(description='Live camera ingestion service')
+    parser.add_argument('--stream', action='append', default=[], metavar='CAMERA_ID=URL',
+                        help='camera stream (RTSP/HTTP URL or video file); repeatable')
+    parser.add_argument('--config', help='JSON file mapping camera ids to stream URLs')
+    parser.add_argument('--max-batch', type=int, default=16, help='most frames per model call')
+    parser.add_argument('--max-wait', type=float, default=20, help='ms a frame may wait for a batch to fill')
+    parser.add_argument('--confidence', type=float, default=0.5)
+    parser.add_argument('--interval', type=int, default=int(os.environ.get('SNAPSHOT_TTL', 30)),
+                        help='seconds between published results (default: the dashboard tick)')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--motion-gate', action='store_true',
+                        help='skip frames with no motion in the camera ROI and crop the rest')
+    parser.add_argument('--preview-fps', type=float, default=0,
+                        help='annotated preview frames per camera per second for /api/cameras/<id>/preview.mjpg')
+    parser.add_argument('--roi-config', default=os.environ.get('CAMERA_ROIS'),
+                        help='JSON file mapping camera ids to ROI polygons (default: $CAMERA_ROIS)')
+    parser.add_argument('--calibration', default=os.environ.get('CAMERA_CALIBRATION'),
+                        help='JSON file mapping camera ids to image/ground point pairs for segment '
+                             'congestion (default: $CAMERA_CALIBRATION)')
+    args = parser.parse_args()
+
+    streams = json.loads(Path(args.config).read_text()) if args.config else {}
+    for item in args.stream:
+        cid, _, url = item.partition('=')
+        streams[cid] = url
+    if not streams:
+        parser.error('no streams given (use --stream or --config)')
+
+    # Served by the web app's /metrics together with its own
+    metrics.spool(Path(args.data_dir) / 'metrics')
+    detector = YOLOVehicleDetector(os.environ.get('YOLO_MODEL'))
+    detector.warm_up()  # the first batch would otherwise stall every stream for the model load
+    scheduler = BatchScheduler(detector.detect_batch, max_batch=args.max_batch, max_wait=args.max_wait / 1000)
+    service = IngestService(scheduler, streams, Path(args.data_dir) / 'live',
+                            TimeSeriesStore(Path(args.data_dir) / 'timeseries', VEHICLE_CATEGORIES),
+                            confidence_threshold=args.confidence, publish_interval=args.interval,
+                            motion_gate=args.motion_gate, rois=load_rois(args.roi_config),
+                            preview_fps=args.preview_fps,
+                            congestion=CongestionMonitor.for_cameras(
+                                ROAD_SEGMENTS, {c['id']: [c['lat'], c['lon']] for c in CAMERA_LOCATIONS if c['id'] in streams},
+                                load_calibration(args.calibration), free_speed=DEFAULT_FREE_SPEED,
+                                bounds=CONGESTION_BOUNDS))
+    service.start()
+    print(f"✓ Ingesting {len(streams)} streams")
+    try:
+        while True:
+            time.sleep(args.interval)
+            for cid, s in service.stats().items():
+                print(f"  {cid}: {'up' if s['connected'] else 'down'} received={s['received']} "
+                      f"processed={s['processed']} dropped={s['dropped']}"
+                      + (f" gated={s['gated']}" if 'gated' in s else ''))
+            s = scheduler.stats()
+            print(f"  scheduler: {s['batches']} batches, mean size {s['mean_batch']}, "
+                  f"queue {s['queue_depth']}, latency {s['latency_ms']}")
+    except KeyboardInterrupt:
+        service.stop()
+
+
+if __name__ == '__main__':
+    main()
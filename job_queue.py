@@ -0,0 +1,350 @@
+"""
+Background Job Queue for Video Analysis
+Runs detection in a pool of worker processes so HTTP workers never block on inference
+"""
+
+import functools
+import json
+import multiprocessing
+import multiprocessing.forkserver
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+
+from chunked_upload import GrowingVideoCapture, upload_complete
+from metrics import registry as metrics
+from model_registry import PRELOAD_ENV
+from result_cache import ResultCache, digest_file, model_identity
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v', '.mpg', '.mpeg'}
+# A followed upload that sends nothing for this long gives its worker back (it is rerun once complete)
+FOLLOW_STALL_SECONDS = 120
+
+JOBS = metrics.counter('jobs_total', 'Finished analysis jobs by status (cached: answered from the result cache)', ['status'])
+JOB_SECONDS = metrics.histogram('job_seconds', 'Analysis time per job in the worker', ['kind'],
+                                buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800))
+PENDING = metrics.gauge('job_queue_pending', 'Jobs queued or running')
+
+# Per-process detector and result cache, created once by the pool initializer
+_detector = None
+_cache = None
+_warm_up = None  # what the initializer's warm-up reported
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another submission"""
+
+
+def _init_worker(model_path, cache_config=None, metrics_dir=None, backend=None):
+    """Load the YOLO model (and open the result cache) once per worker process and warm it up"""
+    global _detector, _cache, _warm_up
+    from vehicle_detector import YOLOVehicleDetector
+    if metrics_dir:
+        metrics.spool(metrics_dir)
+    if cache_config:
+        _cache = ResultCache(*cache_config)
+    _detector = YOLOVehicleDetector(model_path, cache=_cache, backend=backend)
+    _warm_up = _detector.warm_up()
+
+
+def _worker_status():
+    """Worker-side: the warm-up report of this process (run after the initializer, so the model is ready)"""
+    return dict(_warm_up, pid=os.getpid())
+
+
+def _write_state(path, state):
+    """Atomically replace a job state file"""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _run_job(state_path, file_path, options, digest=None, follow=None, lookup=False):
+    """Worker-side entry point: analyse one file (or, with lookup, find it in the cache) and record the outcome"""
+    start = time.perf_counter()
+    with open(state_path) as f:
+        state = json.load(f)
+    state.update(status='running', started=datetime.now().isoformat())
+    _write_state(state_path, state)
+
+    def progress(counts):
+        state['progress'] = counts
+        _write_state(state_path, state)
+
+    # Annotated output goes next to the job state file
+    video_options = {k: v for k, v in options.items() if k != 'render'}
+    if options.get('render'):
+        video_options['render_to'] = str(Path(state_path).with_suffix('.mp4'))
+
+    try:
+        cached = None
+        if lookup and _cache is not None and _detector.model_id != 'demo':
+            digest = digest_file(file_path)
+            cached = _cache.get(_cache.key(_detector.model_id, digest, **options))
+        if cached is not None:
+            state.update(status='done', cached=True, result=cached)
+        elif follow:
+            # The upload is still arriving: analyse what is there, wait for the rest
+            video = GrowingVideoCapture(file_path, functools.partial(upload_complete, follow),
+                                        stall_timeout=FOLLOW_STALL_SECONDS)
+            result = _detector.detect_from_video(video, on_progress=progress, **video_options)
+            digest = digest_file(file_path)
+        elif Path(file_path).suffix.lower() in VIDEO_EXTENSIONS:
+            result = _detector.detect_from_video(file_path, **video_options)
+        else:
+            detections = _detector.detect_from_image(file_path, options.get('confidence_threshold', 0.5))
+            counts = {}
+            for det in detections:
+                counts[det['type']] = counts.get(det['type'], 0) + 1
+            result = {'vehicle_counts': counts, 'total_vehicles': len(detections)}
+            if options.get('render'):
+                result['render'] = {'path': _detector.draw_detections(
+                    file_path, str(Path(state_path).with_suffix('.jpg')), detections)}
+        if cached is None:
+            state.pop('progress', None)
+            state.update(status='done', result=result)
+            # Demo mode's detections are random: never worth keeping
+            if _cache is not None and digest and _detector.model_id != 'demo':
+                _cache.put(_cache.key(_detector.model_id, digest, **options), result)
+    except Exception as e:
+        state.update(status='failed', error=str(e))
+    if _cache is not None:
+        _cache.flush_stats()
+    JOBS.inc(status='cached' if state.get('cached') else state['status'])
+    JOB_SECONDS.observe(time.perf_counter() - start, kind='video' if follow or 'total_frames' in (state.get('result') or {})
+                        else 'image')
+    metrics.flush()
+
+    state['finished'] = datetime.now().isoformat()
+    _write_state(state_path, state)
+    return state['status']
+
+
+class JobQueue:
+    """
+    Bounded queue of detection jobs backed by a process pool
+
+    Job state is kept as JSON files in state_dir, so any gunicorn worker can
+    answer a status request no matter which worker accepted the upload.
+    With a result cache, a file already analysed with the same options and
+    weights is answered at submit time without reaching the pool (or, when
+    the caller cannot wait to hash it, by a worker before any inference).
+    """
+
+    def __init__(self, state_dir, workers=None, max_pending=None, model_path=None, cache=None, backend=None,
+                 preload=False, max_following=None):
+        """
+        Args:
+            state_dir: Directory holding one <job_id>.json file per job
+            workers: Number of worker processes (default: CPU count); like the
+                limits below, a host total when shared (see share_host)
+            max_pending: Queued plus running jobs accepted before rejecting
+            model_path: Path to YOLO model weights, or an exported model (optional)
+            cache: Optional ResultCache shared with the worker processes
+            backend: Detector backend (see model_registry.resolve)
+            preload: Load the model once in a forkserver and fork the workers
+                from it, sharing the weights copy-on-write (where the platform
+                has forkserver; otherwise each worker is spawned and loads its own)
+            max_following: Uploads followed at once (default: half the workers);
+                a follow job holds its worker while the client uploads, so the
+                rest of the pool is kept for everything else
+        """
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self._sizes = (workers, max_pending, max_following)
+        self.share_host(1)
+        self.model_path = model_path
+        self.backend = backend
+        self.preload = preload
+        self.cache = cache
+        self._executor = None
+        self._warm = None  # futures of the warm-up round
+        self._pending = 0
+        self._following = 0
+        self._lock = threading.Lock()
+        PENDING.set_function(lambda: self._pending)
+
+    def share_host(self, processes):
+        """
+        Size the queue for one of `processes` web processes on this host
+
+        Each web process runs its own pool and counts its own pending jobs, so
+        the configured sizes are host totals split evenly between them: the
+        pools together use the CPU count (or workers), and the host accepts
+        about max_pending jobs however many processes take uploads. Call
+        before the pool starts (e.g. in a gunicorn worker hook).
+        """
+        workers, max_pending, max_following = self._sizes
+        self.workers = max(1, (workers or os.cpu_count() or 1) // processes)
+        self.max_pending = max(1, max_pending // processes) if max_pending else self.workers * 4
+        self.max_following = max(1, max_following // processes) if max_following else max(1, self.workers // 2)
+
+    def _pool(self):
+        # Created lazily so importing the app never forks
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=self._context(),
+                initializer=_init_worker,
+                initargs=(self.model_path, self.cache and (str(self.cache.root), self.cache.max_bytes,
+                                                           self.cache.memory_items),
+                          metrics.spool_dir and str(metrics.spool_dir), self.backend))
+        return self._executor
+
+    def _context(self):
+        # Workers never inherit the web server's threads and sockets: they are
+        # spawned, or forked from a forkserver, a clean process that has only
+        # imported the detector and loaded the weights (model_registry reads
+        # PRELOAD_ENV at import), which all its children then share
+        if not self.preload or 'forkserver' not in multiprocessing.get_all_start_methods():
+            return multiprocessing.get_context('spawn')
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(['job_queue', 'vehicle_detector'])
+        os.environ[PRELOAD_ENV] = json.dumps([self.model_path, self.backend])
+        try:
+            multiprocessing.forkserver.ensure_running()
+        finally:
+            os.environ.pop(PRELOAD_ENV, None)
+        return ctx
+
+    def warm_up(self):
+        """Start every worker now, loading and warming up its model, instead of on the first job"""
+        with self._lock:
+            if self._warm is None:
+                pool = self._pool()
+                self._warm = [pool.submit(_worker_status) for _ in range(self.workers)]
+
+    def ready(self):
+        """
+        Readiness of the worker pool, starting its warm-up if needed
+
+        Returns:
+            (True once every worker has loaded and warmed up its model,
+             list of per-worker warm-up reports)
+        """
+        self.warm_up()
+        with self._lock:
+            warm = self._warm
+            if any(f.done() and f.exception() is not None for f in warm):
+                # A worker died while starting; begin again with a fresh pool
+                self._discard_pool()
+                self._warm = None
+                return False, []
+            reports = {r['pid']: r for r in (f.result() for f in warm if f.done())}
+            if all(f.done() for f in warm) and len(reports) < self.workers:
+                # A worker that started first answered several rounds; ask the others again
+                self._warm = warm + [self._executor.submit(_worker_status)
+                                     for _ in range(self.workers - len(reports))]
+        return len(reports) >= self.workers, sorted(reports.values(), key=lambda r: r['pid'])
+
+    def _discard_pool(self):
+        """Drop a broken pool, shutting it down so its surviving workers exit rather than leak"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _state_path(self, job_id):
+        return self.state_dir / f'{job_id}.json'
+
+    def submit(self, file_path, follow=None, lookup_in_worker=False, **options):
+        """
+        Queue a file for analysis
+
+        Args:
+            file_path: Path to an uploaded image or video
+            follow: State file of a chunked upload still writing file_path (a
+                video); analysis starts now and keeps up with the upload,
+                publishing partial counts as 'progress' in the job state
+            lookup_in_worker: Hash the file and check the result cache in the
+                worker rather than here, for callers that must not spend a
+                read of the whole file (e.g. while holding an upload's lock)
+            **options: Keyword arguments for detect_from_video
+
+        Returns:
+            Job id
+
+        Raises:
+            QueueFullError: If max_pending jobs are already queued or running,
+                or (with follow) max_following uploads are already followed
+        """
+        digest = None
+        model_id = model_identity(self.model_path, self.backend) if self.cache is not None else None
+        # Demo mode's results are never stored, so there is nothing to look up
+        if model_id not in (None, 'demo') and follow is None and not lookup_in_worker:
+            digest = digest_file(file_path)
+            result = self.cache.get(self.cache.key(model_id, digest, **options))
+            self.cache.flush_stats()
+            if result is not None:
+                job_id = uuid.uuid4().hex
+                now = datetime.now().isoformat()
+                _write_state(str(self._state_path(job_id)), {
+                    'id': job_id, 'status': 'done', 'file': Path(file_path).name, 'submitted': now,
+                    'finished': now, 'cached': True, 'result': result})
+                JOBS.inc(status='cached')
+                return job_id
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f'{self._pending} jobs pending')
+            if follow is not None and self._following >= self.max_following:
+                raise QueueFullError(f'{self._following} uploads followed')
+            self._pending += 1
+            self._following += follow is not None
+
+        job_id = uuid.uuid4().hex
+        state_path = str(self._state_path(job_id))
+        _write_state(state_path, {'id': job_id, 'status': 'queued', 'file': Path(file_path).name,
+                                  'submitted': datetime.now().isoformat()})
+        try:
+            try:
+                future = self._pool().submit(_run_job, state_path, str(file_path), options, digest, follow,
+                                             lookup_in_worker)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM); start a fresh pool rather than failing forever
+                self._discard_pool()
+                self._warm = None
+                future = self._pool().submit(_run_job, state_path, str(file_path), options, digest, follow,
+                                             lookup_in_worker)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                self._following -= follow is not None
+            raise
+        future.add_done_callback(lambda f: self._finish(state_path, f, follow is not None))
+        return job_id
+
+    def _finish(self, state_path, future, followed=False):
+        with self._lock:
+            self._pending -= 1
+            self._following -= followed
+        # A crashed worker never gets to write its own failure
+        if future.exception() is not None:
+            with open(state_path) as f:
+                state = json.load(f)
+            state.update(status='failed', error=str(future.exception()), finished=datetime.now().isoformat())
+            _write_state(state_path, state)
+
+    def status(self, job_id):
+        """Return the job state dict, or None for an unknown id"""
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._state_path(job_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def stats(self):
+        return {'workers': self.workers, 'pending': self._pending, 'max_pending': self.max_pending,
+                'following': self._following, 'max_following': self.max_following}
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
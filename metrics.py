@@ -0,0 +1,342 @@
+"""
+Prometheus Metrics
+Counters, gauges and histograms recorded in every process (web, detector pool, ingest) and served merged in the text exposition format
+"""
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: compaction of dead processes' files is not serialized
+    fcntl = None
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Metric:
+    """One metric family; samples are keyed by their label values"""
+
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f'{self.name} takes labels {self.labels}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        with self._lock:
+            return {json.dumps(key): value for key, value in self._values.items()}
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn, **labels):
+        """Read the value from fn() whenever the metric is collected (e.g. a queue length)"""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = fn()
+            except Exception:
+                pass
+        return {json.dumps(key): value for key, value in values.items()}
+
+
+class Histogram(Metric):
+    """Fixed buckets; each sample is [bucket counts..., +Inf count, sum]"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._values.get(key)
+            if sample is None:
+                sample = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            sample[i] += 1
+            sample[-1] += value
+
+    def time(self, **labels):
+        """Context manager observing the elapsed seconds of its block"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            return {json.dumps(key): list(value) for key, value in self._values.items()}
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    """
+    The metric families of one process
+
+    Modules declare their metrics at import time; a process that wants them
+    exported calls spool() with the directory shared by all processes on
+    the host. Its samples are then written there every few seconds and
+    exposition() merges every process's file into one scrape.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._spool = None
+        self._interval = 5
+        self._flusher = None
+        self._pid = os.getpid()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labels != metric.labels:
+                    raise ValueError(f'Metric {metric.name} is already registered differently')
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def snapshot(self):
+        """JSON-able families with their current samples"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: {'type': m.kind, 'help': m.help, 'labels': list(m.labels),
+                         'buckets': list(getattr(m, 'buckets', ())), 'samples': m.samples()} for m in metrics}
+
+    @property
+    def spool_dir(self):
+        """Directory this process spools to, or None"""
+        return self._spool
+
+    def spool(self, directory, interval=5):
+        """Write this process's samples to directory/<pid>.json every interval seconds and at exit"""
+        self._spool = Path(directory)
+        self._spool.mkdir(parents=True, exist_ok=True)
+        self._interval = interval
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._run, name='metrics-flusher', daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        # An Event wait rather than time.sleep, so profiles count this thread as idle
+        idle = threading.Event()
+        while not idle.wait(self._interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"⚠ Could not write metrics: {e}")
+
+    def flush(self):
+        if self._spool is None or os.getpid() != self._pid:
+            return
+        path = self._spool / f'{self._pid}.json'
+        tmp = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        tmp.write_text(json.dumps(self.snapshot()))
+        os.replace(tmp, path)
+
+    def _after_fork(self):
+        # A forked worker (e.g. gunicorn --preload) starts from zero under its own pid
+        # Locks are replaced, not reset: another thread may have held one at the fork
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        for metric in self._metrics.values():
+            metric._lock = threading.Lock()
+            metric.reset()
+        if self._flusher is not None:
+            self._flusher = None
+            self.spool(self._spool, self._interval)
+
+    def exposition(self):
+        """Prometheus text format for every process spooling to the same directory as this one"""
+        families = [self.snapshot()]
+        if self._spool is not None:
+            self.flush()
+            families = _spooled(self._spool, self._pid) + families
+        return render(merge(families))
+
+
+registry = Registry()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry._after_fork)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _spooled(directory, own_pid):
+    """Snapshots from the other processes; files of exited ones are folded into _exited.json"""
+    snapshots, dead = [], []
+    for path in directory.glob('*.json'):
+        if path.stem == '_exited' or path.stem == str(own_pid):
+            continue
+        try:
+            pid = int(path.stem)
+            snap = json.loads(path.read_text())
+        except (ValueError, OSError):
+            continue
+        if _alive(pid):
+            snapshots.append(snap)
+        else:
+            dead.append(path)
+    if dead:
+        _fold_exited(directory, dead)
+    try:
+        snapshots.append(json.loads((directory / '_exited.json').read_text()))
+    except (FileNotFoundError, ValueError):
+        pass
+    return snapshots
+
+
+def _fold_exited(directory, paths):
+    # Counters and histograms of exited processes stay in the totals; their gauges go
+    lock_file = open(directory / '_exited.lock', 'a+b')
+    try:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        parts = []
+        for path in [directory / '_exited.json'] + paths:
+            try:
+                parts.append(json.loads(path.read_text()))
+            except (FileNotFoundError, ValueError):
+                pass
+        merged = {name: fam for name, fam in merge(parts).items() if fam['type'] != 'gauge'}
+        tmp = directory / f'_exited.{os.getpid()}.tmp'
+        tmp.write_text(json.dumps(merged))
+        os.replace(tmp, directory / '_exited.json')
+        for path in paths:
+            path.unlink(missing_ok=True)
+    finally:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+
+def merge(snapshots):
+    """Sum samples of the same family and labels across process snapshots"""
+    out = {}
+    for snap in snapshots:
+        for name, fam in snap.items():
+            target = out.setdefault(name, dict(fam, samples={}))
+            if target['type'] != fam['type'] or (fam['type'] == 'histogram' and target['buckets'] != fam['buckets']):
+                continue
+            for key, value in fam['samples'].items():
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = value
+                elif isinstance(value, list):
+                    target['samples'][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target['samples'][key] = current + value
+    return out
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, le=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(families):
+    """Text exposition format 0.0.4 for merged families"""
+    lines = []
+    for name in sorted(families):
+        fam = families[name]
+        lines.append(f"# HELP {name} {fam['help']}")
+        lines.append(f"# TYPE {name} {fam['type']}")
+        for key in sorted(fam['samples']):
+            values, sample = json.loads(key), fam['samples'][key]
+            if fam['type'] != 'histogram':
+                lines.append(f"{name}{_labels(fam['labels'], values)} {_number(sample)}")
+                continue
+            cumulative = 0
+            for bound, n in zip(fam['buckets'] + [float('inf')], sample[:-1]):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(fam['labels'], values, _number(bound))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(fam['labels'], values)} {_number(float(sample[-1]))}")
+            lines.append(f"{name}_count{_labels(fam['labels'], values)} {cumulative}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,264 @@
+"""
+Model Registry
+Loads detection models once per process on first use, from PyTorch weights or an exported ONNX / OpenVINO model
+"""
+
+import ast
+import importlib.util
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from metrics import registry as metrics
+
+# Backend -> the package that runs it
+RUNTIMES = {'ultralytics': 'ultralytics', 'onnx': 'onnxruntime', 'openvino': 'openvino'}
+# Weights used when none are configured: the stock model, or its export under ultralytics' default name
+DEFAULT_WEIGHTS = {'ultralytics': 'yolov8n.pt', 'onnx': 'yolov8n.onnx', 'openvino': 'yolov8n_openvino_model'}
+# Set for a process that should load a model as soon as this module is imported: JSON [model_path, backend]
+PRELOAD_ENV = 'DETECTOR_PRELOAD_MODEL'
+# ultralytics' predict defaults, matched by the exported backends
+IOU_THRESHOLD, MAX_DETECTIONS = 0.7, 300
+STAGES = (('preprocess', 'preprocess'), ('infer', 'inference'), ('postprocess', 'postprocess'))
+
+COCO_NAMES = (
+    'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat', 'traffic light',
+    'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat', 'dog', 'horse', 'sheep', 'cow',
+    'elephant', 'bear', 'zebra', 'giraffe', 'backpack', 'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee',
+    'skis', 'snowboard', 'sports ball', 'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard',
+    'tennis racket', 'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple',
+    'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake', 'chair', 'couch',
+    'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop', 'mouse', 'remote', 'keyboard', 'cell phone',
+    'microwave', 'oven', 'toaster', 'sink', 'refrigerator', 'book', 'clock', 'vase', 'scissors', 'teddy bear',
+    'hair drier', 'toothbrush')
+
+LOAD_SECONDS = metrics.histogram('detector_model_load_seconds', 'Model load and warm-up time by backend and step',
+                                 ['backend', 'step'], buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+
+
+def resolve(model_path=None, backend=None):
+    """
+    Backend and weights a detector configured with model_path would use
+
+    Args:
+        model_path: PyTorch weights (.pt), an exported .onnx file or an OpenVINO
+            model (.xml or ultralytics' export directory); missing .pt weights
+            mean the stock yolov8n.pt, as they always have
+        backend: 'ultralytics', 'onnx' or 'openvino' (default: $DETECTOR_BACKEND,
+            else inferred from model_path)
+
+    Returns:
+        (backend, weights path)
+    """
+    backend = backend or os.environ.get('DETECTOR_BACKEND') or None
+    path = Path(model_path) if model_path else None
+    if backend is None:
+        suffix = path.suffix.lower() if path else ''
+        backend = 'onnx' if suffix == '.onnx' else \
+            'openvino' if suffix == '.xml' or (path is not None and path.is_dir()) else 'ultralytics'
+    if backend not in RUNTIMES:
+        raise ValueError(f'Unknown detector backend {backend!r} (expected one of {", ".join(RUNTIMES)})')
+    if path is None or (backend == 'ultralytics' and not path.exists()):
+        return backend, DEFAULT_WEIGHTS[backend]
+    return backend, str(path)
+
+
+def available(backend, weights):
+    """Whether the backend's runtime is installed and its weights are present (ultralytics downloads its own)"""
+    if importlib.util.find_spec(RUNTIMES[backend]) is None:
+        return False
+    return backend == 'ultralytics' or Path(weights).exists()
+
+
+class UltralyticsModel:
+    """PyTorch weights run by ultralytics (the stock weights are downloaded on first load)"""
+
+    def __init__(self, weights):
+        from ultralytics import YOLO
+        self.model = YOLO(weights)
+
+    def predict(self, images, confidence_threshold):
+        """
+        Detect objects in a batch of images
+
+        Args:
+            images: List of BGR frame arrays or image paths
+            confidence_threshold: Minimum confidence for detection
+
+        Returns:
+            (per image a list of (class name, confidence, [x1, y1, x2, y2]),
+             {stage: seconds} for preprocess, infer and postprocess)
+        """
+        results = self.model(list(images), conf=confidence_threshold, verbose=False)
+        speed = {stage: sum(getattr(r, 'speed', {}).get(key) or 0 for r in results) / 1000 for stage, key in STAGES}
+        boxes = [[(r.names[int(c)], float(s), xyxy) for c, s, xyxy in
+                  zip(r.boxes.cls.tolist(), r.boxes.conf.tolist(), r.boxes.xyxy.tolist())] for r in results]
+        return boxes, speed
+
+
+class ExportedModel:
+    """
+    A YOLOv8 export run on the CPU by onnxruntime or OpenVINO
+
+    Neither imports torch, so a process starts in a fraction of the time and
+    memory of the ultralytics backend. Pre- and postprocessing follow
+    ultralytics: letterboxing to the export's input size, then per-class NMS.
+    """
+
+    def __init__(self, weights, backend):
+        path = Path(weights)
+        if backend == 'onnx':
+            import onnxruntime
+            session = onnxruntime.InferenceSession(str(path), providers=['CPUExecutionProvider'])
+            tensor = session.get_inputs()[0]
+            shape = [d if isinstance(d, int) else None for d in tensor.shape]
+            self._run = lambda blob: session.run(None, {tensor.name: blob})[0]
+            names = session.get_modelmeta().custom_metadata_map.get('names')
+        else:
+            import openvino
+            xml = next(path.glob('*.xml')) if path.is_dir() else path
+            core = openvino.Core()
+            model = core.read_model(str(xml))
+            shape = [d.get_length() if d.is_static else None for d in model.inputs[0].get_partial_shape()]
+            compiled = core.compile_model(model, 'CPU')
+            self._run = lambda blob: compiled(blob)[0]
+            names = _metadata_names(xml.with_name('metadata.yaml'))
+        self.size = shape[2] or 640
+        self.batch = shape[0]  # None: dynamic batch
+        self.names = ast.literal_eval(names) if isinstance(names, str) else names or dict(enumerate(COCO_NAMES))
+
+    def predict(self, images, confidence_threshold):
+        """Same contract as UltralyticsModel.predict"""
+        start = time.perf_counter()
+        images = [cv2.imread(str(i)) if not isinstance(i, np.ndarray) else i for i in images]
+        if any(i is None for i in images):
+            raise ValueError('Could not read image')
+        boxes = [_letterbox(i, self.size) for i in images]
+        blob = cv2.dnn.blobFromImages([b[0] for b in boxes], 1 / 255, swapRB=True)
+        speed = {'preprocess': time.perf_counter() - start}
+
+        start = time.perf_counter()
+        if self.batch is None:
+            output = self._run(blob)
+        else:
+            output = np.concatenate([self._run(blob[i:i + 1]) for i in range(len(blob))])
+        speed['infer'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        out = [self._postprocess(pred, image.shape, scale, pad, confidence_threshold)
+               for pred, image, (_, scale, pad) in zip(output, images, boxes)]
+        speed['postprocess'] = time.perf_counter() - start
+        return out, speed
+
+    def _postprocess(self, pred, shape, scale, pad, confidence_threshold):
+        # One (4 + classes, candidates) prediction: box centres and sizes, then class scores
+        pred = pred.T
+        classes = pred[:, 4:].argmax(1)
+        scores = pred[np.arange(len(pred)), 4 + classes]
+        keep = scores >= confidence_threshold
+        pred, classes, scores = pred[keep], classes[keep], scores[keep]
+        if not len(pred):
+            return []
+        xy = (pred[:, :2] - pred[:, 2:4] / 2 - pad) / scale
+        wh = pred[:, 2:4] / scale
+        x1y1 = np.clip(xy, 0, [shape[1], shape[0]])
+        x2y2 = np.clip(xy + wh, 0, [shape[1], shape[0]])
+        rects = np.hstack([x1y1, x2y2 - x1y1]).tolist()
+        keep = cv2.dnn.NMSBoxesBatched(rects, scores.tolist(), classes.tolist(), confidence_threshold, IOU_THRESHOLD)
+        keep = sorted(np.array(keep, dtype=int).reshape(-1), key=lambda i: -scores[i])[:MAX_DETECTIONS]
+        return [(self.names[int(classes[i])], float(scores[i]), x1y1[i].tolist() + x2y2[i].tolist()) for i in keep]
+
+
+def _letterbox(image, size):
+    """Resize keeping the aspect ratio and pad to size x size with grey, as ultralytics does"""
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = round(h * scale), round(w * scale)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    canvas = np.full((size, size, 3), 114, np.uint8)
+    canvas[top:top + nh, left:left + nw] = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return canvas, scale, np.array([left, top])
+
+
+def _metadata_names(path):
+    # The 'names:' block of an ultralytics export's metadata.yaml ('  0: person' lines), without a YAML parser
+    try:
+        lines = path.read_text().splitlines()
+    except OSError:
+        return None
+    names, inside = {}, False
+    for line in lines:
+        if line.startswith('names:'):
+            inside = True
+        elif inside and line.startswith(' ') and ':' in line:
+            key, _, value = line.strip().partition(':')
+            names[int(key)] = value.strip().strip('\'"')
+        elif inside:
+            break
+    return names or None
+
+
+class ModelRegistry:
+    """
+    The models of one process, loaded on first use and shared by every detector
+
+    Loading is serialized, so detectors created at the same time never load
+    the same weights twice. A parent process can preload() before forking;
+    its children then share the loaded weights copy-on-write. warm_up() is
+    left to the children: a first inference starts the runtime's thread
+    pools, and those must not exist at a fork.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._warm = set()
+        self._lock = threading.Lock()
+
+    def get(self, weights, backend):
+        """The loaded model for (weights, backend), loading it now if needed"""
+        key = (backend, str(weights))
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                start = time.perf_counter()
+                model = UltralyticsModel(weights) if backend == 'ultralytics' else ExportedModel(weights, backend)
+                LOAD_SECONDS.observe(time.perf_counter() - start, backend=backend, step='load')
+                self._models[key] = model
+                print(f"✓ {backend} model loaded from {weights}")
+        return model
+
+    def loaded(self, weights, backend):
+        return (backend, str(weights)) in self._models
+
+    def warm_up(self, weights, backend):
+        """Load the model and run one inference on a blank frame, once per process"""
+        model = self.get(weights, backend)
+        key = (backend, str(weights))
+        if key not in self._warm:
+            start = time.perf_counter()
+            model.predict([np.zeros((640, 640, 3), np.uint8)], 0.25)
+            LOAD_SECONDS.observe(time.perf_counter() - start, backend=backend, step='warmup')
+            self._warm.add(key)
+        return model
+
+    def preload(self, model_path=None, backend=None):
+        """Load the model a detector would use ahead of its first inference; failures are left to that inference"""
+        try:
+            backend, weights = resolve(model_path, backend)
+            if available(backend, weights):
+                self.get(weights, backend)
+        except Exception as e:
+            print(f"⚠ Could not preload model: {e}")
+
+
+models = ModelRegistry()
+
+# A forkserver started by JobQueue imports this module with PRELOAD_ENV set, so every
+# worker it forks starts with the weights already in (shared) memory
+if os.environ.get(PRELOAD_ENV):
+    models.preload(*json.loads(os.environ[PRELOAD_ENV]))
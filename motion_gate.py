@@ -0,0 +1,152 @@
+"""
+Motion Gating for Detection
+Cheap background subtraction inside a camera's region of interest, so the model only sees frames (and parts of frames) that changed
+"""
+
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+def load_rois(path):
+    """
+    Per-camera ROI polygons from a JSON file
+
+    The file maps camera ids to polygons, e.g. {"cam_001": [[0.1, 0.4], [0.9, 0.4], [1, 1], [0, 1]]}.
+    Coordinates are fractions of the frame size, or pixels if any exceeds 1.
+
+    Returns:
+        {camera_id: [[x, y], ...]}, empty when path is unset or missing
+    """
+    if not path or not Path(path).exists():
+        return {}
+    return {str(cid): [list(map(float, pt)) for pt in polygon]
+            for cid, polygon in json.loads(Path(path).read_text()).items()}
+
+
+def shift_detections(detections, dx, dy):
+    """Move detection boxes from crop coordinates back into the full frame (in place)"""
+    if dx or dy:
+        for det in detections:
+            x1, y1, x2, y2 = det['bbox']
+            det['bbox'] = [x1 + dx, y1 + dy, x2 + dx, y2 + dy]
+    return detections
+
+
+class MotionGate:
+    """
+    Decide per frame whether detection is worth running, and where
+
+    Frames are shrunk to work_width, converted to grey and fed to a MOG2
+    background model. Foreground pixels outside the ROI polygon are ignored;
+    the rest are cleaned with a morphological open and merged with a dilation
+    into blobs. check() returns None when no blob is large enough (the frame
+    can skip the model) and otherwise the padded bounding box around all
+    moving blobs, in full-frame pixels, for the caller to crop to. Shadows
+    (which MOG2 marks separately) never count as motion.
+
+    A gate keeps background state, so use one per camera or video and feed it
+    frames in order; it is not thread-safe.
+    """
+
+    def __init__(self, roi=None, work_width=320, min_area=0.002, var_threshold=32, history=200,
+                 pad=0.05, max_crop=0.6):
+        """
+        Args:
+            roi: Polygon [[x, y], ...] in frame fractions or pixels (default, or empty: whole frame)
+            work_width: Width of the downscaled frame the background model runs on
+            min_area: Smallest moving blob, as a fraction of the frame area
+            var_threshold: MOG2 variance threshold; higher ignores more sensor noise
+            history: Frames the background model remembers
+            pad: Margin added around the motion box, as a fraction of the frame size
+            max_crop: When the motion box covers more than this fraction of the
+                ROI's bounding box, the whole ROI box is returned instead
+        """
+        self.roi = roi or None
+        self.work_width = work_width
+        self.min_area = min_area
+        self.pad = pad
+        self.max_crop = max_crop
+        self._subtractor = cv2.createBackgroundSubtractorMOG2(history=history, varThreshold=var_threshold,
+                                                              detectShadows=True)
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self._shape = None
+        self.checked = 0
+        self.gated = 0
+        self.frame_pixels = 0
+        self.crop_pixels = 0
+
+    def _setup(self, height, width):
+        """Build the ROI mask and box for a frame size (on the first frame, or if it changes)"""
+        self._shape = (height, width)
+        self._scale = min(1.0, self.work_width / width)
+        self._work = (max(1, int(width * self._scale)), max(1, int(height * self._scale)))
+        self._mask = None
+        self._roi_box = (0, 0, width, height)
+        if self.roi:
+            pts = np.array(self.roi, dtype=np.float64)
+            if pts.max() <= 1:
+                pts = pts * [width, height]
+            self._mask = np.zeros(self._work[::-1], dtype=np.uint8)
+            cv2.fillPoly(self._mask, [np.round(pts * self._scale).astype(np.int32)], 255)
+            self._full_mask = np.zeros((height, width), dtype=np.uint8)
+            cv2.fillPoly(self._full_mask, [np.round(pts).astype(np.int32)], 255)
+            x, y, w, h = cv2.boundingRect(np.round(pts).astype(np.int32))
+            self._roi_box = (max(0, x), max(0, y), min(width, x + w), min(height, y + h))
+        self._min_pixels = self.min_area * self._work[0] * self._work[1]
+
+    def check(self, frame):
+        """
+        Args:
+            frame: BGR frame
+
+        Returns:
+            (x1, y1, x2, y2) region worth running detection on, or None to skip the frame
+        """
+        height, width = frame.shape[:2]
+        if self._shape != (height, width):
+            self._setup(height, width)
+        self.checked += 1
+        small = cv2.cvtColor(cv2.resize(frame, self._work, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        foreground = self._subtractor.apply(small)
+        # 255 is foreground, 127 is shadow
+        moving = np.where(foreground == 255, np.uint8(255), np.uint8(0))
+        if self._mask is not None:
+            moving &= self._mask
+        moving = cv2.dilate(cv2.morphologyEx(moving, cv2.MORPH_OPEN, self._kernel), self._kernel, iterations=2)
+        n, _, blobs, _ = cv2.connectedComponentsWithStats(moving)
+        blobs = blobs[1:n]
+        blobs = blobs[blobs[:, cv2.CC_STAT_AREA] >= self._min_pixels]
+        if not len(blobs):
+            self.gated += 1
+            return None
+
+        x1 = blobs[:, cv2.CC_STAT_LEFT].min()
+        y1 = blobs[:, cv2.CC_STAT_TOP].min()
+        x2 = (blobs[:, cv2.CC_STAT_LEFT] + blobs[:, cv2.CC_STAT_WIDTH]).max()
+        y2 = (blobs[:, cv2.CC_STAT_TOP] + blobs[:, cv2.CC_STAT_HEIGHT]).max()
+        px, py = self.pad * width, self.pad * height
+        rx1, ry1, rx2, ry2 = self._roi_box
+        box = (max(rx1, int(x1 / self._scale - px)), max(ry1, int(y1 / self._scale - py)),
+               min(rx2, int(np.ceil(x2 / self._scale + px))), min(ry2, int(np.ceil(y2 / self._scale + py))))
+        if (box[2] - box[0]) * (box[3] - box[1]) > self.max_crop * (rx2 - rx1) * (ry2 - ry1):
+            box = self._roi_box
+        self.frame_pixels += width * height
+        self.crop_pixels += (box[2] - box[0]) * (box[3] - box[1])
+        return box
+
+    def inside(self, detection):
+        """True if the detection's box centre lies in the ROI"""
+        if self.roi is None or self._shape is None:
+            return True
+        x1, y1, x2, y2 = detection['bbox']
+        x = min(max(int((x1 + x2) / 2), 0), self._shape[1] - 1)
+        y = min(max(int((y1 + y2) / 2), 0), self._shape[0] - 1)
+        return bool(self._full_mask[y, x])
+
+    def stats(self):
+        """Frames checked and gated, and the share of frame area sent to the model when it ran"""
+        return {'checked_frames': self.checked, 'gated_frames': self.gated,
+                'crop_area_pct': round(100 * self.crop_pixels / self.frame_pixels, 1) if self.frame_pixels else 0.0}
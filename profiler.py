@@ -0,0 +1,94 @@
+"""
+Sampling Profiler
+Periodically samples every thread's Python stack and reports folded stacks for flame graphs
+"""
+
+import collections
+import os
+import sys
+import sysconfig
+import threading
+import time
+
+_STDLIB = os.path.normcase(sysconfig.get_paths()['stdlib'])
+# Leaf frames of a thread that is only waiting (locks, queues, sockets, sleeps)
+_IDLE = {'wait', 'select', 'poll', 'accept', 'get', 'sleep', 'recv', 'recv_into', 'readinto', 'readline',
+         '_wait_for_tstate_lock', 'wait_for', 'read', 'join', 'serve_forever', 'result'}
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+def _is_idle(frame):
+    code = frame.f_code
+    return code.co_name in _IDLE and os.path.normcase(code.co_filename).startswith(_STDLIB)
+
+
+def _label(code):
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+class SamplingProfiler:
+    """
+    Wall-clock stack sampler for the current process
+
+    A thread wakes every interval seconds, reads all other threads' frames
+    with sys._current_frames() and counts each stack as a folded string
+    ('thread;file:function;...'). Nothing is installed in the sampled
+    threads, so the cost is one stack walk per thread per sample and
+    nothing at all when no profile is running.
+    """
+
+    def __init__(self, interval=0.005, max_seconds=120):
+        """
+        Args:
+            interval: Seconds between samples
+            max_seconds: Longest profile accepted
+        """
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._busy = threading.Lock()
+
+    def profile(self, seconds, include_idle=False):
+        """
+        Sample for `seconds` and return the folded stacks
+
+        Args:
+            seconds: Profile duration (capped at max_seconds)
+            include_idle: Keep samples of threads blocked in waits and I/O
+
+        Returns:
+            (Counter of folded stack -> samples, number of sampling rounds)
+
+        Raises:
+            ProfilerBusyError: A profile is already running in this process
+        """
+        if not self._busy.acquire(blocking=False):
+            raise ProfilerBusyError('a profile is already running')
+        try:
+            stacks = collections.Counter()
+            me = threading.get_ident()
+            deadline = time.monotonic() + min(seconds, self.max_seconds)
+            rounds = 0
+            while time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me or (not include_idle and _is_idle(frame)):
+                        continue
+                    parts = []
+                    while frame is not None:
+                        parts.append(_label(frame.f_code))
+                        frame = frame.f_back
+                    parts.append(names.get(ident, f'thread-{ident}').replace(';', ':'))
+                    stacks[';'.join(reversed(parts))] += 1
+                rounds += 1
+                time.sleep(self.interval)
+            return stacks, rounds
+        finally:
+            self._busy.release()
+
+
+def folded(stacks):
+    """Collapsed-stack text ('stack count' per line), the input of flamegraph.pl and speedscope"""
+    return ''.join(f'{stack} {n}\n' for stack, n in stacks.most_common())
@@ -45,5 +45,11 @@ print("• Upload images/videos to see detection in action")
 print("• Data refreshes automatically every 30 seconds")
 print()
 
+print("📋 OPTIONAL: Benchmarks")
+print("-" * 60)
+print("   python benchmarks/suite.py")
+print("   python benchmarks/load_test.py --spawn --clients 50")
+print()
+
 print("🚀 Ready to start? Run: python app.py")
 print("=" * 60)
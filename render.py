@@ -0,0 +1,239 @@
+"""
+Annotated Video Rendering
+Draws detections, track ids and line-counter overlays onto already-decoded frames and encodes them on a background thread
+"""
+
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# BGR, matching draw_detections
+COLORS = {'bike': (255, 0, 255), 'car': (255, 0, 0), 'bus': (0, 0, 255), 'truck': (0, 165, 255)}
+DEFAULT_COLOR = (0, 255, 0)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+# Codecs tried in order per container; H.264 needs an OpenCV build with an H.264 encoder
+CODECS = {'.mp4': ('avc1', 'mp4v'), '.m4v': ('avc1', 'mp4v'), '.avi': ('MJPG', 'XVID'), '.mkv': ('MJPG',)}
+
+
+def draw_overlay(frame, detections, line=None, counts=None):
+    """
+    Annotate a frame in place
+
+    Boxes are drawn with one polylines call per vehicle class; labels carry
+    the track id when the detection has one.
+
+    Args:
+        frame: BGR frame, modified in place
+        detections: Detections with 'bbox', 'type', 'confidence' and optionally 'track_id'
+        line: Optional counting line, (position, 'horizontal' | 'vertical')
+        counts: Optional {label: value} drawn as a legend in the top-left corner
+
+    Returns:
+        The frame
+    """
+    by_type = {}
+    for det in detections:
+        x1, y1, x2, y2 = det['bbox']
+        by_type.setdefault(det['type'], []).append(((x1, y1), (x2, y1), (x2, y2), (x1, y2)))
+    for v_type, boxes in by_type.items():
+        cv2.polylines(frame, np.array(boxes, dtype=np.int32), True, COLORS.get(v_type, DEFAULT_COLOR), 2)
+    for det in detections:
+        x1, y1 = det['bbox'][:2]
+        label = f"#{det['track_id']} {det['type']}" if 'track_id' in det else f"{det['type']} {det['confidence']:.2f}"
+        cv2.putText(frame, label, (int(x1), max(12, int(y1) - 6)), FONT, 0.45,
+                    COLORS.get(det['type'], DEFAULT_COLOR), 1, cv2.LINE_AA)
+    if line is not None:
+        position, direction = line
+        h, w = frame.shape[:2]
+        end = ((w, int(position)) if direction == 'horizontal' else (int(position), h))
+        start = ((0, int(position)) if direction == 'horizontal' else (int(position), 0))
+        cv2.line(frame, start, end, (0, 255, 255), 2)
+    if counts:
+        cv2.rectangle(frame, (0, 0), (190, 14 + 18 * len(counts)), (0, 0, 0), -1)
+        for i, (name, value) in enumerate(counts.items()):
+            cv2.putText(frame, f'{name}: {value}', (6, 18 + 18 * i), FONT, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+    return frame
+
+
+def open_writer(path, fps, size):
+    """cv2.VideoWriter with the first codec that works for the file's container"""
+    for codec in CODECS.get(Path(path).suffix.lower(), ('mp4v',)):
+        writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*codec), fps, size)
+        if writer.isOpened():
+            return writer, codec
+        writer.release()
+    raise ValueError(f'No video encoder available for {path}')
+
+
+class VideoRenderer:
+    """
+    Background annotate-and-encode stage for one output video
+
+    write() only queues the frame with its detections and overlay values; a
+    writer thread draws and encodes, so a detection loop is blocked only
+    when the queue is full (encoding is slower than inference), never per
+    frame. The writer opens the file on the first frame, using its size.
+    """
+
+    def __init__(self, output_path, fps, line=None, queue_size=32):
+        """
+        Args:
+            output_path: .mp4 (H.264, else MPEG-4 Part 2) or .avi (MJPEG)
+            fps: Output frame rate
+            line: Optional counting line drawn on every frame, (position, direction)
+            queue_size: Frames buffered between the caller and the writer thread
+        """
+        self.output_path = str(output_path)
+        self.fps = fps
+        self.line = line
+        self.codec = None
+        self.frames = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='video-renderer', daemon=True)
+        self._thread.start()
+
+    def write(self, frame, detections, counts=None):
+        """Queue a frame; detections and counts must not be modified afterwards"""
+        if self._error:
+            raise self._error
+        self._queue.put((frame, detections, counts))
+
+    def _run(self):
+        writer = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                frame, detections, counts = item
+                if writer is None:
+                    writer, self.codec = open_writer(self.output_path, self.fps, (frame.shape[1], frame.shape[0]))
+                writer.write(draw_overlay(frame, detections, self.line, counts))
+                self.frames += 1
+        except Exception as e:
+            self._error = e
+            # Keep draining so the producer never blocks on a dead writer
+            while self._queue.get() is not None:
+                pass
+        finally:
+            if writer is not None:
+                writer.release()
+
+    def close(self):
+        """Flush the queue and finish the file"""
+        self._queue.put(None)
+        self._thread.join()
+        if self._error:
+            raise self._error
+        return self.output_path
+
+
+class PreviewPublisher:
+    """
+    Latest annotated frame per camera as a JPEG file, for MJPEG previews
+
+    publish() just swaps in the camera's newest frame; a background thread
+    draws and JPEG-encodes at most fps frames per second per camera and
+    atomically replaces <out_dir>/<camera_id>.jpg, which the web app streams.
+    """
+
+    def __init__(self, out_dir, fps=5, quality=70, max_width=960):
+        """
+        Args:
+            out_dir: Directory for the preview JPEGs (e.g. data/live)
+            fps: Most previews written per camera per second
+            quality: JPEG quality
+            max_width: Previews wider than this are downscaled
+        """
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.period = 1.0 / fps
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.max_width = max_width
+        self._latest = {}
+        self._written = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='preview-publisher', daemon=True)
+        self._thread.start()
+
+    def publish(self, camera_id, frame, detections, counts=None):
+        with self._cond:
+            self._latest[camera_id] = (frame, detections, counts)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and not self._due():
+                    self._cond.wait(self.period if self._latest else None)
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                due = [cid for cid in self._latest if now - self._written.get(cid, 0) >= self.period]
+                items = [(cid, self._latest.pop(cid)) for cid in due]
+                for cid in due:
+                    self._written[cid] = now
+            for cid, (frame, detections, counts) in items:
+                try:
+                    self._write(cid, frame, detections, counts)
+                except Exception as e:
+                    print(f"⚠ Preview for {cid} failed: {e}")
+
+    def _due(self):
+        now = time.monotonic()
+        return any(now - self._written.get(cid, 0) >= self.period for cid in self._latest)
+
+    def _write(self, camera_id, frame, detections, counts):
+        frame = draw_overlay(frame.copy(), detections, counts=counts)
+        if frame.shape[1] > self.max_width:
+            scale = self.max_width / frame.shape[1]
+            frame = cv2.resize(frame, (self.max_width, int(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode('.jpg', frame, self.params)
+        if not ok:
+            return
+        path = self.out_dir / f'{camera_id}.jpg'
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_bytes(jpeg.tobytes())
+        os.replace(tmp, path)
+
+
+def mjpeg_stream(path, fps=5, idle_timeout=30, boundary='frame'):
+    """
+    Generator of multipart/x-mixed-replace parts from a JPEG file that is being replaced
+
+    Sends a part whenever the file changes, and ends after idle_timeout
+    seconds without a new frame (e.g. the camera went offline).
+    """
+    path = Path(path)
+    last, idle_since = None, time.monotonic()
+    while True:
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is not None and mtime != last:
+            try:
+                jpeg = path.read_bytes()
+            except FileNotFoundError:
+                jpeg = None
+            if jpeg:
+                last, idle_since = mtime, time.monotonic()
+                yield (f'--{boundary}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n'.encode()
+                       + jpeg + b'\r\n')
+        elif time.monotonic() - idle_since > idle_timeout:
+            return
+        time.sleep(1.0 / fps)
@@ -0,0 +1,188 @@
+"""
+Community Report Storage
+Durable, indexed SQLite store shared by every worker process
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS reports (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    lat REAL,
+    lon REAL,
+    cell INTEGER,
+    region INTEGER,
+    ts REAL NOT NULL,
+    verified INTEGER NOT NULL DEFAULT 0,
+    upvotes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_reports_ts ON reports (ts);
+CREATE INDEX IF NOT EXISTS idx_reports_cell ON reports (cell, seq);
+CREATE INDEX IF NOT EXISTS idx_reports_region ON reports (region, seq);
+'''
+
+COLUMNS = 'seq, type, description, lat, lon, ts, verified, upvotes'
+
+
+class ReportStore:
+    """
+    Community reports in SQLite (WAL mode)
+
+    Report ids are 'rep_<rowid>', so lookups and upvotes go straight to the
+    primary key and ids never collide between workers. Located reports carry
+    grid cell numbers at two resolutions (row-major over fixed-degree cells),
+    so a bounding-box query becomes a few index range scans on whichever grid
+    covers the box in at most max_bbox_rows rows.
+    """
+
+    GRIDS = (('cell', 0.01), ('region', 1.0))  # ~1 km and ~100 km cells
+
+    def __init__(self, db_path, max_bbox_rows=64, scan_budget=20):
+        """
+        Args:
+            db_path: SQLite database file
+            max_bbox_rows: Most grid rows a bbox query will scan per grid
+            scan_budget: Candidates per requested row above which a bbox query
+                walks newest-first instead of scanning the grid index
+        """
+        self.db_path = str(db_path)
+        self.max_bbox_rows = max_bbox_rows
+        self.scan_budget = scan_budget
+        self._local = threading.local()
+        # Not kept: the store may be created in a gunicorn master, and a
+        # connection must never be inherited across a fork
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _conn(self):
+        # sqlite3 connections must not cross threads; one per thread is cheap
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _grid_pos(lat, lon, size):
+        """(row, col, cols) of the grid cell containing a point"""
+        return int((lat + 90) // size), int((lon + 180) // size), int(math.ceil(360 / size))
+
+    def _cells(self, lat, lon):
+        if lat is None or lon is None:
+            return [None] * len(self.GRIDS)
+        cells = []
+        for _, size in self.GRIDS:
+            row, col, cols = self._grid_pos(lat, lon, size)
+            cells.append(row * cols + col)
+        return cells
+
+    @staticmethod
+    def _to_dict(row):
+        seq, v_type, description, lat, lon, ts, verified, upvotes = row
+        return {'id': f'rep_{seq}', 'type': v_type, 'description': description, 'lat': lat, 'lon': lon,
+                'timestamp': datetime.fromtimestamp(ts).isoformat(), 'verified': bool(verified), 'upvotes': upvotes}
+
+    @staticmethod
+    def _seq(report_id):
+        prefix, _, num = str(report_id).partition('_')
+        return int(num) if prefix == 'rep' and num.isdigit() else None
+
+    def add(self, report_type, description='', lat=None, lon=None):
+        """Insert a report and return it as a dict; ValueError for coordinates off the globe"""
+        lat = float(lat) if lat is not None else None
+        lon = float(lon) if lon is not None else None
+        if lat is not None and not -90 <= lat <= 90:
+            raise ValueError(f'lat {lat} is outside -90..90')
+        if lon is not None and not -180 <= lon <= 180:
+            raise ValueError(f'lon {lon} is outside -180..180')
+        ts = time.time()
+        cur = self._conn().execute(
+            'INSERT INTO reports (type, description, lat, lon, cell, region, ts) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (report_type, description or '', lat, lon, *self._cells(lat, lon), ts))
+        return self._to_dict((cur.lastrowid, report_type, description or '', lat, lon, ts, 0, 0))
+
+    def get(self, report_id):
+        seq = self._seq(report_id)
+        if seq is None:
+            return None
+        row = self._conn().execute(f'SELECT {COLUMNS} FROM reports WHERE seq = ?', (seq,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def upvote(self, report_id):
+        """Atomically add one upvote; returns False for an unknown id"""
+        seq = self._seq(report_id)
+        if seq is None:
+            return False
+        cur = self._conn().execute('UPDATE reports SET upvotes = upvotes + 1 WHERE seq = ?', (seq,))
+        return cur.rowcount > 0
+
+    def recent(self, limit=30, cursor=None):
+        """
+        Newest reports first, keyset-paginated
+
+        Args:
+            limit: Page size
+            cursor: next_cursor from the previous page
+
+        Returns:
+            (reports, next_cursor) where next_cursor is None on the last page
+        """
+        if cursor is None:
+            rows = self._conn().execute(
+                f'SELECT {COLUMNS} FROM reports ORDER BY seq DESC LIMIT ?', (limit,)).fetchall()
+        else:
+            rows = self._conn().execute(
+                f'SELECT {COLUMNS} FROM reports WHERE seq < ? ORDER BY seq DESC LIMIT ?', (int(cursor), limit)).fetchall()
+        next_cursor = rows[-1][0] if len(rows) == limit else None
+        return [self._to_dict(r) for r in rows], next_cursor
+
+    def in_bbox(self, south, west, north, east, limit=500, cursor=None):
+        """
+        Newest reports inside a lat/lon bounding box, keyset-paginated like recent()
+
+        Returns:
+            (reports, next_cursor) where next_cursor is None on the last page
+        """
+        source, where, params = 'reports', '1', []
+        for column, size in self.GRIDS:
+            r0, c0, cols = self._grid_pos(south, west, size)
+            r1, c1, _ = self._grid_pos(north, east, size)
+            if r1 - r0 >= self.max_bbox_rows or c0 > c1:
+                continue
+            # One contiguous cell range per grid row, each an index range scan
+            grid_where = '(' + ' OR '.join([f'{column} BETWEEN ? AND ?'] * (r1 - r0 + 1)) + ')'
+            grid_params = [v for row in range(r0, r1 + 1) for v in (row * cols + c0, row * cols + c1)]
+            grid_source = f'reports INDEXED BY idx_reports_{column}'
+            # A box holding many candidates is better served by walking newest-first,
+            # which fills the page after a short scan; counting stops at the budget
+            budget = self.scan_budget * limit
+            candidates = self._conn().execute(
+                f'SELECT COUNT(*) FROM (SELECT 1 FROM {grid_source} WHERE {grid_where} LIMIT ?)',
+                grid_params + [budget]).fetchone()[0]
+            if candidates < budget:
+                source, where, params = grid_source, grid_where, grid_params
+            break
+        # Unary + keeps the planner on the grid index / rowid order chosen above
+        if cursor is not None:
+            where, params = f'{where} AND seq < ?', params + [int(cursor)]
+        sql = (f'SELECT {COLUMNS} FROM {source} WHERE {where} AND +lat BETWEEN ? AND ? '
+               f'AND (lon BETWEEN ? AND ? OR (? > ? AND (lon >= ? OR lon <= ?))) ORDER BY seq DESC LIMIT ?')
+        params += [south, north, west, east, west, east, west, east, limit]
+        rows = self._conn().execute(sql, params).fetchall()
+        next_cursor = rows[-1][0] if len(rows) == limit else None
+        return [self._to_dict(r) for r in rows], next_cursor
+
+    def count(self):
+        return self._conn().execute('SELECT COUNT(*) FROM reports').fetchone()[0]
@@ -0,0 +1,247 @@
+"""
+Detection Result Cache
+Content-addressed results for uploads and frames: an in-memory LRU in front of a size-bounded disk store shared by all processes
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from metrics import registry as metrics
+from model_registry import available, resolve
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: stats are only merged within a process
+    fcntl = None
+
+LOOKUPS = metrics.counter('cache_lookups_total', 'Cache lookups by cache and result', ['cache', 'result'])
+
+_CHUNK = 1 << 20
+_weights_digests = {}  # (path, size, mtime_ns) -> digest
+
+
+def digest_file(path):
+    """Hex digest of a file's bytes"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def digest_frame(frame):
+    """Hex digest of a decoded frame, including its shape and dtype"""
+    h = hashlib.blake2b(f'{frame.shape}{frame.dtype}'.encode(), digest_size=16)
+    h.update(memoryview(frame if frame.flags.c_contiguous else frame.copy()).cast('B'))
+    return h.hexdigest()
+
+
+def model_identity(model_path=None, backend=None):
+    """
+    Identity of the weights YOLOVehicleDetector(model_path, backend=backend) would load
+
+    It includes a digest of the weights file (every file, for an export
+    directory), so replacing the weights changes every cache key and stale
+    results are simply never hit again. The digest is recomputed only when
+    the file's size or mtime changes.
+    """
+    backend, weights = resolve(model_path, backend)
+    if not available(backend, weights):
+        return 'demo'
+    path = Path(weights)
+    if not path.exists():
+        return path.name  # stock weights, downloaded on first load
+    files = sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+    parts = []
+    for f in files:
+        stat = f.stat()
+        marker = (str(f.resolve()), stat.st_size, stat.st_mtime_ns)
+        if marker not in _weights_digests:
+            _weights_digests[marker] = digest_file(f)
+        parts.append(_weights_digests[marker])
+    digest = parts[0] if len(parts) == 1 else hashlib.blake2b(''.join(parts).encode(), digest_size=16).hexdigest()
+    # Exports of the same weights give slightly different boxes, so the backend is part of the identity
+    return f'{path.name}:{digest}' if backend == 'ultralytics' else f'{backend}:{path.name}:{digest}'
+
+
+class ResultCache:
+    """
+    Two-tier cache of JSON-serializable detection results
+
+    Keys are digests of the input content plus the model identity and the
+    parameters that affect the result, so identical inputs hit no matter
+    which file name or process they came from. The memory tier is a per-process
+    LRU of serialized results (every get returns a fresh copy, so callers may
+    mutate it). The disk tier is one small JSON file per entry under
+    root/entries, shared by every worker; when it grows past max_bytes the
+    least recently used files (by mtime, refreshed on each hit) are removed
+    until it is back under 90% of the limit. Per-frame results are only worth
+    a memory entry (put with persist=False), so the disk tier holds whole
+    uploads and a long video never writes a file per frame.
+
+    Hit and miss counters are kept per process and merged into
+    root/stats.json by flush_stats(), so stats() covers every process.
+    """
+
+    def __init__(self, root, max_bytes=512 * 2 ** 20, memory_items=1024, rescan_every=256):
+        """
+        Args:
+            root: Cache directory (e.g. data/cache)
+            max_bytes: Disk tier size limit
+            memory_items: Entries kept in the in-memory LRU
+            rescan_every: Disk writes between rescans of the real disk usage,
+                which also picks up other processes' writes
+        """
+        self.root = Path(root)
+        self.entries = self.root / 'entries'
+        self.entries.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.rescan_every = rescan_every
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+        self._writes = 0
+        self._counts = dict.fromkeys(('memory_hits', 'disk_hits', 'misses', 'stores', 'evictions'), 0)
+
+    @staticmethod
+    def key(model_id, content_digest, **params):
+        """Cache key for one input under one model and parameter set"""
+        text = json.dumps([model_id, content_digest, params], sort_keys=True, default=str)
+        return hashlib.blake2b(text.encode(), digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return self.entries / key[:2] / f'{key}.json'
+
+    def _remember(self, key, body):
+        with self._lock:
+            self._memory[key] = body
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key, persisted=True):
+        """Cached result for key, or None (persisted=False: look in the memory tier only)"""
+        with self._lock:
+            body = self._memory.get(key)
+            if body is not None:
+                self._memory.move_to_end(key)
+                self._counts['memory_hits'] += 1
+                LOOKUPS.inc(cache='result', result='memory_hit')
+                return json.loads(body)
+        if not persisted:
+            with self._lock:
+                self._counts['misses'] += 1
+            LOOKUPS.inc(cache='result', result='miss')
+            return None
+        path = self._path(key)
+        try:
+            body = path.read_text()
+            os.utime(path)
+        except (FileNotFoundError, OSError):
+            with self._lock:
+                self._counts['misses'] += 1
+            LOOKUPS.inc(cache='result', result='miss')
+            return None
+        self._remember(key, body)
+        with self._lock:
+            self._counts['disk_hits'] += 1
+        LOOKUPS.inc(cache='result', result='disk_hit')
+        return json.loads(body)
+
+    def put(self, key, value, persist=True):
+        """Store a result in both tiers (persist=False: in the memory tier only)"""
+        body = json.dumps(value, default=lambda o: o.item() if hasattr(o, 'item') else str(o))
+        self._remember(key, body)
+        if not persist:
+            return
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp.write_text(body)
+        os.replace(tmp, path)
+        with self._lock:
+            self._counts['stores'] += 1
+            self._writes += 1
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(body)
+            rescan = (self._disk_bytes is None or self._disk_bytes > self.max_bytes
+                      or self._writes % self.rescan_every == 0)
+        if rescan:
+            self._evict()
+
+    def _scan(self):
+        files = []
+        for sub in os.scandir(self.entries):
+            if sub.is_dir():
+                for entry in os.scandir(sub.path):
+                    if entry.name.endswith('.json'):
+                        try:
+                            st = entry.stat()
+                        except FileNotFoundError:  # evicted by another process
+                            continue
+                        files.append((st.st_mtime, st.st_size, entry.path))
+        return files
+
+    def _evict(self):
+        """Recount disk usage and drop least recently used entries above the limit"""
+        files = self._scan()
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        if total > self.max_bytes:
+            files.sort()
+            target = 0.9 * self.max_bytes
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                    evicted += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+        with self._lock:
+            self._disk_bytes = total
+            self._counts['evictions'] += evicted
+
+    def flush_stats(self):
+        """Merge this process's counters into the shared stats file"""
+        with self._lock:
+            delta, self._counts = self._counts, dict.fromkeys(self._counts, 0)
+        if not any(delta.values()):
+            return
+        lock_file = open(self.root / 'stats.lock', 'a+b')
+        try:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            shared = self._shared_stats()
+            for name, n in delta.items():
+                shared[name] = shared.get(name, 0) + n
+            tmp = self.root / f'.stats.{os.getpid()}.tmp'
+            tmp.write_text(json.dumps(shared))
+            os.replace(tmp, self.root / 'stats.json')
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _shared_stats(self):
+        try:
+            return json.loads((self.root / 'stats.json').read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def stats(self):
+        """Counters from every process, hit rate and current disk usage"""
+        self.flush_stats()
+        counts = self._shared_stats()
+        hits = counts.get('memory_hits', 0) + counts.get('disk_hits', 0)
+        lookups = hits + counts.get('misses', 0)
+        files = self._scan()
+        return dict(counts, hit_rate=round(hits / lookups, 3) if lookups else 0.0,
+                    disk_entries=len(files), disk_bytes=sum(size for _, size, _ in files),
+                    max_bytes=self.max_bytes)
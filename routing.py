@@ -0,0 +1,437 @@
+"""
+Road Routing Engine
+Congestion-aware fastest, shortest and eco routes with A* and landmark (ALT) lower bounds
+"""
+
+import heapq
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from spatial_index import SpatialIndex, haversine_m
+
+MPH_TO_MS = 0.44704
+METERS_PER_MILE = 1609.344
+CO2_KG_PER_GALLON = 8.887
+DEFAULT_FREE_SPEED = 55  # mph, the free-flow speed reported by get_congestion
+METRICS = ('fastest', 'shortest', 'eco')
+
+
+def fuel_per_mile(speed_mph):
+    """Gallons per mile at a steady speed; cheapest around 35 mph, worst in stop-and-go"""
+    v = np.maximum(np.asarray(speed_mph, dtype=np.float64), 1.0)
+    return 0.012 + 0.35 / v + 4e-6 * v ** 2
+
+
+# Lower bound of fuel_per_mile over all speeds, used to scale distance landmarks for eco
+MIN_FUEL_PER_MILE = float(fuel_per_mile((0.35 / 8e-6) ** (1 / 3)))
+
+
+def _dijkstra(indptr, heads, cost, source):
+    """Single-source distances over a CSR graph (lists), inf where unreachable"""
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    done = set()
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        done.add(u)
+        for e in range(indptr[u], indptr[u + 1]):
+            v = heads[e]
+            nd = d + cost[e]
+            if nd < dist.get(v, np.inf):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    out = np.full(len(indptr) - 1, np.inf)
+    out[list(dist)] = list(dist.values())
+    return out
+
+
+class RoadGraph:
+    """
+    Directed road graph in CSR form
+
+    Nodes are polyline vertices (shared coordinates become one node); every
+    consecutive vertex pair becomes an edge in each direction unless the
+    line is one-way. Each edge remembers the segment it came from so live
+    congestion can be applied per segment.
+    """
+
+    def __init__(self, lines):
+        """
+        Args:
+            lines: Iterable of dicts with 'coords' ([lat, lon] pairs) and
+                optional 'id', 'name', 'free_speed' (mph) and 'oneway'
+        """
+        node_ids, lat, lon = {}, [], []
+        tails, heads, seg, speed = [], [], [], []
+        self.segment_ids, self.segment_names = [], []
+
+        def node(point):
+            key = (round(point[0], 6), round(point[1], 6))
+            if key not in node_ids:
+                node_ids[key] = len(lat)
+                lat.append(key[0])
+                lon.append(key[1])
+            return node_ids[key]
+
+        for line in lines:
+            s = len(self.segment_ids)
+            self.segment_ids.append(line.get('id', f'seg_{s}'))
+            self.segment_names.append(line.get('name', ''))
+            ids = [node(p) for p in line['coords']]
+            for a, b in zip(ids, ids[1:]):
+                if a == b:
+                    continue
+                pairs = [(a, b)] if line.get('oneway') else [(a, b), (b, a)]
+                for t, h in pairs:
+                    tails.append(t)
+                    heads.append(h)
+                    seg.append(s)
+                    speed.append(float(line.get('free_speed') or DEFAULT_FREE_SPEED))
+
+        self.lat = np.array(lat, dtype=np.float64)
+        self.lon = np.array(lon, dtype=np.float64)
+        tails = np.array(tails, dtype=np.int64)
+        order = np.argsort(tails, kind='stable')
+        self.tails = tails[order]
+        self.heads = np.array(heads, dtype=np.int64)[order]
+        self.segment = np.array(seg, dtype=np.int64)[order]
+        self.free_speed = np.array(speed, dtype=np.float64)[order]
+        self.length = haversine_m(self.lat[self.tails], self.lon[self.tails], self.lat[self.heads], self.lon[self.heads])
+        self.indptr = np.searchsorted(self.tails, np.arange(len(lat) + 1))
+        self.nodes = SpatialIndex([{'node': i, 'lat': a, 'lon': o} for i, (a, o) in enumerate(zip(lat, lon))])
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def from_segments(cls, segments):
+        """Graph from the app's ROAD_SEGMENTS ([lat, lon] coords)"""
+        return cls(segments)
+
+    @classmethod
+    def from_geojson(cls, path):
+        """
+        Graph from a GeoJSON extract (e.g. OSM roads exported with ogr2ogr)
+
+        LineString and MultiLineString features are used; 'maxspeed' (mph),
+        'oneway', 'name' and 'id' properties are honoured when present.
+        """
+        with open(path) as f:
+            collection = json.load(f)
+        lines = []
+        for i, feature in enumerate(collection.get('features', [])):
+            geom = feature.get('geometry') or {}
+            props = feature.get('properties') or {}
+            parts = {'LineString': [geom.get('coordinates')], 'MultiLineString': geom.get('coordinates')}.get(geom.get('type'), [])
+            for part in parts:
+                speed = str(props.get('maxspeed', '')).split()[0:1]
+                lines.append({'id': str(props.get('id', feature.get('id', f'way_{i}'))), 'name': props.get('name', ''),
+                              'coords': [[p[1], p[0]] for p in part],  # GeoJSON is [lon, lat]
+                              'free_speed': float(speed[0]) if speed and speed[0].replace('.', '', 1).isdigit() else None,
+                              'oneway': props.get('oneway') in (True, 'yes', '1', 1)})
+        return cls(lines)
+
+
+class RoutingEngine:
+    """
+    Fastest, shortest and eco routes over a RoadGraph
+
+    Queries run A* whose heuristic comes from landmarks (ALT): distances
+    from a few far-apart nodes are computed once on free-flow weights, and
+    the triangle inequality turns them into lower bounds that stay valid
+    when congestion only slows edges down. Results are cached per snapped
+    origin/destination node pair until the congestion speeds change.
+
+    Speeds are best applied off the request path (follow()): a change
+    rebuilds the edge weights, and every refresh_every changes the
+    congestion-aware landmark tables are recomputed in a background thread.
+    That recomputation is pure-Python Dijkstra (seconds on a city graph)
+    and shares the GIL with the process's requests, hence the spacing;
+    between refreshes the free-flow tables remain valid bounds.
+    """
+
+    def __init__(self, graph, landmarks=8, cache_size=1024, max_snap_m=5000, headroom=1.25, refresh_every=10):
+        """
+        Args:
+            graph: RoadGraph
+            landmarks: Number of ALT landmarks (more = tighter bounds, more memory)
+            cache_size: Cached origin/destination pairs
+            max_snap_m: Furthest a query point may be from the road network
+            headroom: How much faster than now an edge may get before the
+                congestion-aware landmark tables stop being valid
+            refresh_every: Speed changes between landmark table refreshes
+        """
+        self.graph = graph
+        self.cache_size = cache_size
+        self.max_snap_m = max_snap_m
+        self.headroom = headroom
+        self.refresh_every = refresh_every
+        self.version = 0
+        self._speeds = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._follower = None
+        self._indptr = graph.indptr.tolist()
+        self._heads = graph.heads.tolist()
+        self._symmetric = self._is_symmetric()
+        if not self._symmetric:
+            rev = np.argsort(graph.heads, kind='stable')
+            self._rindptr = np.searchsorted(graph.heads[rev], np.arange(len(graph) + 1)).tolist()
+            self._rheads = graph.tails[rev].tolist()
+            self._rev = rev
+        self._set_weights(graph.free_speed)
+        self._landmarks = {'shortest': self._select_landmarks(landmarks),
+                           'fastest': self._landmark_tables(self.weights['fastest'])}
+        # Tables on slower-than-free-flow times give tighter bounds while valid
+        self._congested, self._basis, self._congested_ok = None, None, False
+
+    def _is_symmetric(self):
+        g = self.graph
+        fwd = np.sort(g.tails * len(g) + g.heads)
+        back = np.sort(g.heads * len(g) + g.tails)
+        return len(g.tails) == 0 or np.array_equal(fwd, back)
+
+    def _set_weights(self, speed_mph):
+        g = self.graph
+        self.speed = speed_mph
+        self.weights = {
+            'fastest': (g.length / (speed_mph * MPH_TO_MS)).tolist(),
+            'shortest': g.length.tolist(),
+            'eco': (g.length / METERS_PER_MILE * fuel_per_mile(speed_mph)).tolist(),
+        }
+
+    def _distances(self, cost, source):
+        """(from landmark, to landmark) distance arrays"""
+        forward = _dijkstra(self._indptr, self._heads, cost, source)
+        if self._symmetric:
+            return forward, forward
+        backward = _dijkstra(self._rindptr, self._rheads, np.asarray(cost)[self._rev].tolist(), source)
+        return forward, backward
+
+    def _select_landmarks(self, count):
+        """Pick landmarks and return their distance tables"""
+        # Farthest-point selection on distance: each new landmark is the node
+        # worst covered so far; unreachable nodes (other components) go first
+        n = len(self.graph)
+        self.landmark_nodes, pairs = [], []
+        nearest = np.full(n, np.inf)
+        candidate = 0
+        for _ in range(min(count, n)):
+            self.landmark_nodes.append(candidate)
+            pairs.append(self._distances(self.weights['shortest'], candidate))
+            nearest = np.minimum(nearest, pairs[-1][0])
+            nearest[self.landmark_nodes] = -1
+            candidate = int(np.argmax(nearest))
+            if nearest[candidate] < 0:
+                break
+        return self._stack(pairs)
+
+    def _landmark_tables(self, cost):
+        """(from, to) arrays of shape (landmarks, nodes) for one edge cost"""
+        return self._stack([self._distances(cost, node) for node in self.landmark_nodes])
+
+    def _stack(self, pairs):
+        if not pairs:
+            return np.empty((0, len(self.graph))), np.empty((0, len(self.graph)))
+        # Unreachable becomes a large finite value so inf - inf never yields NaN
+        big = 1e15
+        return np.minimum([p[0] for p in pairs], big), np.minimum([p[1] for p in pairs], big)
+
+    def _fastest_tables(self):
+        return self._congested if self._congested_ok else self._landmarks['fastest']
+
+    def _heuristic(self, tables, target, scale=1.0):
+        """Lower bound of the cost from every node to target (an array), from (from, to) landmark tables"""
+        from_l, to_l = tables
+        h = np.zeros(len(self.graph))
+        tmp = np.empty_like(h)
+        # d(v,t) >= d(L,t) - d(L,v) and d(v,t) >= d(v,L) - d(t,L); one landmark
+        # at a time keeps the temporaries at one row instead of the whole table
+        for i in range(len(from_l)):
+            np.maximum(h, np.subtract(from_l[i, target], from_l[i], out=tmp), out=h)
+            np.maximum(h, np.subtract(to_l[i], to_l[i, target], out=tmp), out=h)
+        if scale != 1.0:
+            h *= scale
+        return h
+
+    def update_speeds(self, speeds, refresh=True):
+        """
+        Apply live congestion
+
+        Args:
+            speeds: {segment_id: current speed in mph}; edges of other segments
+                run at free-flow speed
+            refresh: Recompute the congestion-aware landmark tables in a
+                background thread, on the first change and every
+                refresh_every changes after it
+
+        Returns:
+            True if the weights changed (and the route cache was dropped)
+        """
+        if speeds == self._speeds:
+            return False
+        g = self.graph
+        by_segment = np.array([speeds.get(sid, np.inf) for sid in g.segment_ids] or [np.inf])
+        current = np.minimum(g.free_speed, np.maximum(by_segment[g.segment], 1.0)) if len(g.segment) else g.free_speed
+        with self._lock:
+            self._speeds = dict(speeds)
+            self._set_weights(current)
+            self._cache = OrderedDict()
+            self.version += 1
+            # Landmark bounds hold only while no edge is faster than the tables assumed
+            self._congested_ok = self._basis is not None and bool(np.all(current <= self._basis))
+            due = self._basis is None or self.version % self.refresh_every == 0
+            start = refresh and due and not self._refreshing
+            self._refreshing = self._refreshing or start
+        if start:
+            threading.Thread(target=self.refresh_landmarks, name='landmark-refresh', daemon=True).start()
+        return True
+
+    def refresh_landmarks(self):
+        """Recompute the fastest-route landmark tables on the current speeds"""
+        try:
+            # Build on speeds a little above the current ones so the tables
+            # survive moderate recoveries until the next refresh
+            basis = np.minimum(self.graph.free_speed, self.speed * self.headroom)
+            tables = self._landmark_tables((self.graph.length / (basis * MPH_TO_MS)).tolist())
+            with self._lock:
+                self._congested, self._basis = tables, basis
+                self._congested_ok = bool(np.all(self.speed <= basis))
+        finally:
+            self._refreshing = False
+
+    def follow(self, fetch, interval):
+        """
+        Keep the speeds current from a background thread, so queries never pay for an update
+
+        Args:
+            fetch: Callable returning {segment_id: speed in mph}
+            interval: Seconds between calls (e.g. the snapshot tick)
+
+        The first call applies fetch() before returning; later calls return at once.
+        Started on first use, so a forking server never inherits the thread.
+        """
+        with self._lock:
+            if self._follower is not None:
+                return
+            self._follower = threading.Thread(target=self._follow, args=(fetch, interval), name='route-speeds',
+                                              daemon=True)
+        self.update_speeds(fetch())
+        self._follower.start()
+
+    def _follow(self, fetch, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.update_speeds(fetch())
+            except Exception as e:
+                print(f"⚠ Route speed update failed: {e}")
+
+    def snap(self, lat, lon):
+        """Nearest graph node to a point, or None if it is beyond max_snap_m"""
+        hit = self.graph.nodes.nearest(lat, lon, k=1)
+        if not hit or hit[0]['distance_m'] > self.max_snap_m:
+            return None
+        return hit[0]['node']
+
+    def _search(self, source, target, cost, h):
+        """A* returning the edge list of the cheapest path, or None"""
+        indptr, heads = self._indptr, self._heads
+        # Only the nodes the search reaches are read from the heuristic array
+        h = h.item
+        inf = float('inf')
+        g = [inf] * len(indptr)
+        parent = [-1] * len(indptr)
+        g[source] = 0.0
+        # Ties on f go to the node closer to the target, which keeps the
+        # search on one of many equal-cost grid paths
+        heap = [(h(source), h(source), 0.0, source)]
+        pop, push = heapq.heappop, heapq.heappush
+        while heap:
+            _, _, gu, u = pop(heap)
+            if u == target:
+                break
+            if gu > g[u]:
+                continue
+            for e in range(indptr[u], indptr[u + 1]):
+                v = heads[e]
+                nd = gu + cost[e]
+                if nd < g[v]:
+                    g[v] = nd
+                    parent[v] = e
+                    hv = h(v)
+                    push(heap, (nd + hv, hv, nd, v))
+        if g[target] == inf:
+            return None
+        tails = self.graph.tails
+        path, node = [], target
+        while node != source:
+            path.append(parent[node])
+            node = int(tails[parent[node]])
+        return path[::-1]
+
+    def _describe(self, name, edges, source):
+        g = self.graph
+        e = np.array(edges, dtype=np.int64)
+        length = g.length[e]
+        seconds = float(np.sum(length / (self.speed[e] * MPH_TO_MS)))
+        gallons = float(np.sum(length / METERS_PER_MILE * fuel_per_mile(self.speed[e])))
+        ratio = float(np.sum(length * self.speed[e] / g.free_speed[e]) / length.sum()) if len(e) else 1.0
+        nodes = np.concatenate([[source], g.heads[e]]).astype(np.int64)
+        segments = list(dict.fromkeys(g.segment_names[s] or g.segment_ids[s] for s in g.segment[e].tolist()))
+        return {'name': name, 'time': round(seconds / 60, 1), 'dist': round(float(length.sum()) / METERS_PER_MILE, 2),
+                'traffic': 'low' if ratio > 0.75 else 'medium' if ratio > 0.45 else 'heavy',
+                'fuel_gal': round(gallons, 3), 'co2_kg': round(gallons * CO2_KG_PER_GALLON, 2), 'roads': segments,
+                'coords': np.round(np.stack([g.lat[nodes], g.lon[nodes]], axis=1), 6).tolist()}
+
+    def route(self, origin, destination):
+        """
+        Fastest, shortest and eco routes between two (lat, lon) points
+
+        Returns:
+            List of route dicts (name, time in minutes, dist in miles, traffic,
+            fuel_gal, co2_kg, roads, coords), or None when either point is off
+            the network or no path connects them
+        """
+        source, target = self.snap(*origin), self.snap(*destination)
+        if source is None or target is None:
+            return None
+        key = (source, target)
+        with self._lock:
+            cache, weights, fastest = self._cache, self.weights, self._fastest_tables()
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+
+        routes = []
+        if source != target:
+            # Eco reuses the distance bound: fuel >= distance x best-case consumption
+            distance = self._heuristic(self._landmarks['shortest'], target)
+            bounds = {'fastest': self._heuristic(fastest, target), 'shortest': distance,
+                      'eco': distance * (MIN_FUEL_PER_MILE / METERS_PER_MILE)}
+        for metric, name in zip(METRICS, ('Fastest', 'Shortest', 'Eco-Friendly')):
+            if source == target:
+                edges = []
+            else:
+                edges = self._search(source, target, weights[metric], bounds[metric])
+                if edges is None:
+                    return None
+            routes.append(self._describe(name, edges, source))
+        fastest, eco = routes[0], routes[2]
+        if fastest['fuel_gal'] > 0:
+            eco['carbon_saved'] = f"{max(0, round(100 * (1 - eco['fuel_gal'] / fastest['fuel_gal'])))}%"
+
+        with self._lock:
+            # A congestion update while we searched already replaced the cache
+            if cache is self._cache:
+                cache[key] = routes
+                if len(cache) > self.cache_size:
+                    cache.popitem(last=False)
+        return routes
@@ -0,0 +1,196 @@
+"""
+Snapshot Cache for Dashboard APIs
+Builds each dataset once per refresh tick and serves pre-serialized, pre-gzipped bytes
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+from flask import Response, request
+
+from metrics import registry as metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: still cached per process, just not shared
+    fcntl = None
+
+LOOKUPS = metrics.counter('cache_lookups_total', 'Cache lookups by cache and result', ['cache', 'result'])
+BUILD_SECONDS = metrics.histogram('snapshot_build_seconds', 'Time to build and serialize a dataset snapshot', ['dataset'])
+
+
+class Snapshot:
+    """One serialized dataset for one tick"""
+
+    __slots__ = ('tick', 'etag', 'body', 'gzipped')
+
+    def __init__(self, tick, etag, body, gzipped):
+        self.tick = tick
+        self.etag = etag
+        self.body = body
+        self.gzipped = gzipped
+
+    @classmethod
+    def build(cls, tick, body):
+        etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        return cls(tick, etag, body, gzip.compress(body, compresslevel=6))
+
+    def dump(self):
+        header = f'{self.tick} {self.etag} {len(self.body)}\n'.encode()
+        return header + self.body + self.gzipped
+
+    @classmethod
+    def load(cls, data):
+        header, _, rest = data.partition(b'\n')
+        tick, etag, size = header.decode().split()
+        size = int(size)
+        return cls(int(tick), etag, rest[:size], rest[size:])
+
+
+class SnapshotCache:
+    """
+    Tick-aligned cache shared by every worker on the host
+
+    Time is cut into ticks of `ttl` seconds. The first worker to ask for a
+    dataset in a new tick builds it under a file lock and writes it to
+    cache_dir; the other workers load that file once and then serve the tick
+    from memory. Every request after the first costs a dict lookup.
+    """
+
+    def __init__(self, cache_dir, ttl=30):
+        """
+        Args:
+            cache_dir: Directory shared by all workers (e.g. data/snapshots)
+            ttl: Tick length in seconds; matches the dashboard refresh interval
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self._memory = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def current_tick(self):
+        return int(time.time() // self.ttl)
+
+    def seconds_left(self):
+        return max(1, int(self.ttl - time.time() % self.ttl))
+
+    def _read(self, path, tick):
+        try:
+            snap = Snapshot.load(path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            return None
+        return snap if snap.tick == tick else None
+
+    def get(self, name, build):
+        """
+        Return the current tick's snapshot for `name`
+
+        Args:
+            name: Dataset name, used as the file name
+            build: Callable returning the body as bytes, or None when the
+                result must not be cached (e.g. an error response)
+
+        Returns:
+            Snapshot, or None if build declined to produce a cacheable body
+        """
+        tick = self.current_tick()
+        snap = self._memory.get(name)
+        if snap is not None and snap.tick == tick:
+            self.hits += 1
+            LOOKUPS.inc(cache='snapshot', result='memory_hit')
+            return snap
+
+        with self._lock:
+            snap = self._memory.get(name)
+            if snap is not None and snap.tick == tick:
+                LOOKUPS.inc(cache='snapshot', result='memory_hit')
+                return snap
+            path = self.cache_dir / f'{name}.snap'
+            snap = self._read(path, tick)
+            if snap is not None:
+                LOOKUPS.inc(cache='snapshot', result='disk_hit')
+            else:
+                snap = self._build_shared(path, tick, build)
+                if snap is None:
+                    return None
+            self._memory[name] = snap
+            return snap
+
+    def _build_shared(self, path, tick, build):
+        # One lock for all datasets: builds take milliseconds, and a per-name
+        # lock file would let arbitrary URL arguments litter the directory
+        lock_file = open(self.cache_dir / 'build.lock', 'a+b')
+        try:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another worker may have built it while we waited for the lock
+            snap = self._read(path, tick)
+            if snap is not None:
+                LOOKUPS.inc(cache='snapshot', result='disk_hit')
+                return snap
+            LOOKUPS.inc(cache='snapshot', result='miss')
+            start = time.perf_counter()
+            body = build()
+            if body is None:
+                return None
+            snap = Snapshot.build(tick, body)
+            BUILD_SECONDS.observe(time.perf_counter() - start, dataset=path.stem)
+            tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp.write_bytes(snap.dump())
+            os.replace(tmp, path)
+            self.builds += 1
+            return snap
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def once(self, name, fn):
+        """
+        Run fn at most once per tick for `name` across all workers
+
+        For side effects that belong to a tick rather than to one serialized
+        format, e.g. storing the tick's observations. Uses its own lock file,
+        so it may be called from inside a build.
+
+        Returns:
+            True if fn ran
+        """
+        tick = self.current_tick()
+        marker = self.cache_dir / f'{name}.once'
+        lock_file = open(self.cache_dir / 'once.lock', 'a+b')
+        try:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if int(marker.read_text()) == tick:
+                    return False
+            except (FileNotFoundError, ValueError):
+                pass
+            fn()
+            tmp = marker.with_suffix(f'.{os.getpid()}.tmp')
+            tmp.write_text(str(tick))
+            os.replace(tmp, marker)
+            return True
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def response(self, snap, mimetype='application/json', vary=None):
+        """Build the HTTP response for a snapshot, honouring ETag and gzip"""
+        headers = {'ETag': f'"{snap.etag}"', 'Vary': f'Accept-Encoding, {vary}' if vary else 'Accept-Encoding',
+                   'Cache-Control': f'public, max-age={self.seconds_left()}'}
+        if request.if_none_match.contains(snap.etag):
+            return Response(status=304, headers=headers)
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            headers['Content-Encoding'] = 'gzip'
+            return Response(snap.gzipped, mimetype=mimetype, headers=headers)
+        return Response(snap.body, mimetype=mimetype, headers=headers)
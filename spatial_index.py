@@ -0,0 +1,200 @@
+"""
+Spatial Index for Map Features
+KD-tree over points on the unit sphere for bbox, k-nearest and radius queries
+"""
+
+import heapq
+import math
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def to_unit_vectors(lat, lon):
+    """Project degrees onto the unit sphere; chord length is monotonic in great-circle distance"""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_to_meters(chord):
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+def meters_to_chord(meters):
+    return 2 * math.sin(min(meters / EARTH_RADIUS_M, math.pi) / 2)
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters (vectorized)"""
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dp, dl = p2 - p1, np.radians(np.asarray(lon2) - np.asarray(lon1))
+    a = np.sin(dp / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+class SpatialIndex:
+    """
+    Static KD-tree over a list of features with 'lat' and 'lon'
+
+    Built once at startup. Nodes are kept in flat arrays with an axis-aligned
+    bounding box each; leaves hold up to leaf_size points that are filtered
+    with vectorized NumPy, so Python work per query is O(log n) node visits.
+    Bounding-box queries use a latitude-sorted copy instead, which answers
+    them exactly without reasoning about box shapes on the sphere; their cost
+    is O(log n + m) for the m features in the box's latitude band, so a thin
+    box spanning many degrees of longitude filters most of the layer.
+    """
+
+    def __init__(self, features, leaf_size=16):
+        """
+        Args:
+            features: List of dicts with at least 'lat' and 'lon'
+            leaf_size: Maximum points per leaf
+        """
+        self.features = list(features)
+        self.leaf_size = leaf_size
+        n = len(self.features)
+        self.lat = np.array([f['lat'] for f in self.features], dtype=np.float64)
+        self.lon = np.array([f['lon'] for f in self.features], dtype=np.float64)
+        points = to_unit_vectors(self.lat, self.lon).reshape(n, 3)
+
+        # Node arrays: [start, end) into self.order, children, bounding box
+        self.order = np.arange(n)
+        self.start, self.end, self.left, self.right, self.bmin, self.bmax = [], [], [], [], [], []
+        if n:
+            self._build(points)
+        self.points = points[self.order]
+        self._lat_order = np.argsort(self.lat, kind='stable')
+        self._lat_sorted = self.lat[self._lat_order]
+        self.bmin = np.array(self.bmin).reshape(-1, 3)
+        self.bmax = np.array(self.bmax).reshape(-1, 3)
+        self._masks = {}
+
+    def __len__(self):
+        return len(self.features)
+
+    def _build(self, points):
+        stack = [(0, len(points), self._new_node(points, 0, len(points)))]
+        while stack:
+            lo, hi, node = stack.pop()
+            if hi - lo <= self.leaf_size:
+                continue
+            idx = self.order[lo:hi]
+            dim = int(np.argmax(self.bmax[node] - self.bmin[node]))
+            mid = (hi - lo) // 2
+            part = np.argpartition(points[idx, dim], mid)
+            self.order[lo:hi] = idx[part]
+            left = self._new_node(points, lo, lo + mid)
+            right = self._new_node(points, lo + mid, hi)
+            self.left[node], self.right[node] = left, right
+            stack.append((lo, lo + mid, left))
+            stack.append((lo + mid, hi, right))
+
+    def _new_node(self, points, lo, hi):
+        pts = points[self.order[lo:hi]]
+        self.start.append(lo)
+        self.end.append(hi)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.bmin.append(pts.min(axis=0))
+        self.bmax.append(pts.max(axis=0))
+        return len(self.start) - 1
+
+    def where(self, field, value):
+        """
+        Boolean mask of features whose field equals value, for nearest(mask=...)
+
+        The masks of a field are built on first use for the values that occur
+        in the features; any other value gets an all-False mask that is not
+        kept, so arbitrary query values never grow the cache.
+        """
+        masks = self._masks.get(field)
+        if masks is None:
+            values = [f.get(field) for f in self.features]
+            masks = self._masks[field] = {v: np.array([x == v for x in values], dtype=bool) for v in set(values)}
+        mask = masks.get(value)
+        return mask if mask is not None else np.zeros(len(self.features), dtype=bool)
+
+    def _box_distance(self, node, q):
+        d = np.maximum(0, np.maximum(self.bmin[node] - q, q - self.bmax[node]))
+        return float(np.sqrt(d @ d))
+
+    def _result(self, i, dist_m):
+        return {**self.features[i], 'distance_m': round(float(dist_m), 1)}
+
+    def nearest(self, lat, lon, k=1, mask=None):
+        """
+        k nearest features by great-circle distance
+
+        Args:
+            lat, lon: Query point in degrees
+            k: Number of results
+            mask: Optional boolean array over features; False entries are skipped
+
+        Returns:
+            List of feature dicts with an added 'distance_m', nearest first
+        """
+        if not self.features or (mask is not None and not mask.any()):
+            return []
+        q = to_unit_vectors(lat, lon)
+        best = []  # max-heap of (-chord, feature index)
+        frontier = [(0.0, 0)]
+        while frontier:
+            box_dist, node = heapq.heappop(frontier)
+            if len(best) == k and box_dist > -best[0][0]:
+                break
+            if self.left[node] == -1:
+                lo, hi = self.start[node], self.end[node]
+                chords = np.linalg.norm(self.points[lo:hi] - q, axis=1)
+                ids = self.order[lo:hi]
+                for chord, i in zip(chords.tolist(), ids.tolist()):
+                    if mask is not None and not mask[i]:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-chord, i))
+                    elif chord < -best[0][0]:
+                        heapq.heapreplace(best, (-chord, i))
+                continue
+            for child in (self.left[node], self.right[node]):
+                heapq.heappush(frontier, (self._box_distance(child, q), child))
+        best.sort(reverse=True)
+        return [self._result(i, chord_to_meters(-c)) for c, i in best]
+
+    def _within_chord(self, q, chord):
+        hits, stack = [], [0]
+        while stack:
+            node = stack.pop()
+            if self._box_distance(node, q) > chord:
+                continue
+            if self.left[node] == -1:
+                lo, hi = self.start[node], self.end[node]
+                d = np.linalg.norm(self.points[lo:hi] - q, axis=1)
+                keep = d <= chord
+                hits.append((self.order[lo:hi][keep], d[keep]))
+                continue
+            stack.extend((self.left[node], self.right[node]))
+        if not hits:
+            return np.empty(0, dtype=int), np.empty(0)
+        return np.concatenate([h[0] for h in hits]), np.concatenate([h[1] for h in hits])
+
+    def within(self, lat, lon, radius_m):
+        """Features within radius_m meters of a point, nearest first"""
+        if not self.features:
+            return []
+        ids, chords = self._within_chord(to_unit_vectors(lat, lon), meters_to_chord(radius_m))
+        order = np.argsort(chords, kind='stable')
+        return [self._result(i, d) for i, d in zip(ids[order].tolist(), chord_to_meters(chords[order]).tolist())]
+
+    def bbox(self, south, west, north, east):
+        """Features inside a lat/lon bounding box (west > east wraps the antimeridian)"""
+        # Latitude band by binary search on the lat-sorted copy, then filter longitude
+        # (one vectorized pass over every feature in the band, whatever the box's width)
+        lo = np.searchsorted(self._lat_sorted, south, side='left')
+        hi = np.searchsorted(self._lat_sorted, north, side='right')
+        ids = self._lat_order[lo:hi]
+        lon = self.lon[ids]
+        in_lon = (lon >= west) & (lon <= east) if west <= east else (lon >= west) | (lon <= east)
+        return [self.features[i] for i in np.sort(ids[in_lon]).tolist()]
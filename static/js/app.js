@@ -1,6 +1,6 @@
 // Smart City Traffic Platform - Main Application
-let map, heatmapLayer, markersLayer, roadsLayer, signalsLayer, poisLayer, emergencyLayer, disasterLayer, parkingLayer, reportsLayer;
-let trafficData = [], roadSegments = [], reportLocation = null;
+let map, heatmapLayer, markersLayer, roadsLayer, routeLayer, signalsLayer, poisLayer, emergencyLayer, disasterLayer, parkingLayer, reportsLayer;
+let trafficData = [], roadSegments = [], signalsData = [], reportsData = [], predictionsData = [], reportLocation = null;
 
 document.addEventListener('DOMContentLoaded', () => {
     initMap();
@@ -17,6 +17,7 @@ function initMap() {
     
     markersLayer = L.layerGroup().addTo(map);
     roadsLayer = L.layerGroup().addTo(map);
+    routeLayer = L.layerGroup().addTo(map);
     signalsLayer = L.layerGroup();
     poisLayer = L.layerGroup();
     emergencyLayer = L.layerGroup();
@@ -24,6 +25,8 @@ function initMap() {
     parkingLayer = L.layerGroup();
     reportsLayer = L.layerGroup();
     
+    map.on('moveend', () => loadHeatmap());
+    
     map.on('click', (e) => {
         reportLocation = e.latlng;
         L.popup().setLatLng(e.latlng).setContent('📍 Report location set here').openOn(map);
@@ -37,26 +40,91 @@ async function loadAllData() {
 
 async function loadTrafficData() {
     try {
-        const res = await fetch('/api/traffic-data');
-        trafficData = await res.json();
+        const { records, columns, header } = await fetchColumns('/api/traffic-data');
+        const cats = header.categories, levels = header.enums.congestion;
+        trafficData = records.map((cam, i) => {
+            const congestion = levels[columns.congestion[i]];
+            return { ...cam, congestion, avg_speed: congestion.speed, timestamp: header.timestamp,
+                vehicle_counts: Object.fromEntries(cats.map((c, k) => [c, columns.vehicle_counts[i * cats.length + k]])),
+                total_vehicles: columns.total_vehicles[i], density: Math.round(columns.density[i] * 10) / 10,
+                pedestrians: columns.pedestrians[i], source: header.enums.source[columns.source[i]] };
+        });
         updateStats(); updateMarkers(); updateCameraList();
     } catch (e) { console.error('Traffic data error:', e); }
 }
 
 async function loadRoadSegments() {
     try {
-        const res = await fetch('/api/road-segments');
-        roadSegments = await res.json();
+        const { records, columns, header } = await fetchColumns('/api/road-segments');
+        roadSegments = records.map((road, i) => ({ ...road, density: columns.density[i],
+            congestion: header.enums.congestion[columns.congestion[i]], vehicles: columns.vehicles[i],
+            avg_speed: columns.avg_speed[i], source: header.enums.source[columns.source[i]] }));
         updateRoads();
     } catch (e) { console.error('Road segments error:', e); }
 }
 
+// Compact dataset payloads (see wire.py): a JSON header and typed-array columns; the static
+// records (names, coordinates) are fetched once per version and later ticks send changed rows only
+const WIRE_TYPES = { u1: Uint8Array, u2: Uint16Array, u4: Uint32Array, i1: Int8Array, i2: Int16Array,
+    i4: Int32Array, f4: Float32Array, f8: Float64Array };
+const wireState = {};
+
+function decodeColumns(buffer) {
+    const text = new TextDecoder();
+    if (text.decode(new Uint8Array(buffer, 0, 4)) !== 'TRC1') throw new Error('Not a column frame');
+    const size = new DataView(buffer).getUint32(4, true);
+    const header = JSON.parse(text.decode(new Uint8Array(buffer, 8, size)));
+    // Buffers are 8-byte aligned, so each column is a view on the response, not a copy
+    header.columns = Object.fromEntries(header.columns.map(c => [c.name, {
+        width: c.shape.slice(1).reduce((a, b) => a * b, 1),
+        data: new WIRE_TYPES[c.dtype](buffer, 8 + size + c.offset, c.shape.reduce((a, b) => a * b, 1)) }]));
+    return header;
+}
+
+async function fetchColumns(url, full = false) {
+    const state = wireState[url];
+    const since = state && !full ? `&since=${state.tick}` : '';
+    const header = decodeColumns(await (await fetch(`${url}?format=binary${since}`)).arrayBuffer());
+    if (header.delta && state.version !== header.static_version) return fetchColumns(url, true);
+    const records = state && state.version === header.static_version ? state.records
+        : (await (await fetch(`/api/static/${header.dataset}`)).json()).records;
+    // Stored as Float64Array: the server narrows each payload's dtypes to its own value range
+    const columns = header.delta ? state.columns : {};
+    const rows = header.columns._rows;
+    for (const [name, col] of Object.entries(header.columns)) {
+        if (name === '_rows') continue;
+        if (!header.delta) { columns[name] = Float64Array.from(col.data); continue; }
+        rows.data.forEach((row, k) => columns[name].set(col.data.subarray(k * col.width, (k + 1) * col.width), row * col.width));
+    }
+    wireState[url] = { tick: header.tick, version: header.static_version, records, columns };
+    return { records, columns, header };
+}
+
+// Heatmap tiles are fetched two zoom levels above the map so a handful cover the viewport
+function heatmapTiles() {
+    const z = Math.max(0, Math.min(16, map.getZoom() - 2));
+    const n = 1 << z;
+    const toTile = ll => {
+        const lat = Math.max(-85.0511, Math.min(85.0511, ll.lat)) * Math.PI / 180;
+        return [Math.floor((ll.lng + 180) / 360 * n), Math.floor((1 - Math.log(Math.tan(lat) + 1 / Math.cos(lat)) / Math.PI) / 2 * n)];
+    };
+    const bounds = map.getBounds();
+    const [x0, y0] = toTile(bounds.getNorthWest());
+    const [x1, y1] = toTile(bounds.getSouthEast());
+    const tiles = [];
+    for (let x = Math.max(0, x0); x <= Math.min(n - 1, x1); x++)
+        for (let y = Math.max(0, y0); y <= Math.min(n - 1, y1); y++) tiles.push(`/api/heatmap/${z}/${x}/${y}`);
+    return tiles;
+}
+
 async function loadHeatmap() {
     try {
-        const res = await fetch('/api/heatmap-data');
-        const data = await res.json();
+        const tiles = await Promise.all(heatmapTiles().map(url => fetch(url).then(r => r.json())));
+        const points = [];
+        let peak = 0;
+        tiles.forEach(t => t.weight.forEach(w => { peak = Math.max(peak, w); }));
+        tiles.forEach(t => t.lat.forEach((lat, i) => points.push([lat, t.lon[i], t.weight[i] / (peak || 1)])));
         if (heatmapLayer) map.removeLayer(heatmapLayer);
-        const points = data.map(p => [p.lat, p.lon, p.intensity]);
         heatmapLayer = L.heatLayer(points, { 
             radius: 35, 
             blur: 25, 
@@ -78,22 +146,26 @@ async function loadHeatmap() {
 async function loadSignals() {
     try {
         const res = await fetch('/api/traffic-signals');
-        const signals = await res.json();
-        signalsLayer.clearLayers();
-        signals.forEach(sig => {
-            const icon = L.divIcon({ className: '', html: `<div class="signal-marker ${sig.status}">
-                <i class="fas fa-traffic-light"></i></div>`, iconSize: [24, 24], iconAnchor: [12, 12] });
-            const marker = L.marker([sig.lat, sig.lon], { icon });
-            marker.bindPopup(`<div class="popup-content"><h3>Traffic Signal</h3>
-                <p><strong>${sig.intersection}</strong></p>
-                <p>Status: <span style="color:${sig.status === 'green' ? '#00aa00' : sig.status === 'red' ? '#ff0000' : '#aa8800'}">${sig.status.toUpperCase()}</span></p>
-                <p>Queue: ${sig.queue} vehicles</p><p>Wait time: ~${sig.wait_time}s</p>
-                <p>Adaptive Mode: ${sig.adaptive ? '✅ ON' : '❌ OFF'}</p></div>`);
-            signalsLayer.addLayer(marker);
-        });
+        signalsData = await res.json();
+        renderSignals();
     } catch (e) { console.error('Signals error:', e); }
 }
 
+function renderSignals() {
+    signalsLayer.clearLayers();
+    signalsData.forEach(sig => {
+        const icon = L.divIcon({ className: '', html: `<div class="signal-marker ${sig.status}">
+            <i class="fas fa-traffic-light"></i></div>`, iconSize: [24, 24], iconAnchor: [12, 12] });
+        const marker = L.marker([sig.lat, sig.lon], { icon });
+        marker.bindPopup(`<div class="popup-content"><h3>Traffic Signal</h3>
+            <p><strong>${sig.intersection}</strong></p>
+            <p>Status: <span style="color:${sig.status === 'green' ? '#00aa00' : sig.status === 'red' ? '#ff0000' : '#aa8800'}">${sig.status.toUpperCase()}</span></p>
+            <p>Queue: ${sig.queue} vehicles</p><p>Wait time: ~${sig.wait_time}s</p>
+            <p>Adaptive Mode: ${sig.adaptive ? '✅ ON' : '❌ OFF'}</p></div>`);
+        signalsLayer.addLayer(marker);
+    });
+}
+
 async function loadPOIs() {
     try {
         const res = await fetch('/api/pois');
@@ -167,45 +239,58 @@ async function loadParking() {
 async function loadReports() {
     try {
         const res = await fetch('/api/reports');
-        const reports = await res.json();
-        reportsLayer.clearLayers();
-        const icons = { accident: '🚗💥', congestion: '🚦', construction: '🚧', hazard: '⚠️', police: '👮', closure: '🚫' };
-        reports.forEach(r => {
-            if (!r.lat || !r.lon) return;
-            const icon = L.divIcon({ className: '', html: `<div class="poi-marker">${icons[r.type] || '📢'}</div>`,
-                iconSize: [30, 30], iconAnchor: [15, 15] });
-            const marker = L.marker([r.lat, r.lon], { icon });
-            marker.bindPopup(`<div class="popup-content"><h3>${r.type.toUpperCase()}</h3>
-                <p>${r.description || 'No description'}</p><p>👍 ${r.upvotes} upvotes</p>
-                <p>${new Date(r.timestamp).toLocaleString()}</p></div>`);
-            reportsLayer.addLayer(marker);
-        });
+        reportsData = await res.json();
+        renderReports();
     } catch (e) { console.error('Reports error:', e); }
 }
 
+function renderReports() {
+    reportsLayer.clearLayers();
+    const icons = { accident: '🚗💥', congestion: '🚦', construction: '🚧', hazard: '⚠️', police: '👮', closure: '🚫' };
+    reportsData.forEach(r => {
+        if (!r.lat || !r.lon) return;
+        const icon = L.divIcon({ className: '', html: `<div class="poi-marker">${icons[r.type] || '📢'}</div>`,
+            iconSize: [30, 30], iconAnchor: [15, 15] });
+        const marker = L.marker([r.lat, r.lon], { icon });
+        marker.bindPopup(`<div class="popup-content"><h3>${r.type.toUpperCase()}</h3>
+            <p>${r.description || 'No description'}</p><p>👍 ${r.upvotes} upvotes</p>
+            <p>${new Date(r.timestamp).toLocaleString()}</p></div>`);
+        reportsLayer.addLayer(marker);
+    });
+}
+
 async function loadPredictions() {
     try {
         const res = await fetch('/api/predictions');
-        const preds = await res.json();
-        if (preds.length > 0) {
-            const hour = new Date().getHours();
-            const nextHour = preds[0].predictions.find(p => p.hour === (hour + 1) % 24) || preds[0].predictions[0];
-            document.getElementById('predVehicles').textContent = nextHour.count;
-            document.getElementById('predCongestion').textContent = nextHour.count > 200 ? 'High' : nextHour.count > 100 ? 'Medium' : 'Low';
-            document.getElementById('predAdvice').textContent = nextHour.count > 200 ? 'Avoid rush hour' : 'Good to travel';
-        }
+        predictionsData = await res.json();
+        renderPredictions(predictionsData);
     } catch (e) { console.error('Predictions error:', e); }
 }
 
+function renderPredictions(preds) {
+    if (preds.length > 0) {
+        const nextHour = preds[0].predictions[0];
+        // Counts are relative to the camera's own day: busy means well above its 24 h average
+        const avg = preds[0].predictions.reduce((sum, p) => sum + p.count, 0) / preds[0].predictions.length || 1;
+        const load = nextHour.count / avg;
+        document.getElementById('predVehicles').textContent = nextHour.count;
+        document.getElementById('predCongestion').textContent = load > 1.2 ? 'High' : load > 0.8 ? 'Medium' : 'Low';
+        document.getElementById('predAdvice').textContent = load > 1.2 ? 'Avoid rush hour' : 'Good to travel';
+    }
+}
+
 async function loadAnalytics() {
     try {
         const res = await fetch('/api/analytics');
-        const data = await res.json();
-        document.getElementById('envAQI').textContent = data.aqi;
-        document.getElementById('envCarbon').textContent = data.carbon_tons;
+        renderAnalytics(await res.json());
     } catch (e) { console.error('Analytics error:', e); }
 }
 
+function renderAnalytics(data) {
+    document.getElementById('envAQI').textContent = data.aqi;
+    document.getElementById('envCarbon').textContent = data.carbon_tons;
+}
+
 function updateStats() {
     let total = 0, bikes = 0, motos = 0, cars = 0, autos = 0, buses = 0, trucks = 0, ambs = 0, police = 0, peds = 0;
     trafficData.forEach(d => {
@@ -255,8 +340,10 @@ function updateRoads() {
     roadSegments.forEach(road => {
         const polyline = L.polyline(road.coords, { color: road.congestion.color, weight: 6, opacity: 0.8 });
         polyline.bindPopup(`<div class="popup-content"><h3>${road.name}</h3>
-            <p>Density: ${road.density}%</p><p>Vehicles: ${road.vehicles}</p>
-            <p>Status: ${road.congestion.label}</p></div>`);
+            <p>Density: ${road.density}%</p>
+            <p>${road.source === 'live' ? `Flow: ${road.vehicles} veh/h` : `Vehicles: ${road.vehicles}`}</p>
+            <p>Avg speed: ${Math.round(road.avg_speed)} mph</p>
+            <p>Status: ${road.congestion.label}${road.source === 'live' ? ' (live)' : ''}</p></div>`);
         roadsLayer.addLayer(polyline);
     });
 }
@@ -372,7 +459,13 @@ async function findRoute() {
         const res = await fetch('/api/route', { method: 'POST', headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ from, to }) });
         const data = await res.json();
+        if (!res.ok) { alert(data.error || 'Route finding failed'); return; }
         const results = document.getElementById('routeResults');
+        routeLayer.clearLayers();
+        const colors = ['#2196f3', '#9c27b0', '#4caf50'];
+        data.routes.slice().reverse().forEach((r, i) => routeLayer.addLayer(
+            L.polyline(r.coords, { color: colors[data.routes.length - 1 - i], weight: 5, opacity: 0.85 }).bindPopup(r.name)));
+        if (data.routes[0].coords.length > 1) map.fitBounds(L.polyline(data.routes[0].coords).getBounds(), { padding: [40, 40] });
         results.innerHTML = data.routes.map(r => `<div class="route-option">
             <div class="name">${r.name}</div>
             <div class="details">${r.time} min • ${r.dist} mi • ${r.traffic} traffic${r.carbon_saved ? ' • 🌱' + r.carbon_saved : ''}</div>
@@ -381,35 +474,111 @@ async function findRoute() {
     } catch (e) { alert('Route finding failed'); }
 }
 
+const CHUNK_SIZE = 8 * 1024 * 1024;
+
+// Resumable chunked upload: videos are analysed while they upload, so counts show up early
 async function uploadFile(e) {
     const file = e.target.files[0];
     if (!file) return;
     const status = document.getElementById('uploadStatus');
     status.textContent = 'Uploading...';
     status.className = '';
-    const formData = new FormData();
-    formData.append('file', file);
+    const form = new FormData();
+    form.append('filename', file.name);
+    form.append('size', file.size);
     try {
-        const res = await fetch('/api/upload', { method: 'POST', body: formData });
-        const data = await res.json();
-        if (data.success) {
-            status.textContent = `✅ Detected ${data.detections} vehicles`;
+        let up = await (await fetch('/api/uploads', { method: 'POST', body: form })).json();
+        if (!up.upload_id) throw new Error(up.error);
+        let retries = 0;
+        while (up.offset < file.size) {
+            const res = await fetch(`/api/uploads/${up.upload_id}`, {
+                method: 'PATCH', headers: { 'Upload-Offset': up.offset },
+                body: file.slice(up.offset, up.offset + CHUNK_SIZE)
+            }).catch(() => null);
+            if (res && res.ok) {
+                up = await res.json();
+                retries = 0;
+            } else {
+                // Lost or rejected chunk: ask where the server is and resume from there
+                if (++retries > 5) throw new Error('upload interrupted');
+                await new Promise(r => setTimeout(r, 2000));
+                up = await (await fetch(`/api/uploads/${up.upload_id}`)).json();
+            }
+            const progress = up.job && up.job.progress;
+            status.textContent = `Uploading ${Math.round(100 * up.offset / file.size)}%` +
+                (progress ? ` • ${progress.total_vehicles} vehicles so far` : '');
+        }
+        status.textContent = 'Analyzing...';
+        const job = await waitForJob(up.status_url, p => {
+            status.textContent = `Analyzing... ${p.total_vehicles} vehicles so far`;
+        });
+        if (job.status === 'done') {
+            status.textContent = `✅ Detected ${job.result.total_vehicles} vehicles`;
             status.className = 'success';
         } else {
-            status.textContent = '❌ ' + data.error;
+            status.textContent = '❌ ' + (job.error || 'Analysis failed');
             status.className = 'error';
         }
     } catch (err) {
-        status.textContent = '❌ Upload failed';
+        status.textContent = '❌ ' + (err.message || 'Upload failed');
         status.className = 'error';
     }
     e.target.value = '';
 }
 
+async function waitForJob(url, onProgress) {
+    while (true) {
+        const job = await (await fetch(url)).json();
+        if (job.status === 'done' || job.status === 'failed' || job.error) return job;
+        if (job.progress && onProgress) onProgress(job.progress);
+        await new Promise(r => setTimeout(r, 2000));
+    }
+}
+
 function startTimers() {
     updateTime();
     setInterval(updateTime, 1000);
-    setInterval(loadAllData, 30000);
+    if (window.EventSource) {
+        startStream();
+        setInterval(loadHeatmap, 30000);  // heatmap is not on the stream; mostly 304s
+    } else {
+        setInterval(loadAllData, 30000);
+    }
+}
+
+// Live updates: one snapshot on connect, then only the items that changed
+function startStream() {
+    const source = new EventSource('/api/stream');
+    source.addEventListener('snapshot', e => applyStream(JSON.parse(e.data), true));
+    source.addEventListener('delta', e => applyStream(JSON.parse(e.data), false));
+    // A refused (503) stream is closed for good, not retried: poll instead and try again later
+    source.onerror = () => {
+        if (source.readyState !== EventSource.CLOSED) return;
+        loadAllData();
+        const poll = setInterval(loadAllData, 30000);
+        setTimeout(() => { clearInterval(poll); startStream(); }, 300000);
+    };
+}
+
+function mergeById(list, changed, removed, key = 'id') {
+    const items = new Map(list.map(item => [item[key], item]));
+    (changed || []).forEach(item => items.set(item[key], item));
+    (removed || []).forEach(id => items.delete(id));
+    return [...items.values()];
+}
+
+function applyStream(msg, full) {
+    const removed = msg.removed || {};
+    const merge = (list, name, key) => mergeById(full ? [] : list, msg[name], removed[name], key);
+    if (msg.cameras || removed.cameras) {
+        trafficData = merge(trafficData, 'cameras');
+        updateStats(); updateMarkers(); updateCameraList();
+    }
+    if (msg.segments || removed.segments) { roadSegments = merge(roadSegments, 'segments'); updateRoads(); }
+    if (msg.signals || removed.signals) { signalsData = merge(signalsData, 'signals'); renderSignals(); }
+    if (msg.reports || removed.reports) { reportsData = merge(reportsData, 'reports'); renderReports(); }
+    if (msg.predictions) { predictionsData = merge(predictionsData, 'predictions', 'camera_id'); renderPredictions(predictionsData); }
+    if (msg.analytics) renderAnalytics(msg.analytics);
 }
 
 function updateTime() {
@@ -0,0 +1,276 @@
+"""
+Time-Series Store for Camera Counts
+Append-only raw log plus memory-mapped minute, hour and day rollups, partitioned on disk
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: writes are only serialized within a process
+    fcntl = None
+
+# Rollup resolution -> (seconds per slot, partition)
+RESOLUTIONS = {'minute': (60, 'day'), 'hour': (3600, 'year'), 'day': (86400, 'year')}
+_SAFE_ID = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+
+def _utc(ts):
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+
+def _partition(ts, resolution):
+    """(partition name, partition start ts, partition end ts) containing ts"""
+    t = _utc(ts)
+    if RESOLUTIONS[resolution][1] == 'day':
+        start = datetime(t.year, t.month, t.day, tzinfo=timezone.utc)
+        return start.strftime('%Y-%m-%d'), start.timestamp(), start.timestamp() + 86400
+    start = datetime(t.year, 1, 1, tzinfo=timezone.utc)
+    return str(t.year), start.timestamp(), datetime(t.year + 1, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+class TimeSeriesStore:
+    """
+    Per-camera, per-class vehicle counts
+
+    Each write is appended to a raw log for the day and added into three
+    rollups: minute slots (one file per camera per day), hour and day slots
+    (one file per camera per year). Rollups are .npy files opened as shared
+    memory maps, so every worker process sees writes immediately and a query
+    is a slice-and-sum over at most a handful of small arrays. Range totals
+    combine the coarsest rollups that fit (days in the middle, hours and
+    minutes at the ragged edges) and never touch the raw log.
+    """
+
+    def __init__(self, root, classes, max_open=256):
+        """
+        Args:
+            root: Storage directory (e.g. data/timeseries)
+            classes: Vehicle class names, one column each; the list stored on
+                first use wins so files stay consistent across versions
+            max_open: Memory maps kept open at once
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        meta = self.root / 'meta.json'
+        if meta.exists():
+            self.classes = json.loads(meta.read_text())['classes']
+        else:
+            self.classes = list(classes)
+            tmp = meta.with_suffix(f'.{os.getpid()}.tmp')
+            tmp.write_text(json.dumps({'classes': self.classes}))
+            os.replace(tmp, meta)
+        self._column = {c: i for i, c in enumerate(self.classes)}
+        self.raw_dtype = np.dtype([('ts', '<f8'), ('counts', '<u4', (len(self.classes),))])
+        self.max_open = max_open
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+
+    # -- files -----------------------------------------------------------
+
+    def _path(self, resolution, partition, camera_id):
+        return self.root / resolution / partition / f'{camera_id}.npy'
+
+    def _open(self, resolution, partition, start, end, camera_id, create=False):
+        """Memory map of one rollup partition, or None if it does not exist yet"""
+        path = self._path(resolution, partition, camera_id)
+        with self._lock:
+            mm = self._maps.get(path)
+            if mm is not None:
+                self._maps.move_to_end(path)
+                return mm
+        if not path.exists():
+            if not create:
+                return None
+            path.parent.mkdir(parents=True, exist_ok=True)
+            slots = int(round((end - start) / RESOLUTIONS[resolution][0]))
+            tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+            np.lib.format.open_memmap(tmp, mode='w+', dtype='<u4', shape=(slots, len(self.classes))).flush()
+            # Another process may have created it first; theirs is kept
+            if not path.exists():
+                os.replace(tmp, path)
+            else:
+                tmp.unlink()
+        mm = np.load(path, mmap_mode='r+')
+        with self._lock:
+            self._maps[path] = mm
+            while len(self._maps) > self.max_open:
+                self._maps.popitem(last=False)
+        return mm
+
+    def _write_lock(self):
+        lock_file = open(self.root / 'write.lock', 'a+b')
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _vector(self, counts):
+        vec = np.zeros(len(self.classes), dtype=np.uint32)
+        for name, value in counts.items():
+            if name in self._column:
+                vec[self._column[name]] = value
+        return vec
+
+    # -- writes ----------------------------------------------------------
+
+    def record(self, camera_id, counts, ts=None):
+        """
+        Add one observation
+
+        Args:
+            camera_id: Camera id (letters, digits, '_', '-', '.')
+            counts: {class name: count}; unknown classes are ignored
+            ts: Unix time, default now
+        """
+        ts = datetime.now(timezone.utc).timestamp() if ts is None else ts
+        self.record_many(camera_id, np.array([ts], dtype=np.float64), self._vector(counts)[None, :])
+
+    def record_many(self, camera_id, ts, counts):
+        """
+        Add a batch of observations for one camera
+
+        Args:
+            camera_id: Camera id
+            ts: Array of Unix times
+            counts: Array of shape (len(ts), len(classes))
+        """
+        if not _SAFE_ID.match(str(camera_id)):
+            raise ValueError(f'Invalid camera id: {camera_id!r}')
+        ts = np.asarray(ts, dtype=np.float64)
+        counts = np.asarray(counts, dtype=np.uint32).reshape(len(ts), len(self.classes))
+        if not len(ts):
+            return
+        raw = np.empty(len(ts), dtype=self.raw_dtype)
+        raw['ts'], raw['counts'] = ts, counts
+
+        lock_file = self._write_lock()
+        try:
+            # Raw log: one append per day touched
+            days = (ts // 86400).astype(np.int64)
+            for day in np.unique(days):
+                name = _partition(float(day * 86400), 'minute')[0]
+                path = self.root / 'raw' / name / f'{camera_id}.bin'
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, 'ab') as f:
+                    raw[days == day].tofile(f)
+            for resolution, (step, _) in RESOLUTIONS.items():
+                self._add_rollup(resolution, step, camera_id, ts, counts)
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _add_rollup(self, resolution, step, camera_id, ts, counts):
+        i = 0
+        order = np.argsort(ts, kind='stable')
+        ts, counts = ts[order], counts[order]
+        while i < len(ts):
+            name, start, end = _partition(float(ts[i]), resolution)
+            j = int(np.searchsorted(ts, end, side='left'))
+            mm = self._open(resolution, name, start, end, camera_id, create=True)
+            slots = ((ts[i:j] - start) // step).astype(np.int64)
+            np.add.at(mm, slots, counts[i:j])
+            i = j
+
+    # -- reads -----------------------------------------------------------
+
+    def cameras(self):
+        """Camera ids with any stored data"""
+        day_dir = self.root / 'day'
+        return sorted({p.stem for p in day_dir.glob('*/*.npy')}) if day_dir.exists() else []
+
+    def _first_year(self):
+        years = [int(p.name) for p in (self.root / 'day').glob('[0-9]*')]
+        return datetime(min(years), 1, 1, tzinfo=timezone.utc).timestamp() if years else 0
+
+    def _read(self, camera_ids, start, end, resolution):
+        """Slots [start, end) (aligned to the resolution) summed over cameras, shape (slots, classes)"""
+        step = RESOLUTIONS[resolution][0]
+        out = np.zeros((max(0, int((end - start) // step)), len(self.classes)), dtype=np.int64)
+        t = start
+        while t < end:
+            name, p_start, p_end = _partition(t, resolution)
+            lo = int((t - p_start) // step)
+            n = int((min(end, p_end) - t) // step)
+            at = int((t - start) // step)
+            for camera_id in camera_ids:
+                mm = self._open(resolution, name, p_start, p_end, camera_id)
+                if mm is not None:
+                    out[at:at + n] += mm[lo:lo + n]
+            t += n * step
+        return out
+
+    def series(self, camera_ids=None, start=None, end=None, resolution='hour'):
+        """
+        Counts per time slot from one rollup
+
+        Args:
+            camera_ids: Cameras to sum over (default: all with data)
+            start, end: Unix times; aligned outward to whole slots. Default is
+                the last 24 slots
+            resolution: 'minute', 'hour' or 'day'
+
+        Returns:
+            (slot start times, array of shape (slots, classes))
+        """
+        step = RESOLUTIONS[resolution][0]
+        camera_ids = self.cameras() if camera_ids is None else list(camera_ids)
+        now = datetime.now(timezone.utc).timestamp()
+        end = now if end is None else end
+        end = -(-end // step) * step
+        start = end - 24 * step if start is None else start // step * step
+        counts = self._read(camera_ids, start, end, resolution)
+        return np.arange(start, end, step)[:len(counts)], counts
+
+    def per_camera(self, camera_ids, start, end, resolution='hour'):
+        """All-class totals per slot for each camera over aligned [start, end), shape (slots, cameras)"""
+        step = RESOLUTIONS[resolution][0]
+        if not camera_ids:
+            return np.zeros((max(0, int((end - start) // step)), 0), dtype=np.int64)
+        return np.stack([self._read([c], start, end, resolution).sum(axis=1) for c in camera_ids], axis=1)
+
+    def totals(self, camera_ids=None, start=None, end=None):
+        """
+        Per-class totals over [start, end), at minute precision
+
+        Reads whole days from the day rollup, whole hours around them from the
+        hour rollup and only the ragged ends from the minute rollup, so a year
+        costs about the same as a day.
+
+        Returns:
+            {class name: count}
+        """
+        camera_ids = self.cameras() if camera_ids is None else list(camera_ids)
+        end = datetime.now(timezone.utc).timestamp() if end is None else end
+        start = self._first_year() if start is None else start
+        start, end = start // 60 * 60, -(-end // 60) * 60
+        hour_start, hour_end = -(-start // 3600) * 3600, end // 3600 * 3600
+        if hour_start >= hour_end:
+            spans = [('minute', start, end)]
+        else:
+            day_start, day_end = -(-hour_start // 86400) * 86400, hour_end // 86400 * 86400
+            spans = [('minute', start, hour_start), ('minute', hour_end, end)]
+            if day_start >= day_end:
+                spans.append(('hour', hour_start, hour_end))
+            else:
+                spans += [('hour', hour_start, day_start), ('hour', day_end, hour_end), ('day', day_start, day_end)]
+        total = np.zeros(len(self.classes), dtype=np.int64)
+        for resolution, lo, hi in spans:
+            if hi > lo:
+                total += self._read(camera_ids, lo, hi, resolution).sum(axis=0)
+        return dict(zip(self.classes, total.tolist()))
+
+    def raw(self, camera_id, day):
+        """Raw observations for one camera on one UTC day ('YYYY-MM-DD'), e.g. to rebuild rollups"""
+        path = self.root / 'raw' / day / f'{camera_id}.bin'
+        if not _SAFE_ID.match(str(camera_id)) or not path.exists():
+            return np.empty(0, dtype=self.raw_dtype)
+        return np.fromfile(path, dtype=self.raw_dtype)
@@ -0,0 +1,167 @@
+"""
+Multi-Object Tracker
+Gives vehicle detections persistent IDs across frames using IoU and centroid matching
+"""
+
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Pairwise intersection-over-union of two sets of boxes
+
+    Args:
+        boxes_a: (N, 4) array of [x1, y1, x2, y2]
+        boxes_b: (M, 4) array of [x1, y1, x2, y2]
+
+    Returns:
+        (N, M) array of IoU values
+    """
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    iw = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    ih = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = iw * ih
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def greedy_assignment(cost, max_cost):
+    """
+    Match rows to columns by repeatedly taking the cheapest remaining pair
+
+    Only pairs with cost below max_cost are considered, so the Python loop
+    runs over the handful of gated candidates rather than the full matrix.
+
+    Returns:
+        (rows, cols) index arrays of matched pairs
+    """
+    rows, cols = np.nonzero(cost < max_cost)
+    if rows.size == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    order = np.argsort(cost[rows, cols], kind='stable')
+    used_rows, used_cols = set(), set()
+    matched_rows, matched_cols = [], []
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        matched_rows.append(r)
+        matched_cols.append(c)
+    return np.array(matched_rows, dtype=int), np.array(matched_cols, dtype=int)
+
+
+class VehicleTracker:
+    """
+    IoU / centroid tracker with greedy assignment
+
+    Track state is held in parallel NumPy arrays so a frame with hundreds of
+    detections costs a few vectorized matrix operations. Each track carries a
+    smoothed velocity, and matching is done against its predicted position so a
+    vehicle missed for a few frames is not handed to a neighbour.
+    """
+
+    def __init__(self, iou_threshold=0.2, max_distance=50, max_missed=10, smoothing=0.5):
+        """
+        Args:
+            iou_threshold: Minimum IoU for an overlap match
+            max_distance: Max distance in pixels between predicted and detected
+                centre for a match without overlap
+            max_missed: Frames a track survives without a matching detection
+            smoothing: Weight of the newest displacement in the velocity estimate
+        """
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.smoothing = smoothing
+        self.next_id = 1
+        self.ids = np.empty(0, dtype=np.int64)
+        self.boxes = np.empty((0, 4), dtype=np.float64)
+        self.centroids = np.empty((0, 2), dtype=np.float64)
+        self.prev_centroids = np.empty((0, 2), dtype=np.float64)
+        self.velocities = np.empty((0, 2), dtype=np.float64)
+        self.missed = np.empty(0, dtype=np.int64)
+        self.types = []
+
+    def _cost(self, det_boxes, det_centroids):
+        """1 - IoU for overlapping pairs, 1 + normalised distance otherwise"""
+        shift = self.velocities * (self.missed[:, None] + 1)
+        iou = iou_matrix(self.boxes + np.hstack([shift, shift]), det_boxes)
+        dist = np.linalg.norm((self.centroids + shift)[:, None, :] - det_centroids[None, :, :], axis=2)
+        cost = np.where(iou >= self.iou_threshold, 1.0 - iou, 1.0 + dist / self.max_distance)
+        # Anything beyond both gates is never assignable
+        cost[(iou < self.iou_threshold) & (dist > self.max_distance)] = np.inf
+        return cost
+
+    def update(self, detections):
+        """
+        Associate a frame's detections with existing tracks
+
+        Each detection dict gets a 'track_id' key. After the call,
+        prev_centroids / centroids hold the motion of every live track over
+        this frame, which is what line counting needs.
+
+        Args:
+            detections: List of detections with 'bbox' and 'type'
+
+        Returns:
+            List of active tracks (id, bbox, type, centroid) seen this frame
+        """
+        if detections:
+            det_boxes = np.array([d['bbox'] for d in detections], dtype=np.float64)
+        else:
+            det_boxes = np.empty((0, 4), dtype=np.float64)
+        det_centroids = (det_boxes[:, :2] + det_boxes[:, 2:]) / 2
+
+        n_tracks = len(self.ids)
+        if n_tracks and len(detections):
+            rows, cols = greedy_assignment(self._cost(det_boxes, det_centroids), np.inf)
+        else:
+            rows = cols = np.empty(0, dtype=int)
+
+        # Matched tracks move; unmatched tracks age and keep their last position
+        self.prev_centroids = self.centroids.copy()
+        steps = self.missed[rows, None] + 1
+        displacement = (det_centroids[cols] - self.centroids[rows]) / steps
+        self.velocities[rows] += self.smoothing * (displacement - self.velocities[rows])
+        self.missed += 1
+        self.missed[rows] = 0
+        self.boxes[rows] = det_boxes[cols]
+        self.centroids[rows] = det_centroids[cols]
+        for r, c in zip(rows.tolist(), cols.tolist()):
+            self.types[r] = detections[c]['type']
+            detections[c]['track_id'] = int(self.ids[r])
+
+        # Unmatched detections start new tracks
+        new = np.setdiff1d(np.arange(len(detections)), cols, assume_unique=True)
+        if new.size:
+            new_ids = np.arange(self.next_id, self.next_id + new.size)
+            self.next_id += new.size
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.boxes = np.vstack([self.boxes, det_boxes[new]])
+            self.centroids = np.vstack([self.centroids, det_centroids[new]])
+            # A new track has no motion yet: previous position = current
+            self.prev_centroids = np.vstack([self.prev_centroids, det_centroids[new]])
+            self.velocities = np.vstack([self.velocities, np.zeros((new.size, 2))])
+            self.missed = np.concatenate([self.missed, np.zeros(new.size, dtype=np.int64)])
+            for i, track_id in zip(new.tolist(), new_ids.tolist()):
+                self.types.append(detections[i]['type'])
+                detections[i]['track_id'] = track_id
+
+        # Drop tracks that have been missing for too long
+        alive = self.missed <= self.max_missed
+        if not alive.all():
+            self.ids = self.ids[alive]
+            self.boxes = self.boxes[alive]
+            self.centroids = self.centroids[alive]
+            self.prev_centroids = self.prev_centroids[alive]
+            self.velocities = self.velocities[alive]
+            self.missed = self.missed[alive]
+            self.types = [t for t, keep in zip(self.types, alive.tolist()) if keep]
+
+        seen = np.nonzero(self.missed == 0)[0]
+        return [{'id': int(self.ids[i]), 'bbox': self.boxes[i].astype(int).tolist(),
+                 'type': self.types[i], 'centroid': self.centroids[i].tolist()} for i in seen.tolist()]
@@ -3,9 +3,21 @@ Vehicle Detection Module using YOLOv8
 This module provides functionality to detect and classify vehicles from images and videos
 """
 
+import time
 import cv2
 import numpy as np
 from pathlib import Path
+from metrics import registry as metrics
+from model_registry import RUNTIMES, available, models, resolve
+from motion_gate import MotionGate, shift_detections
+from render import VideoRenderer, draw_overlay
+from result_cache import digest_file, digest_frame, model_identity
+from tracker import VehicleTracker
+
+FRAMES = metrics.counter('detector_frames_total', 'Frames and images by outcome: decoded, skipped (grabbed only), '
+                         'gated (no motion), dropped, cached or inferred', ['outcome'])
+STAGE_SECONDS = metrics.histogram('detector_stage_seconds', 'Model time per call by stage', ['stage'])
+MODEL_INFO = metrics.gauge('detector_model_info', 'Detection model loaded in the process', ['mode', 'model'])
 
 class YOLOVehicleDetector:
     """
@@ -13,14 +25,17 @@ class YOLOVehicleDetector:
     Detects and classifies: bikes, cars, buses, trucks
     """
     
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, cache=None, backend=None):
         """
         Initialize the detector
         
         Args:
-            model_path: Path to YOLO model weights (optional)
+            model_path: Path to YOLO model weights, or an exported .onnx / OpenVINO model (optional)
+            cache: Optional ResultCache; images and frames seen before skip the model
+            backend: 'ultralytics', 'onnx' or 'openvino' (default: $DETECTOR_BACKEND or from model_path)
         """
         self.model_path = model_path
+        self.cache = cache
         self.vehicle_classes = {
             'bicycle': 'bike',
             'motorcycle': 'bike',
@@ -29,60 +44,140 @@ class YOLOVehicleDetector:
             'truck': 'truck'
         }
         
-        # Try to load YOLOv8 model
-        try:
-            from ultralytics import YOLO
-            if model_path and Path(model_path).exists():
-                self.model = YOLO(model_path)
-            else:
-                # Use pretrained YOLOv8n model
-                self.model = YOLO('yolov8n.pt')
-            self.use_yolo = True
-            print("✓ YOLOv8 model loaded successfully")
-        except Exception as e:
-            print(f"⚠ Could not load YOLO model: {e}")
+        # The model is loaded by the first inference (or was preloaded into the
+        # registry), so constructing a detector is cheap
+        self.backend, self.weights = resolve(model_path, backend)
+        self.use_yolo = available(self.backend, self.weights)
+        self.model = None
+        if not self.use_yolo:
+            needs = RUNTIMES[self.backend] if self.backend == 'ultralytics' else f"{RUNTIMES[self.backend]} and {self.weights}"
+            print(f"⚠ {self.backend} backend unavailable (needs {needs})")
             print("  Using demo mode with simulated detections")
-            self.model = None
-            self.use_yolo = False
+        self.model_id = model_identity(model_path, self.backend) if self.use_yolo else 'demo'
+        MODEL_INFO.set(1, mode=self.backend if self.use_yolo else 'demo', model=self.model_id)
+    
+    def _load(self):
+        """The model, loaded on first use; a model that fails to load means demo mode from then on"""
+        if self.model is None and self.use_yolo:
+            try:
+                self.model = models.get(self.weights, self.backend)
+            except Exception as e:
+                print(f"⚠ Could not load YOLO model: {e}")
+                print("  Using demo mode with simulated detections")
+                self.use_yolo, self.model_id = False, 'demo'
+                MODEL_INFO.reset()
+                MODEL_INFO.set(1, mode='demo', model='demo')
+        return self.model
+    
+    def warm_up(self):
+        """
+        Load the model and run one inference on a blank frame, so the first
+        real request pays for neither
+        
+        Returns:
+            Dict with the mode, the model id and the seconds spent
+        """
+        start = time.perf_counter()
+        if self._load() is not None:
+            models.warm_up(self.weights, self.backend)
+        return {'mode': self.backend if self.use_yolo else 'demo', 'model': self.model_id,
+                'seconds': time.perf_counter() - start}
     
     def detect_from_image(self, image_path, confidence_threshold=0.5):
         """
         Detect vehicles in an image
         
         Args:
-            image_path: Path to image file
+            image_path: Path to image file, or a decoded BGR frame array
             confidence_threshold: Minimum confidence for detection
             
         Returns:
             List of detections with type, confidence, and bounding box
         """
+        self._load()  # before the cache key: a failed load changes the model id
+        key = None
+        # A file is a whole upload and goes to the shared disk tier; a frame only to memory
+        persist = not isinstance(image_path, np.ndarray) and self.model_id != 'demo'
+        if self.cache is not None:
+            digest = digest_frame(image_path) if isinstance(image_path, np.ndarray) else digest_file(image_path)
+            key = self.cache.key(self.model_id, digest, conf=confidence_threshold)
+            cached = self.cache.get(key, persisted=persist)
+            if cached is not None:
+                FRAMES.inc(outcome='cached')
+                return cached
         if self.use_yolo and self.model:
-            return self._detect_with_yolo(image_path, confidence_threshold)
+            detections = self._detect_with_yolo(image_path, confidence_threshold)
         else:
-            return self._generate_demo_detections()
+            with STAGE_SECONDS.time(stage='infer'):
+                detections = self._generate_demo_detections()
+        FRAMES.inc(outcome='inferred')
+        if key is not None:
+            self.cache.put(key, detections, persist=persist)
+        return detections
+    
+    def detect_batch(self, frames, confidence_threshold=0.5):
+        """
+        Detect vehicles in a batch of decoded frames with one model call
+        
+        Args:
+            frames: List of BGR frame arrays (as returned by cv2.VideoCapture)
+            confidence_threshold: Minimum confidence for detection
+            
+        Returns:
+            List of detection lists, one per input frame
+        """
+        if not frames:
+            return []
+        self._load()
+        if self.cache is None:
+            return self._run_batch(frames, confidence_threshold)
+        # Only frames the cache has not seen go to the model; frames stay in the memory
+        # tier, since writing a file per decoded frame would cost more than it saves
+        keys = [self.cache.key(self.model_id, digest_frame(f), conf=confidence_threshold) for f in frames]
+        results = [self.cache.get(k, persisted=False) for k in keys]
+        misses = [i for i, r in enumerate(results) if r is None]
+        FRAMES.inc(len(frames) - len(misses), outcome='cached')
+        if misses:
+            for i, detections in zip(misses, self._run_batch([frames[i] for i in misses], confidence_threshold)):
+                self.cache.put(keys[i], detections, persist=False)
+                results[i] = detections
+        return results
+    
+    def _run_batch(self, frames, confidence_threshold):
+        FRAMES.inc(len(frames), outcome='inferred')
+        if self.use_yolo and self.model:
+            return self._parse_timed(*self.model.predict(list(frames), confidence_threshold))
+        with STAGE_SECONDS.time(stage='infer'):
+            return [self._generate_demo_detections() for _ in frames]
     
     def _detect_with_yolo(self, image_path, confidence_threshold):
         """Detect vehicles using actual YOLO model"""
-        results = self.model(image_path, conf=confidence_threshold)
         detections = []
         
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                class_id = int(box.cls[0])
-                class_name = result.names[class_id]
-                confidence = float(box.conf[0])
-                
-                # Check if it's a vehicle class we're interested in
-                if class_name.lower() in self.vehicle_classes:
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    
-                    detections.append({
-                        'type': self.vehicle_classes[class_name.lower()],
-                        'confidence': confidence,
-                        'bbox': [int(x1), int(y1), int(x2), int(y2)],
-                        'class_name': class_name
-                    })
+        for result_detections in self._parse_timed(*self.model.predict([image_path], confidence_threshold)):
+            detections.extend(result_detections)
+        
+        return detections
+    
+    def _parse_timed(self, boxes, speed):
+        """Parse model output, recording the model's per-stage timings and ours"""
+        for stage, seconds in speed.items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+        with STAGE_SECONDS.time(stage='parse'):
+            return [self._parse_yolo_result(image_boxes) for image_boxes in boxes]
+    
+    def _parse_yolo_result(self, boxes):
+        """Convert one image's (class name, confidence, xyxy) boxes into our detection dicts"""
+        detections = []
+        for class_name, confidence, (x1, y1, x2, y2) in boxes:
+            # Check if it's a vehicle class we're interested in
+            if class_name.lower() in self.vehicle_classes:
+                detections.append({
+                    'type': self.vehicle_classes[class_name.lower()],
+                    'confidence': confidence,
+                    'bbox': [int(x1), int(y1), int(x2), int(y2)],
+                    'class_name': class_name
+                })
         
         return detections
     
@@ -110,86 +205,251 @@ class YOLOVehicleDetector:
         
         return detections
     
-    def detect_from_video(self, video_path, frame_skip=5):
+    @staticmethod
+    def _capture(video_path):
+        return video_path if hasattr(video_path, 'read') else cv2.VideoCapture(video_path)
+    
+    def iter_frames(self, video_path, frame_skip=1):
         """
-        Detect vehicles in a video
+        Decode a video straight into frame arrays
+        
+        Skipped frames are only grabbed, not decoded into BGR, so a large
+        frame_skip costs little more than demuxing.
+        
+        Args:
+            video_path: Path to video file (or any cv2.VideoCapture source, or
+                an opened capture such as chunked_upload.GrowingVideoCapture)
+            frame_skip: Yield every Nth frame
+            
+        Yields:
+            (frame_number, frame) tuples
+        """
+        cap = self._capture(video_path)
+        frame_number, decoded = 0, 0
+        try:
+            while cap.isOpened():
+                if frame_number % frame_skip == 0:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    decoded += 1
+                    yield frame_number, frame
+                elif not cap.grab():
+                    break
+                frame_number += 1
+        finally:
+            cap.release()
+            FRAMES.inc(decoded, outcome='decoded')
+            FRAMES.inc(frame_number - decoded, outcome='skipped')
+    
+    def iter_moving_frames(self, video_path, gate, frame_skip=5, max_skip=40):
+        """
+        Decode a video, yielding only frames the motion gate lets through
+        
+        Sampling adapts to activity: every static sample doubles the stride
+        (up to max_skip), and the first frame with motion drops it back to
+        frame_skip. Frames between samples are only grabbed.
+        
+        Args:
+            video_path: Path to video file (or any cv2.VideoCapture source)
+            gate: MotionGate for this video
+            frame_skip: Stride while there is motion
+            max_skip: Longest stride on a static scene
+            
+        Yields:
+            (frame_number, frame, (x1, y1, x2, y2) region to detect in) tuples
+        """
+        cap = self._capture(video_path)
+        frame_number, due, stride = 0, 0, frame_skip
+        decoded, gated = 0, 0
+        try:
+            while cap.isOpened():
+                if frame_number == due:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    decoded += 1
+                    box = gate.check(frame)
+                    if box is None:
+                        gated += 1
+                        stride = min(max_skip, stride * 2)
+                    else:
+                        stride = frame_skip
+                        yield frame_number, frame, box
+                    due = frame_number + stride
+                elif not cap.grab():
+                    break
+                frame_number += 1
+        finally:
+            cap.release()
+            FRAMES.inc(decoded, outcome='decoded')
+            FRAMES.inc(gated, outcome='gated')
+            FRAMES.inc(frame_number - decoded, outcome='skipped')
+    
+    def stream_video(self, video_path, frame_skip=5, batch_size=8, confidence_threshold=0.5,
+                     gate=None, max_skip=None):
+        """
+        Run batched detection over a video without touching the disk
         
         Args:
             video_path: Path to video file
             frame_skip: Process every Nth frame
+            batch_size: Number of frames sent to the model per call
+            confidence_threshold: Minimum confidence for detection
+            gate: Optional MotionGate; static frames are skipped, moving ones are
+                cropped to the motion and only detections inside its ROI are kept
+            max_skip: Longest adaptive stride with a gate (default 8 x frame_skip)
+            
+        Yields:
+            Dictionary per processed frame with frame number, detections and
+            the decoded frame ('image'), which callers may draw on
+        """
+        batch_size = max(1, int(batch_size))
+        if gate is None:
+            frames = ((n, frame, None) for n, frame in self.iter_frames(video_path, frame_skip))
+        else:
+            frames = self.iter_moving_frames(video_path, gate, frame_skip, max_skip or 8 * frame_skip)
+        batch = []
+        for item in frames:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield from self._detect_crops(batch, confidence_threshold, gate)
+                batch = []
+        if batch:
+            yield from self._detect_crops(batch, confidence_threshold, gate)
+    
+    def _detect_crops(self, batch, confidence_threshold, gate):
+        """One model call over (frame_number, frame, box) items; boxes are mapped back to the full frame"""
+        crops = []
+        for _, frame, box in batch:
+            if box is None or box == (0, 0, frame.shape[1], frame.shape[0]):
+                crops.append(frame)
+            else:
+                crops.append(np.ascontiguousarray(frame[box[1]:box[3], box[0]:box[2]]))
+        for (n, frame, box), detections in zip(batch, self.detect_batch(crops, confidence_threshold)):
+            if box is not None:
+                detections = [d for d in shift_detections(detections, box[0], box[1]) if gate.inside(d)]
+            yield {'frame': n, 'detections': detections, 'image': frame}
+    
+    def detect_from_video(self, video_path, frame_skip=5, batch_size=8, confidence_threshold=0.5,
+                          adaptive=False, roi=None, max_skip=None, on_progress=None, render_to=None, line=None):
+        """
+        Detect vehicles in a video
+        
+        Args:
+            video_path: Path to video file
+            frame_skip: Process every Nth frame (the densest sampling in adaptive mode)
+            batch_size: Number of frames sent to the model per call
+            confidence_threshold: Minimum confidence for detection
+            adaptive: Gate frames on motion and adapt the sampling rate to activity
+            roi: ROI polygon for adaptive mode, [[x, y], ...] in frame fractions or pixels
+            max_skip: Longest adaptive stride (default 8 x frame_skip)
+            on_progress: Optional callable given the running counts (processed_frames,
+                last_frame, vehicle_counts, total_vehicles) about once a second
+            render_to: Optional output path (.mp4 or .avi) for an annotated video of
+                the processed frames, with boxes and track ids, at fps / frame_skip
+            line: Optional counting line [position, 'horizontal' | 'vertical'];
+                crossings are counted and reported, and drawn when rendering
             
         Returns:
-            Dictionary with total counts and frame-by-frame results
+            Dictionary with total counts and processing throughput; in adaptive
+            mode also the gate's counters and the inference saved against
+            fixed-stride sampling
         """
-        cap = cv2.VideoCapture(video_path)
-        frame_count = 0
         vehicle_counts = {'bike': 0, 'car': 0, 'bus': 0, 'truck': 0}
+        processed_frames = 0
+        last_frame = -1
+        gate = MotionGate(roi) if adaptive else None
+        counter = TrafficLineCounter(line[0], line[1]) if line else None
+        tracker = counter.tracker if counter else VehicleTracker()
+        renderer = None
+        if render_to:
+            renderer = VideoRenderer(render_to, max(1.0, self._source_fps(video_path) / frame_skip),
+                                     line=tuple(line) if line else None)
+        start = last_progress = time.perf_counter()
         
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Process every Nth frame
-            if frame_count % frame_skip == 0:
-                # Save frame temporarily
-                temp_frame = f'temp_frame_{frame_count}.jpg'
-                cv2.imwrite(temp_frame, frame)
-                
-                # Detect vehicles
-                detections = self.detect_from_image(temp_frame)
+        try:
+            for result in self.stream_video(video_path, frame_skip, batch_size, confidence_threshold, gate, max_skip):
+                processed_frames += 1
+                last_frame = result['frame']
                 
                 # Count vehicles
-                for det in detections:
+                for det in result['detections']:
                     vehicle_counts[det['type']] += 1
                 
-                # Clean up
-                Path(temp_frame).unlink(missing_ok=True)
-            
-            frame_count += 1
+                if counter:
+                    counter.update(result['detections'], last_frame)
+                elif renderer:
+                    tracker.update(result['detections'])
+                if renderer:
+                    overlay = {'frame': last_frame, 'vehicles': tracker.next_id - 1}
+                    if counter:
+                        overlay.update(counter.direction_counts)
+                    # Drawing and encoding happen on the renderer's thread, on the frame detection already decoded
+                    renderer.write(result['image'], result['detections'], overlay)
+                
+                if on_progress and time.perf_counter() - last_progress >= 1:
+                    last_progress = time.perf_counter()
+                    on_progress({'processed_frames': processed_frames, 'last_frame': last_frame,
+                                 'vehicle_counts': dict(vehicle_counts), 'total_vehicles': sum(vehicle_counts.values())})
+        finally:
+            if renderer:
+                renderer.close()
         
-        cap.release()
+        elapsed = time.perf_counter() - start
+        total_frames = self._frame_total(video_path, last_frame + 1)
         
-        return {
-            'total_frames': frame_count,
-            'processed_frames': frame_count // frame_skip,
+        report = {
+            'total_frames': total_frames,
+            'processed_frames': processed_frames,
             'vehicle_counts': vehicle_counts,
-            'total_vehicles': sum(vehicle_counts.values())
+            'total_vehicles': sum(vehicle_counts.values()),
+            'elapsed_seconds': round(elapsed, 3),
+            'fps': round(processed_frames / elapsed, 2) if elapsed > 0 else 0.0
         }
+        if counter:
+            report['line_crossings'] = {'total': counter.count, 'by_direction': counter.direction_counts,
+                                        'by_class': counter.class_counts}
+        if renderer:
+            report['render'] = {'path': str(render_to), 'codec': renderer.codec, 'frames': renderer.frames,
+                                'fps': renderer.fps}
+        if gate is not None:
+            baseline = -(-total_frames // frame_skip)
+            report['motion_gate'] = dict(
+                gate.stats(), baseline_frames=baseline,
+                inference_saved_pct=round(100 * (1 - processed_frames / baseline), 1) if baseline else 0.0)
+        return report
+    
+    @staticmethod
+    def _source_fps(video_path):
+        if not isinstance(video_path, (str, Path)):
+            return video_path.get(cv2.CAP_PROP_FPS) or 25
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        return fps or 25
+    
+    @staticmethod
+    def _frame_total(video_path, fallback):
+        """Frame count from container metadata, or what we actually read"""
+        if not isinstance(video_path, (str, Path)):
+            return max(getattr(video_path, 'frames_read', 0), fallback)
+        cap = cv2.VideoCapture(video_path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        cap.release()
+        return max(total, fallback)
     
     def draw_detections(self, image_path, output_path, detections):
         """
         Draw bounding boxes on image
         
         Args:
-            image_path: Input image path
+            image_path: Input image path, or a decoded BGR frame (left untouched)
             output_path: Output image path
             detections: List of detections
         """
-        img = cv2.imread(image_path)
-        
-        colors = {
-            'bike': (255, 0, 255),    # Magenta
-            'car': (255, 0, 0),       # Blue
-            'bus': (0, 0, 255),       # Red
-            'truck': (0, 165, 255)    # Orange
-        }
-        
-        for det in detections:
-            bbox = det['bbox']
-            v_type = det['type']
-            confidence = det['confidence']
-            
-            color = colors.get(v_type, (0, 255, 0))
-            
-            # Draw bounding box
-            cv2.rectangle(img, (bbox[0], bbox[1]), (bbox[2], bbox[3]), color, 2)
-            
-            # Draw label
-            label = f"{v_type}: {confidence:.2f}"
-            cv2.putText(img, label, (bbox[0], bbox[1] - 10),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-        
+        img = cv2.imread(image_path) if isinstance(image_path, (str, Path)) else image_path.copy()
+        draw_overlay(img, detections)
         cv2.imwrite(output_path, img)
         return output_path
 
@@ -198,18 +458,28 @@ class YOLOVehicleDetector:
 class TrafficLineCounter:
     """
     Count vehicles crossing a virtual line
+    
+    Detections are tracked across frames, so each vehicle is counted once per
+    direction when its centre actually moves from one side of the line to the other.
     """
     
-    def __init__(self, line_position, direction='horizontal'):
+    DIRECTIONS = {'horizontal': ('down', 'up'), 'vertical': ('right', 'left')}
+    
+    def __init__(self, line_position, direction='horizontal', tracker=None):
         """
         Args:
             line_position: Y coordinate for horizontal line, X for vertical
             direction: 'horizontal' or 'vertical'
+            tracker: VehicleTracker instance (a default one is created if omitted)
         """
         self.line_position = line_position
         self.direction = direction
+        self.tracker = tracker or VehicleTracker()
         self.tracked_objects = {}
         self.count = 0
+        self.direction_counts = {d: 0 for d in self.DIRECTIONS[direction]}
+        self.class_counts = {d: {} for d in self.DIRECTIONS[direction]}
+        self._counted = set()
     
     def update(self, detections, frame_number):
         """
@@ -218,18 +488,35 @@ class TrafficLineCounter:
         Args:
             detections: List of vehicle detections
             frame_number: Current frame number
-        """
-        for det in detections:
-            bbox = det['bbox']
-            center_x = (bbox[0] + bbox[2]) // 2
-            center_y = (bbox[1] + bbox[3]) // 2
             
-            # Check if vehicle crossed the line
-            if self.direction == 'horizontal':
-                if center_y > self.line_position:
-                    self.count += 1
-            else:  # vertical
-                if center_x > self.line_position:
-                    self.count += 1
+        Returns:
+            Total number of line crossings so far
+        """
+        tracks = self.tracker.update(detections)
+        
+        axis = 1 if self.direction == 'horizontal' else 0
+        before = self.tracker.prev_centroids[:, axis] > self.line_position
+        after = self.tracker.centroids[:, axis] > self.line_position
+        forward, backward = self.DIRECTIONS[self.direction]
+        
+        for i in np.nonzero(before != after)[0].tolist():
+            track_id = int(self.tracker.ids[i])
+            heading = forward if after[i] else backward
+            if (track_id, heading) in self._counted:
+                continue
+            self._counted.add((track_id, heading))
+            v_type = self.tracker.types[i]
+            self.count += 1
+            self.direction_counts[heading] += 1
+            self.class_counts[heading][v_type] = self.class_counts[heading].get(v_type, 0) + 1
+        
+        for track in tracks:
+            self.tracked_objects[track['id']] = {**track, 'last_frame': frame_number}
+        
+        # Forget vehicles the tracker has dropped
+        live = set(self.tracker.ids.tolist())
+        if len(self.tracked_objects) > len(live):
+            self.tracked_objects = {k: v for k, v in self.tracked_objects.items() if k in live}
+            self._counted = {key for key in self._counted if key[0] in live}
         
         return self.count
@@ -0,0 +1,151 @@
+"""
+Columnar Wire Format for Dashboard Datasets
+Static metadata once behind a version tag, per-tick values as typed columns, sent as JSON, a compact binary frame or MessagePack
+"""
+
+import hashlib
+import json
+import struct
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # optional: format=msgpack is refused without it
+    msgpack = None
+
+MEDIA_TYPES = {
+    'json': 'application/json',
+    'columnar': 'application/vnd.traffic.columns+json',
+    'binary': 'application/vnd.traffic.columns',
+    'msgpack': 'application/msgpack',
+}
+MAGIC = b'TRC1'
+
+
+def negotiate(format_arg, accept):
+    """
+    Response format from ?format= or, failing that, the Accept header
+
+    Returns:
+        'json' (the original list-of-objects payload), 'columnar', 'binary'
+        or 'msgpack'; None if the requested format is unknown or unavailable
+    """
+    fmt = (format_arg or '').lower()
+    if not fmt:
+        for name in ('binary', 'columnar', 'msgpack'):
+            if MEDIA_TYPES[name] in (accept or ''):
+                fmt = name
+                break
+        else:
+            return 'json'
+    if fmt not in MEDIA_TYPES or (fmt == 'msgpack' and msgpack is None):
+        return None
+    return fmt
+
+
+def static_version(records):
+    """Short content hash identifying a static metadata list"""
+    body = json.dumps(records, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.blake2b(body, digest_size=6).hexdigest()
+
+
+def compact(values, float_dtype='<f4'):
+    """Smallest little-endian dtype that holds the column; floats become float_dtype, integers past 32 bits float64"""
+    arr = np.asarray(values)
+    if arr.dtype.kind == 'f':
+        return arr.astype(float_dtype)
+    if arr.dtype.kind == 'b':
+        return arr.astype('u1')
+    if arr.dtype.kind in 'iu':
+        lo, hi = (int(arr.min()), int(arr.max())) if arr.size else (0, 0)
+        for dtype in (('u1', 'u2', 'u4') if lo >= 0 else ('i1', 'i2', 'i4')):
+            info = np.iinfo(dtype)
+            if info.min <= lo and hi <= info.max:
+                return arr.astype('<' + dtype)
+        # Browsers only read 64-bit integers as BigInt: send wider values as float64 (exact to 2**53)
+        return arr.astype('<f8')
+    raise TypeError(f'Column of dtype {arr.dtype} is not supported')
+
+
+def changed_rows(previous, current):
+    """Indices of rows where any column differs between two column dicts of equal length"""
+    changed = np.zeros(len(next(iter(current.values()))), dtype=bool)
+    for name, col in current.items():
+        diff = np.asarray(col) != np.asarray(previous[name])
+        changed |= diff.reshape(len(changed), -1).any(axis=1)
+    return np.nonzero(changed)[0]
+
+
+def encode(fmt, dataset, tick, columns, static=None, enums=None, rows=None, **meta):
+    """
+    Serialize one dataset snapshot
+
+    Args:
+        fmt: 'columnar', 'binary' or 'msgpack'
+        dataset: Dataset name; the client fetches its static records from /api/static/<dataset>
+        tick: Snapshot tick the values belong to (clients send it back as ?since= for deltas)
+        columns: {name: array}, row i describing static record i (or rows[i] in a delta)
+        static: Version tag of the static records the rows line up with
+        enums: {column name: [values]} for columns holding indexes into a table
+        rows: Row indices for a delta; None for a full snapshot
+        **meta: Extra scalar fields (e.g. timestamp)
+
+    Returns:
+        Encoded bytes
+    """
+    # JSON numbers cost the same at any precision, and float32 values print with float64 noise
+    float_dtype = '<f8' if fmt == 'columnar' else '<f4'
+    cols = {name: compact(col, float_dtype) for name, col in columns.items()}
+    n = len(rows) if rows is not None else (len(next(iter(cols.values()))) if cols else 0)
+    if rows is not None:
+        cols = {'_rows': compact(rows), **{name: col[rows] for name, col in cols.items()}}
+    header = dict(meta, dataset=dataset, tick=tick, static_version=static, n=n, delta=rows is not None,
+                  enums=enums or {})
+
+    if fmt == 'columnar':
+        header['columns'] = [{'name': name, 'dtype': col.dtype.str[1:], 'shape': list(col.shape),
+                              'data': col.ravel().tolist()} for name, col in cols.items()]
+        return json.dumps(header, separators=(',', ':')).encode()
+    if fmt == 'msgpack':
+        header['columns'] = [{'name': name, 'dtype': col.dtype.str[1:], 'shape': list(col.shape),
+                              'data': col.tobytes()} for name, col in cols.items()]
+        return msgpack.packb(header, use_bin_type=True)
+
+    # Binary: MAGIC, u32 header length, JSON header, then 8-byte aligned column buffers
+    # so the client can wrap each one in a typed array without copying
+    specs, offset = [], 0
+    for name, col in cols.items():
+        specs.append({'name': name, 'dtype': col.dtype.str[1:], 'shape': list(col.shape), 'offset': offset})
+        offset += -(-col.nbytes // 8) * 8
+    header['columns'] = specs
+    head = json.dumps(header, separators=(',', ':')).encode()
+    head += b' ' * (-(len(head) + 8) % 8)
+    parts = [MAGIC, struct.pack('<I', len(head)), head]
+    for col in cols.values():
+        parts.append(col.tobytes())
+        parts.append(b'\0' * (-col.nbytes % 8))
+    return b''.join(parts)
+
+
+def decode(fmt, body):
+    """Inverse of encode() for Python clients and tests: (header, {name: array})"""
+    if fmt == 'columnar':
+        header = json.loads(body)
+        return header, {c['name']: np.array(c['data'], dtype='<' + c['dtype']).reshape(c['shape'])
+                        for c in header.pop('columns')}
+    if fmt == 'msgpack':
+        header = msgpack.unpackb(body, raw=False)
+        return header, {c['name']: np.frombuffer(c['data'], dtype='<' + c['dtype']).reshape(c['shape'])
+                        for c in header.pop('columns')}
+    if body[:4] != MAGIC:
+        raise ValueError('Not a column frame')
+    size = struct.unpack('<I', body[4:8])[0]
+    header = json.loads(body[8:8 + size])
+    base = 8 + size
+    columns = {}
+    for c in header.pop('columns'):
+        dtype = np.dtype('<' + c['dtype'])
+        count = int(np.prod(c['shape']))
+        columns[c['name']] = np.frombuffer(body, dtype, count, base + c['offset']).reshape(c['shape'])
+    return header, columns